@@ -0,0 +1,105 @@
+"""
+Cold-start guard for the Streamlit app.
+
+Checks that:
+  - importing the app does not load heavy dependencies (ElevenLabs SDK, Gemini
+    client, LangGraph, mutagen, NumPy, ...) beyond what Streamlit itself loads;
+    they must be deferred until the stage that needs them
+  - the app's own import time stays within budget
+  - the compiled graph is cached: the second request returns the same object
+
+Each measurement runs in a fresh interpreter. Exits with status 1 on a regression.
+
+Usage (from the repository root):
+    python benchmarks/cold_start.py [--runs 5] [--max-import-seconds 0.5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Top-level packages that must not be imported by a sidebar render without an upload
+HEAVY_MODULES = {
+    "elevenlabs",
+    "langchain_google_genai",
+    "google",
+    "langgraph",
+    "mutagen",
+    "moviepy",
+    "numpy",
+    "httpx",
+}
+
+IMPORT_PROBE = """
+import json, sys, time
+import streamlit
+before = {name.split(".")[0] for name in sys.modules}
+started = time.perf_counter()
+import src.audiosummarizer.main
+elapsed = time.perf_counter() - started
+after = {name.split(".")[0] for name in sys.modules}
+print(json.dumps({"seconds": elapsed, "new_modules": sorted(after - before)}))
+"""
+
+GRAPH_PROBE = """
+import json, time
+from src.audiosummarizer.main import get_compiled_graph
+started = time.perf_counter()
+first = get_compiled_graph("Audio Summarizer", "benchmark", object())
+first_seconds = time.perf_counter() - started
+started = time.perf_counter()
+second = get_compiled_graph("Audio Summarizer", "benchmark", object())
+second_seconds = time.perf_counter() - started
+print(json.dumps({"first": first_seconds, "second": second_seconds, "cached": first is second}))
+"""
+
+
+def _run_probe(code: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Probe failed:\n{result.stderr}")
+    # Streamlit may log warnings in bare mode; the JSON report is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Guard app import time and compiled-graph caching.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh-interpreter import runs (median is reported)")
+    parser.add_argument("--max-import-seconds", type=float, default=0.5,
+                        help="Budget for importing the app on top of Streamlit")
+    args = parser.parse_args(argv)
+
+    failures = []
+
+    runs = [_run_probe(IMPORT_PROBE) for _ in range(args.runs)]
+    median = statistics.median(run["seconds"] for run in runs)
+    heavy = sorted(HEAVY_MODULES.intersection(runs[0]["new_modules"]))
+    print(f"App import (on top of streamlit): median {median * 1000:.0f} ms over {args.runs} runs")
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    if median > args.max_import_seconds:
+        failures.append(f"import took {median:.2f} s (budget {args.max_import_seconds:.2f} s)")
+
+    graph = _run_probe(GRAPH_PROBE)
+    print(f"Graph compile: first {graph['first'] * 1000:.0f} ms, cached {graph['second'] * 1000:.1f} ms")
+    if not graph["cached"]:
+        failures.append("compiled graph is rebuilt on every request")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Cold start within budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Search latency guard for the call corpus.
+
+Fills a fresh corpus database with synthetic calls (speaker turns drawn from a
+small call-centre vocabulary, so common words match nearly every call) and
+times one page of search results for:
+  - a broad query (a word in almost every call) and a narrow one (a word in a
+    few calls)
+  - newest-first and relevance order
+  - the first page and a later page
+
+Each query runs --runs times and the median is reported. Exits with status 1
+when any median exceeds --max-ms.
+
+Usage (from the repository root):
+    python benchmarks/corpus_search.py [--calls 100000] [--turns 12] [--runs 5] [--max-ms 100]
+        [--db corpus.sqlite3] [--json results.json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from src.audiosummarizer.utils.corpus_store import CorpusStore, DEFAULT_PAGE_SIZE  # noqa: E402
+
+_VOCABULARY = (
+    "thanks for calling how can I help you today my order has not arrived yet let me check that for you "
+    "I see the package was delayed at the warehouse we can send a replacement or issue a refund"
+).split()
+
+# Words planted in a few calls only
+_RARE_WORDS = ["escalation", "chargeback", "supervisor", "cancellation"]
+
+# (label, query, order, page)
+QUERIES = [
+    ("broad, newest, page 1", "refund", "newest", 1),
+    ("broad, relevance, page 1", "refund", "relevance", 1),
+    ("broad, relevance, page 5", "refund", "relevance", 5),
+    ("phrase, newest", '"send a replacement"', "newest", 1),
+    ("phrase, relevance", '"send a replacement"', "relevance", 1),
+    ("narrow, newest, page 1", "chargeback", "newest", 1),
+    ("narrow, relevance, page 1", "chargeback", "relevance", 1),
+    ("no query, newest, page 50", "", "newest", 50),
+]
+
+
+def _fill(store: CorpusStore, calls: int, turns: int, seed: int = 7):
+    """Insert synthetic calls straight into the store's tables in one transaction per 1000 calls."""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    for first in range(0, calls, 1000):
+        batch = [
+            (
+                f"call{index}",
+                [{"start": turn * 7.5, "speaker": str(turn % 2), "text": _sentence(rng, index)}
+                 for turn in range(turns)],
+                " ".join(rng.choices(_VOCABULARY, k=30)),
+            )
+            for index in range(first, min(first + 1000, calls))
+        ]
+        with store._connect(immediate=True) as conn:
+            for name, call_turns, summary in batch:
+                store._insert_call(conn, name, name, summary, call_turns, 60.0 * turns)
+    return time.perf_counter() - started
+
+
+def _sentence(rng: random.Random, index: int) -> str:
+    words = rng.choices(_VOCABULARY, k=rng.randint(8, 20))
+    if index % 997 == 0:
+        words.append(rng.choice(_RARE_WORDS))
+    return " ".join(words)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Guard corpus search latency on a large synthetic corpus.")
+    parser.add_argument("--calls", type=int, default=100000, help="Synthetic calls to index")
+    parser.add_argument("--turns", type=int, default=12, help="Speaker turns per call")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per query (median is reported)")
+    parser.add_argument("--max-ms", type=float, default=100.0, help="Budget for one page of results")
+    parser.add_argument("--db", help="Reuse (or create) this corpus file instead of a temporary one")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CorpusStore(args.db or os.path.join(tmp, "corpus.sqlite3"))
+        stored = store.get_stats()["calls"]
+        if stored < args.calls:
+            seconds = _fill(store, args.calls - stored, args.turns)
+            print(f"Indexed {args.calls - stored:,} calls in {seconds:.1f} s")
+        stats = store.get_stats()
+        print(f"Corpus: {stats['calls']:,} calls, {stats['turns']:,} turns")
+
+        failures = []
+        results = []
+        for label, query, order, page in QUERIES:
+            timings = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                found = store.search(query, page=page, page_size=DEFAULT_PAGE_SIZE, order=order)
+                timings.append(time.perf_counter() - started)
+            median_ms = statistics.median(timings) * 1000
+            results.append({"query": label, "median_ms": median_ms, "results": len(found["results"]),
+                            "capped": found["capped"]})
+            print(f"{label:<28} {median_ms:7.1f} ms  ({len(found['results'])} results"
+                  f"{', capped' if found['capped'] else ''})")
+            if median_ms > args.max_ms:
+                failures.append(f"{label}: {median_ms:.0f} ms (budget {args.max_ms:.0f} ms)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"calls": stats["calls"], "turns": stats["turns"], "queries": results}, f, indent=2)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Search within budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,429 @@
+"""
+Offline end-to-end benchmark of the audio graph.
+
+Runs the real AudioGraphBuilder graph (audio_file -> transcribe -> summarize)
+over synthetic recordings, with local stand-ins for ElevenLabs and Gemini that
+answer after a configurable latency. Nothing touches the network.
+
+For every fixture (length x format) it reports:
+  - per-stage wall time (from graph.stream updates)
+  - peak RSS of the run and of its ffmpeg children
+  - peak temporary disk usage (cache dir and TMPDIR, sampled while the graph runs)
+
+Each fixture runs in a fresh interpreter with its own HOME, cache directory and
+TMPDIR, so caches start cold and peak RSS is per run. With --baseline, exits
+with status 1 when any stage is slower than the baseline by more than
+--max-regression.
+
+Usage (from the repository root):
+    python benchmarks/offline_pipeline.py [--lengths 30,300,1800] [--formats wav,mp3,flac,mp4]
+        [--stt-latency 0.5] [--stt-rtf 0.02] [--llm-latency 0.3] [--llm-tokens-per-second 200]
+        [--json results.json] [--baseline previous.json] [--max-regression 0.25]
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from array import array
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_RATE = 16000
+
+# Synthetic "speech": tone bursts separated by pauses long enough for silencedetect
+BURST_SECONDS = 3.0
+PAUSE_SECONDS = 0.7
+
+# Containers besides WAV are produced with ffmpeg (skipped when it is not installed)
+FFMPEG_FORMATS = {
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "64k"],
+    "flac": ["-c:a", "flac"],
+    "m4a": ["-c:a", "aac", "-b:a", "64k"],
+    "mp4": ["-f", "lavfi", "-i", "color=c=black:s=320x240:r=5", "-shortest", "-c:v", "mpeg4", "-c:a", "aac"],
+}
+
+_VOCABULARY = (
+    "thanks for calling how can I help you today my order has not arrived yet let me check that for you "
+    "I see the package was delayed at the warehouse we can send a replacement or issue a refund"
+).split()
+
+# Calls made to the stand-in clients during one run
+_calls = {"stt": 0, "llm": 0}
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+def generate_wav(path: str, seconds: float, sample_rate: int = SAMPLE_RATE):
+    """Write a mono 16-bit WAV of tone bursts and pauses (one period is synthesized and repeated)."""
+    period = array("h")
+    for i in range(int(BURST_SECONDS * sample_rate)):
+        t = i / sample_rate
+        value = 0.3 * math.sin(2 * math.pi * 180 * t) + 0.2 * math.sin(2 * math.pi * 410 * t)
+        period.append(int(value * 32767))
+    period.extend([0] * int(PAUSE_SECONDS * sample_rate))
+    if sys.byteorder == "big":
+        period.byteswap()
+    period_bytes = period.tobytes()
+
+    remaining = int(seconds * sample_rate) * 2
+    with wave.open(path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        while remaining > 0:
+            block = period_bytes[:remaining]
+            out.writeframes(block)
+            remaining -= len(block)
+
+
+def build_fixtures(directory: str, lengths: list, formats: list) -> list:
+    """
+    Create one fixture per (length, format).
+
+    Returns:
+        List of {"path", "seconds", "format"} dicts (formats that could not be encoded are skipped)
+    """
+    fixtures = []
+    ffmpeg = shutil.which("ffmpeg")
+    for seconds in lengths:
+        wav_path = os.path.join(directory, f"call_{seconds}s.wav")
+        if not os.path.exists(wav_path):
+            generate_wav(wav_path, seconds)
+        for fmt in formats:
+            if fmt == "wav":
+                fixtures.append({"path": wav_path, "seconds": seconds, "format": fmt})
+                continue
+            if fmt not in FFMPEG_FORMATS:
+                print(f"Skipping unknown format {fmt!r}")
+                continue
+            if ffmpeg is None:
+                print(f"Skipping {fmt} fixtures: ffmpeg not found")
+                continue
+            path = os.path.join(directory, f"call_{seconds}s.{fmt}")
+            if not os.path.exists(path):
+                command = [ffmpeg, "-y", "-v", "error", "-i", wav_path] + FFMPEG_FORMATS[fmt] + [path]
+                result = subprocess.run(command, capture_output=True, text=True)
+                if result.returncode != 0:
+                    print(f"Skipping {fmt} fixtures: {result.stderr.strip().splitlines()[-1:]}")
+                    continue
+            fixtures.append({"path": path, "seconds": seconds, "format": fmt})
+    return fixtures
+
+
+# ---------------------------------------------------------------------------
+# Stand-in clients
+# ---------------------------------------------------------------------------
+
+class FakeSpeechToText:
+    """Answers speech_to_text.convert like ElevenLabs, after reading the whole upload."""
+
+    def __init__(self, latency: float, realtime_factor: float, span_seconds: float, words_per_second: float = 2.5):
+        """
+        Args:
+            latency: Fixed seconds per request
+            realtime_factor: Extra seconds per second of audio in the request
+            span_seconds: Audio seconds each request is assumed to cover
+            words_per_second: Speaking rate of the generated transcript
+        """
+        self.latency = latency
+        self.realtime_factor = realtime_factor
+        self.span_seconds = span_seconds
+        self.words_per_second = words_per_second
+
+    def convert(self, file, **params):
+        _calls["stt"] += 1
+        # Consume the upload the way the HTTP client would, so extraction cost is measured
+        stream = file[1] if isinstance(file, tuple) else file
+        while stream.read(1024 * 1024):
+            pass
+        time.sleep(self.latency + self.realtime_factor * self.span_seconds)
+
+        words = []
+        step = 1.0 / self.words_per_second
+        for i in range(int(self.span_seconds * self.words_per_second)):
+            start = i * step
+            words.append(SimpleNamespace(
+                text=_VOCABULARY[i % len(_VOCABULARY)],
+                start=start,
+                end=start + step * 0.8,
+                speaker_id=f"speaker_{(i // 12) % 2}",
+                type="word",
+            ))
+        return SimpleNamespace(text=" ".join(w.text for w in words), words=words)
+
+
+class FakeSTTClient:
+    """Stand-in for elevenlabs.client.ElevenLabs (only speech_to_text.convert is used)."""
+
+    def __init__(self, **kwargs):
+        self.speech_to_text = FakeSpeechToText(**kwargs)
+
+
+def make_fake_chat_model(latency: float, tokens_per_second: float, reply_words: int = 120):
+    """
+    Build a LangChain chat model that replies with a canned summary.
+
+    Subclassing BaseChatModel gives the summarize node the same invoke/stream/batch
+    (and async) surface as ChatGoogleGenerativeAI.
+    """
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+    reply = (
+        "**Customer Issue:** " + " ".join(_VOCABULARY[i % len(_VOCABULARY)] for i in range(reply_words // 2))
+        + "\n**Key Points / Notes:** " + " ".join(_VOCABULARY[i % len(_VOCABULARY)] for i in range(reply_words // 2))
+    )
+
+    class FakeChatModel(BaseChatModel):
+        model: str = "offline-benchmark"
+
+        @property
+        def _llm_type(self) -> str:
+            return "offline-benchmark"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            _calls["llm"] += 1
+            time.sleep(latency + reply_words / tokens_per_second)
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            _calls["llm"] += 1
+            time.sleep(latency)
+            for word in reply.split(" "):
+                time.sleep(1.0 / tokens_per_second)
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    return FakeChatModel()
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def _directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # removed while walking
+    return total
+
+
+class DiskSampler(threading.Thread):
+    """Samples the size of some directories in the background and keeps the peak."""
+
+    def __init__(self, paths: list, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.paths = paths
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak_bytes = max(self.peak_bytes, sum(_directory_bytes(p) for p in self.paths))
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        return self.peak_bytes
+
+
+def _peak_rss_mb(who) -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_one(args) -> dict:
+    """Run the graph once over one fixture (called in a fresh interpreter)."""
+    sys.path.insert(0, REPO_ROOT)
+    from src.audiosummarizer.graph.audio_graph import AudioGraphBuilder
+    from src.audiosummarizer.utils.chunked_transcription import should_chunk, CHUNK_MINUTES, OVERLAP_SECONDS
+    from src.audiosummarizer.utils.media_handle import MediaHandle
+    from src.audiosummarizer.utils.media_probe import probe_media, ffmpeg_available
+    from src.audiosummarizer.utils.transcript_cache import CACHE_ROOT
+
+    sampler = DiskSampler([str(CACHE_ROOT), tempfile.gettempdir()])
+    sampler.start()
+
+    handle = MediaHandle.from_path(args.run_one)
+    duration = probe_media(handle.path, handle.content_hash).duration_seconds or args.duration
+    chunked = should_chunk(duration) and ffmpeg_available()
+    span = min(duration, CHUNK_MINUTES * 60 + 2 * OVERLAP_SECONDS) if chunked else duration
+
+    stt = FakeSTTClient(latency=args.stt_latency, realtime_factor=args.stt_rtf, span_seconds=span)
+    llm = make_fake_chat_model(args.llm_latency, args.llm_tokens_per_second)
+    graph = AudioGraphBuilder(llm, stt_client=stt).setup_graph("Audio Summarizer")
+
+    initial_state = {
+        "audio_path": handle.path,
+        "content_hash": handle.content_hash,
+        "transcript": None,
+        "transcript_words": None,
+        "summary": None,
+        "audio_duration_seconds": duration,
+        "bypass_cache": True,
+    }
+    stages = {}
+    result = dict(initial_state)
+    started = stage_started = time.perf_counter()
+    for update in graph.stream(initial_state, stream_mode="updates"):
+        now = time.perf_counter()
+        for node, node_state in update.items():
+            stages[node] = round(now - stage_started, 4)
+            result.update(node_state or {})
+        stage_started = now
+    total = time.perf_counter() - started
+
+    return {
+        "fixture": os.path.basename(args.run_one),
+        "duration_seconds": duration,
+        "chunked": chunked,
+        "stages": stages,
+        "total_seconds": round(total, 4),
+        "peak_rss_mb": round(_peak_rss_mb(resource.RUSAGE_SELF), 1),
+        "children_peak_rss_mb": round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        "peak_temp_disk_mb": round(sampler.stop() / (1024 * 1024), 2),
+        "stt_calls": _calls["stt"],
+        "llm_calls": _calls["llm"],
+        "transcript_chars": len(result.get("transcript") or ""),
+    }
+
+
+def _run_fixture(fixture: dict, args, scratch: str) -> dict:
+    """Run one fixture in a subprocess with isolated HOME, cache directory and TMPDIR."""
+    run_dir = tempfile.mkdtemp(prefix="run_", dir=scratch)
+    env = dict(os.environ)
+    for name, sub in (("HOME", "home"), ("AUDIOSUMMARIZER_CACHE_DIR", "cache"), ("TMPDIR", "tmp")):
+        env[name] = os.path.join(run_dir, sub)
+        os.makedirs(env[name])
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        "--run-one", fixture["path"],
+        "--duration", str(fixture["seconds"]),
+        "--stt-latency", str(args.stt_latency),
+        "--stt-rtf", str(args.stt_rtf),
+        "--llm-latency", str(args.llm_latency),
+        "--llm-tokens-per-second", str(args.llm_tokens_per_second),
+    ]
+    try:
+        result = subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Benchmark run failed for {fixture['path']}:\n{result.stderr}")
+    # The graph nodes print progress; the JSON report is the last line
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["format"] = fixture["format"]
+    return report
+
+
+def format_table(reports: list) -> str:
+    stage_names = []
+    for report in reports:
+        for name in report["stages"]:
+            if name not in stage_names:
+                stage_names.append(name)
+    header = ["fixture", "chunked"] + [f"{name} s" for name in stage_names] + ["total s", "RSS MB", "ffmpeg MB", "disk MB"]
+    rows = [header]
+    for report in reports:
+        rows.append(
+            [report["fixture"], "yes" if report["chunked"] else "no"]
+            + [f"{report['stages'].get(name, 0.0):.2f}" for name in stage_names]
+            + [f"{report['total_seconds']:.2f}", f"{report['peak_rss_mb']:.0f}",
+               f"{report['children_peak_rss_mb']:.0f}", f"{report['peak_temp_disk_mb']:.1f}"]
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows)
+
+
+def compare(reports: list, baseline: list, max_regression: float) -> list:
+    """Return a message for every stage or total slower than the baseline by more than max_regression."""
+    previous = {report["fixture"]: report for report in baseline}
+    failures = []
+    for report in reports:
+        before = previous.get(report["fixture"])
+        if before is None:
+            continue
+        timings = dict(report["stages"], total=report["total_seconds"])
+        old_timings = dict(before["stages"], total=before["total_seconds"])
+        for name, seconds in timings.items():
+            old = old_timings.get(name)
+            # Ignore sub-50 ms stages: their noise exceeds any sensible threshold
+            if old and seconds > 0.05 and seconds > old * (1 + max_regression):
+                failures.append(f"{report['fixture']} {name}: {seconds:.2f} s (baseline {old:.2f} s)")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the audio graph offline with stand-in STT and LLM clients.")
+    parser.add_argument("--lengths", default="30,300,1800", help="Comma-separated fixture lengths in seconds")
+    parser.add_argument("--formats", default="wav,mp3,flac,mp4", help="Comma-separated fixture formats")
+    parser.add_argument("--stt-latency", type=float, default=0.5, help="Fixed STT seconds per request")
+    parser.add_argument("--stt-rtf", type=float, default=0.02, help="STT seconds per second of audio")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="LLM seconds to first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200.0, help="LLM output speed")
+    parser.add_argument("--fixtures-dir", help="Reuse fixtures from this directory (created if missing)")
+    parser.add_argument("--json", help="Write the reports to this JSON file")
+    parser.add_argument("--baseline", help="JSON file from a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed slowdown vs the baseline (0.25 = 25%%)")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    parser.add_argument("--duration", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one:
+        print(json.dumps(run_one(args)))
+        return 0
+
+    scratch = tempfile.mkdtemp(prefix="audiosummarizer_bench_")
+    try:
+        fixtures_dir = args.fixtures_dir or os.path.join(scratch, "fixtures")
+        os.makedirs(fixtures_dir, exist_ok=True)
+        lengths = [int(value) for value in args.lengths.split(",") if value.strip()]
+        formats = [value.strip() for value in args.formats.split(",") if value.strip()]
+        fixtures = build_fixtures(fixtures_dir, lengths, formats)
+
+        reports = []
+        for fixture in fixtures:
+            reports.append(_run_fixture(fixture, args, scratch))
+            print(f"✅ {reports[-1]['fixture']} in {reports[-1]['total_seconds']:.2f} s")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(format_table(reports))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            failures = compare(reports, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f"❌ {failure}")
+        if failures:
+            return 1
+        print("✅ No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,34 @@
 import os
+import threading
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 # Load environment variables
 load_dotenv()
 
+# Process-wide client registry shared by every Streamlit session and thread,
+# so HTTP connections are reused instead of rebuilt per call
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_chat_model(model: str, temperature: float, api_key: str):
+    """Return the shared chat client for (model, temperature, key), creating it on first use."""
+    key = (model, temperature, api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            # Imported on first use: langchain_google_genai is slow to import
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            client = ChatGoogleGenerativeAI(
+                model=model,
+                temperature=temperature,
+                google_api_key=api_key,
+                # A single attempt: retries and backoff are handled by utils/rate_limiter
+                max_retries=1
+            )
+            _clients[key] = client
+    return client
+
 
 class GeminiLLM:
     def __init__(self):
@@ -17,11 +41,7 @@ class GeminiLLM:
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY environment variable not set")
         
-        self.llm = ChatGoogleGenerativeAI(
-            model=self.model,
-            temperature=self.temperature,
-            google_api_key=self.api_key
-        )
+        self.llm = get_chat_model(self.model, self.temperature, self.api_key)
 
     def get_llm(self):
         return self.llm
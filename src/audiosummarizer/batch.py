@@ -0,0 +1,226 @@
+"""
+Headless batch processing of call recordings.
+
+Compiles the AudioGraphBuilder graph once and runs it over a directory or glob
+of recordings with bounded concurrency. Results are appended to a JSONL file
+as each recording finishes, so an interrupted run resumes where it stopped.
+
+Usage:
+    python -m src.audiosummarizer.batch recordings/ --output results.jsonl --concurrency 4
+    python -m src.audiosummarizer.batch "calls/2024-*/*.mp3" --output results.jsonl --parquet results.parquet
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from src.audiosummarizer.LLMS.geminillm import GeminiLLM
+from src.audiosummarizer.graph.audio_graph import AudioGraphBuilder
+from src.audiosummarizer.utils.media_handle import MediaHandle, AUDIO_EXTENSIONS, VIDEO_EXTENSIONS
+from src.audiosummarizer.utils import metrics
+from src.audiosummarizer.utils.media_probe import probe_media
+
+DEFAULT_CONCURRENCY = 4
+
+SUPPORTED_EXTENSIONS = set(AUDIO_EXTENSIONS + VIDEO_EXTENSIONS)
+
+
+def discover_files(source: str, recursive: bool = False) -> list:
+    """
+    Resolve a directory or glob pattern to the list of supported media files.
+
+    Returns:
+        Sorted absolute paths
+    """
+    if os.path.isdir(source):
+        pattern = os.path.join(source, "**", "*") if recursive else os.path.join(source, "*")
+        candidates = glob.glob(pattern, recursive=recursive)
+    else:
+        candidates = glob.glob(source, recursive=True)
+    return sorted(
+        os.path.abspath(path) for path in candidates
+        if os.path.isfile(path) and os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+    )
+
+
+def _file_key(path: str) -> tuple:
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def load_completed(output_path: str) -> set:
+    """
+    Read an existing JSONL output and return the keys of recordings already processed successfully.
+
+    Recordings that failed are not included, so a rerun retries them.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partial last line from an interrupted run
+            if record.get("status") == "ok":
+                completed.add((record["path"], record["size"], record["mtime_ns"]))
+    return completed
+
+
+class BatchRunner:
+    """Runs the compiled graph over many recordings and appends results to JSONL."""
+
+    def __init__(self, graph, output_path: str, concurrency: int = DEFAULT_CONCURRENCY):
+        """
+        Args:
+            graph: Graph compiled with AudioGraphBuilder(..., use_async=True)
+            output_path: JSONL file results are appended to
+            concurrency: Maximum recordings processed at the same time
+        """
+        self.graph = graph
+        self.output_path = output_path
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.stats = {"ok": 0, "failed": 0, "skipped": 0, "audio_seconds": 0.0}
+        self._output = None
+
+    async def run(self, paths: list) -> dict:
+        """Process every path not already completed in the output file and return the statistics."""
+        completed = load_completed(self.output_path)
+        pending = []
+        for path in paths:
+            if _file_key(path) in completed:
+                self.stats["skipped"] += 1
+            else:
+                pending.append(path)
+
+        print(f"{len(paths)} recordings found, {self.stats['skipped']} already done, {len(pending)} to process")
+        started = time.perf_counter()
+        with open(self.output_path, "a") as self._output:
+            await asyncio.gather(*(self._process(path) for path in pending))
+        self.stats["elapsed_seconds"] = time.perf_counter() - started
+        return self.stats
+
+    async def _process(self, path: str):
+        async with self.semaphore:
+            started = time.perf_counter()
+            path, size, mtime_ns = _file_key(path)
+            record = {"path": path, "name": os.path.basename(path), "size": size, "mtime_ns": mtime_ns}
+            try:
+                # Hashing and header probing are blocking file work
+                handle = await asyncio.to_thread(MediaHandle.from_path, path)
+                info = await asyncio.to_thread(probe_media, handle.path, handle.content_hash)
+                with metrics.span("process_audio", audio_seconds=info.duration_seconds or 0.0, source="batch"):
+                    result = await self.graph.ainvoke({
+                        "audio_path": handle.path,
+                        "content_hash": handle.content_hash,
+                        "source_name": handle.name,
+                        "transcript": None,
+                        "transcript_words": None,
+                        "summary": None,
+                        "audio_duration_seconds": info.duration_seconds,
+                        "bypass_cache": False,
+                    })
+                record.update({
+                    "status": "ok",
+                    "content_hash": handle.content_hash,
+                    "audio_duration_seconds": info.duration_seconds,
+                    "transcript": result.get("transcript"),
+                    "summary": result.get("summary"),
+                })
+                self.stats["ok"] += 1
+                self.stats["audio_seconds"] += info.duration_seconds or 0.0
+            except Exception as e:
+                record.update({"status": "error", "error": str(e)})
+                self.stats["failed"] += 1
+                print(f"❌ {record['name']}: {e}", file=sys.stderr)
+
+            record["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+            record["processed_at"] = datetime.now(timezone.utc).isoformat()
+            # Written as soon as each recording finishes; flushed so a crash loses nothing
+            self._output.write(json.dumps(record) + "\n")
+            self._output.flush()
+            print(f"{'✅' if record['status'] == 'ok' else '❌'} {record['name']} ({record['elapsed_seconds']:.1f} s)")
+
+
+# Parquet columns and their Arrow types; failed recordings leave the result columns null
+PARQUET_COLUMNS = (
+    ("path", "string"),
+    ("name", "string"),
+    ("size", "int64"),
+    ("mtime_ns", "int64"),
+    ("status", "string"),
+    ("error", "string"),
+    ("content_hash", "string"),
+    ("audio_duration_seconds", "float64"),
+    ("transcript", "string"),
+    ("summary", "string"),
+    ("elapsed_seconds", "float64"),
+    ("processed_at", "string"),
+)
+
+
+def export_parquet(jsonl_path: str, parquet_path: str):
+    """Convert the JSONL results to Parquet (latest record per recording)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet export requires pyarrow: pip install pyarrow")
+
+    records = {}
+    with open(jsonl_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record["path"]] = record
+    # An explicit schema, so the columns do not depend on which record comes first
+    schema = pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in PARQUET_COLUMNS])
+    pq.write_table(pa.Table.from_pylist(list(records.values()), schema=schema), parquet_path)
+
+
+def format_report(stats: dict) -> str:
+    """Format throughput statistics for the end of a run."""
+    minutes = max(stats.get("elapsed_seconds", 0.0), 1e-9) / 60
+    return (
+        f"Processed {stats['ok']} ok, {stats['failed']} failed, {stats['skipped']} skipped "
+        f"in {stats.get('elapsed_seconds', 0.0):.1f} s\n"
+        f"Throughput: {stats['ok'] / minutes:.2f} files/min, "
+        f"{stats['audio_seconds'] / minutes:.1f} audio-seconds/min"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe and summarize a batch of call recordings.")
+    parser.add_argument("source", help="Directory or glob pattern of audio/video files")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file results are appended to (default: results.jsonl)")
+    parser.add_argument("--parquet", help="Also export the results to this Parquet file when done")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Recordings processed at the same time")
+    parser.add_argument("--recursive", action="store_true", help="Search subdirectories when source is a directory")
+    args = parser.parse_args(argv)
+
+    paths = discover_files(args.source, args.recursive)
+    if not paths:
+        raise SystemExit(f"No supported audio/video files found for {args.source!r}")
+
+    # One client and one compiled graph for the whole batch
+    model = GeminiLLM().get_llm()
+    graph = AudioGraphBuilder(model, use_async=True).setup_graph("Audio Summarizer")
+
+    runner = BatchRunner(graph, args.output, args.concurrency)
+    stats = asyncio.run(runner.run(paths))
+    print(format_report(stats))
+
+    if args.parquet:
+        export_parquet(args.output, args.parquet)
+        print(f"Wrote {args.parquet}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,245 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import partial
+from typing import Optional
 from langgraph.graph import StateGraph, START, END
 from src.audiosummarizer.state.audio_state import AudioAnalysisState
 from src.audiosummarizer.nodes.audio_file_node import AudioFileNode
-from src.audiosummarizer.nodes.transcribe_node import transcribe_node
-from src.audiosummarizer.nodes.summarize_node import summarize_node
+from src.audiosummarizer.nodes.preprocess_node import preprocess_node, apreprocess_node
+from src.audiosummarizer.nodes.transcribe_node import transcribe_node, atranscribe_node
+from src.audiosummarizer.nodes.summarize_node import summarize_node, asummarize_node
+from src.audiosummarizer.nodes.index_node import index_node, aindex_node
+from src.audiosummarizer.utils.metrics import traced
+from src.audiosummarizer.utils.transcript_cache import CACHE_ROOT
+
+# SQLite file holding graph checkpoints (state after every completed node)
+CHECKPOINT_DB = CACHE_ROOT / "checkpoints.sqlite3"
+
+
+def sqlite_checkpointer(db_path=CHECKPOINT_DB):
+    """
+    Create a SQLite checkpointer for sync graph runs.
+
+    The connection is shared by all sessions of the process; SqliteSaver
+    serializes access to it with its own lock.
+    """
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    return SqliteSaver(sqlite3.connect(str(db_path), check_same_thread=False))
+
+
+# A running run refreshes its marker this often; a marker this much older belongs to a run that died
+# (well under the job queue's stale timeout, so a requeued job resumes its checkpoint)
+CHECKPOINT_HEARTBEAT_SECONDS = 15
+CHECKPOINT_STALE_SECONDS = 4 * CHECKPOINT_HEARTBEAT_SECONDS
+
+_RUNS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoint_runs (
+    thread_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS checkpoint_runs_hash ON checkpoint_runs (content_hash, status);
+"""
+
+
+@contextmanager
+def _runs_db(db_path):
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    try:
+        conn.executescript(_RUNS_SCHEMA)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def claim_checkpoint(content_hash: str, db_path=CHECKPOINT_DB) -> dict:
+    """
+    Pick the checkpoint thread for a new run of the recording.
+
+    A thread is only reused if its last run failed or stopped sending
+    heartbeats (the process died); a run still in progress elsewhere (another
+    session, job or worker) is left alone and this run gets a thread of its own.
+
+    Returns:
+        Run config with the thread id (see checkpoint_config)
+    """
+    now = time.time()
+    owner = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    with _runs_db(db_path) as conn:
+        row = conn.execute(
+            "SELECT thread_id FROM checkpoint_runs WHERE content_hash = ? "
+            "AND (status = 'failed' OR heartbeat < ?) ORDER BY heartbeat DESC LIMIT 1",
+            (content_hash, now - CHECKPOINT_STALE_SECONDS),
+        ).fetchone()
+        thread_id = row[0] if row else f"audio-{content_hash}-{uuid.uuid4().hex[:12]}"
+        conn.execute(
+            "INSERT OR REPLACE INTO checkpoint_runs (thread_id, content_hash, status, owner, heartbeat) "
+            "VALUES (?, ?, 'running', ?, ?)",
+            (thread_id, content_hash, owner, now),
+        )
+    return checkpoint_config(thread_id)
+
+
+def _set_run_status(config: dict, status: Optional[str], db_path=CHECKPOINT_DB):
+    """Refresh a run's heartbeat and status; None removes the run's marker."""
+    thread_id = config["configurable"]["thread_id"]
+    with _runs_db(db_path) as conn:
+        if status is None:
+            conn.execute("DELETE FROM checkpoint_runs WHERE thread_id = ?", (thread_id,))
+        else:
+            conn.execute(
+                "UPDATE checkpoint_runs SET status = ?, heartbeat = ? WHERE thread_id = ?",
+                (status, time.time(), thread_id),
+            )
+
+
+@contextmanager
+def checkpoint_run(graph, content_hash: str):
+    """
+    Run one checkpointed graph run of a recording.
+
+    Yields the run config (see claim_checkpoint). While the block runs, the
+    run's marker is kept fresh from a background thread; if the block raises,
+    the run is marked failed so the next run of the recording resumes it, and
+    if it completes, its checkpoints are deleted.
+    """
+    config = claim_checkpoint(content_hash)
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(CHECKPOINT_HEARTBEAT_SECONDS):
+            try:
+                _set_run_status(config, "running")
+            except sqlite3.Error as e:
+                print(f"Checkpoint heartbeat failed: {e}")
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+    try:
+        yield config
+    except BaseException:
+        # Also covers Streamlit stopping the script when the session goes away
+        stop.set()
+        try:
+            _set_run_status(config, "failed")
+        except sqlite3.Error as e:
+            print(f"Could not mark checkpoint run as failed: {e}")
+        raise
+    finally:
+        stop.set()
+        beat.join()
+    finish_checkpoint(graph, config)
+
+
+def checkpoint_config(thread_id: str) -> dict:
+    """Run config for a checkpoint thread."""
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def start_or_resume(graph, initial_state: dict, config: dict):
+    """
+    Pick the input for a checkpointed run of the recording.
+
+    If the thread claimed for this run holds a run that stopped before
+    finishing (e.g. the summary failed), the run resumes at the first
+    incomplete node, so the transcription is not repeated.
+
+    Returns:
+        (graph input, checkpointed state values or None) - input is None when resuming
+    """
+    snapshot = graph.get_state(config)
+    if not snapshot.next:
+        # No checkpoint, or the last run completed: start fresh
+        return initial_state, None
+    # The upload is spooled to a new path on every run, and the cache setting
+    # belongs to this run: carry both into the checkpointed state
+    fresh = {key: initial_state.get(key) for key in ("audio_path", "bypass_cache")}
+    graph.update_state(config, fresh)
+    return None, {**snapshot.values, **fresh}
+
+
+def finish_checkpoint(graph, config: dict):
+    """Drop a thread's checkpoints and run marker once its run has completed (they are only needed to resume)."""
+    delete_thread = getattr(graph.checkpointer, "delete_thread", None)
+    if delete_thread is not None:
+        delete_thread(config["configurable"]["thread_id"])
+    _set_run_status(config, None)
 
 
 class AudioGraphBuilder:
-    def __init__(self, llm_model):
+    def __init__(self, llm_model, use_async=False, stt_client=None):
+        """
+        Args:
+            llm_model: Chat model injected into the summarize node
+            use_async: Register the async node variants (for graph.ainvoke/astream)
+            stt_client: Speech-to-text client injected into the transcribe node
+                (None creates an ElevenLabs client per transcription)
+        """
         self.llm = llm_model
+        self.use_async = use_async
+        self.stt_client = stt_client
         self.graph_builder = StateGraph(AudioAnalysisState)
 
     def audio_summarizer_build_graph(self):
         """
         Builds an audio summarization graph using LangGraph.
-        The flow is: START -> audio_file -> transcribe -> summarize -> END
+        The flow is: START -> audio_file -> preprocess -> transcribe -> summarize -> index -> END
         Note: Chat is handled directly in the UI, not in the graph
         """
         # Node to handle audio file input
-        self.graph_builder.add_node("audio_file", AudioFileNode().process)
+        # Every node runs in a timing span named after it (see utils/metrics.py)
+        self.graph_builder.add_node("audio_file", traced("audio_file", AudioFileNode().process))
+
+        # Node trimming long silences so less audio is uploaded and billed
+        preprocess = apreprocess_node if self.use_async else preprocess_node
+        self.graph_builder.add_node("preprocess", traced("preprocess", preprocess))
 
         # Node for ElevenLabs transcription
-        self.graph_builder.add_node("transcribe", transcribe_node)
+        transcribe = atranscribe_node if self.use_async else transcribe_node
+        self.graph_builder.add_node("transcribe", traced("transcribe", partial(transcribe, client=self.stt_client)))
 
-        # Node for Gemini summarization
-        self.graph_builder.add_node("summarize", summarize_node)
+        # Node for Gemini summarization, using the injected shared client
+        summarize = asummarize_node if self.use_async else summarize_node
+        self.graph_builder.add_node("summarize", traced("summarize", partial(summarize, model=self.llm)))
+
+        # Node adding the call to the cross-call search corpus
+        index = aindex_node if self.use_async else index_node
+        self.graph_builder.add_node("index", traced("index", index))
 
         # Connect the nodes
         self.graph_builder.add_edge(START, "audio_file")
-        self.graph_builder.add_edge("audio_file", "transcribe")
+        self.graph_builder.add_edge("audio_file", "preprocess")
+        self.graph_builder.add_edge("preprocess", "transcribe")
         self.graph_builder.add_edge("transcribe", "summarize")
-        self.graph_builder.add_edge("summarize", END)
+        self.graph_builder.add_edge("summarize", "index")
+        self.graph_builder.add_edge("index", END)
 
-    def setup_graph(self, usecase: str):
+    def setup_graph(self, usecase: str, checkpointer=None):
         """
         Sets up the graph for the selected use case.
+
+        Args:
+            usecase: Selected use case
+            checkpointer: Optional LangGraph checkpointer (e.g. sqlite_checkpointer()); runs of a
+                checkpointed graph need a thread id in their config (see checkpoint_config)
         """
         if usecase == "Audio Summarizer":
             self.audio_summarizer_build_graph()
 
-        return self.graph_builder.compile()
+        return self.graph_builder.compile(checkpointer=checkpointer)
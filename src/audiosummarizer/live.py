@@ -0,0 +1,361 @@
+"""
+Live transcription with a rolling summary for calls in progress.
+
+Audio is read from a growing source as mono 16-bit PCM:
+  - a file that is still being written; ffmpeg follows it and the call is
+    considered over once the file stops growing for --idle-timeout seconds
+  - a local TCP socket receiving raw s16le PCM at --sample-rate, e.g.
+    ffmpeg -i <input> -f s16le -ar 16000 -ac 1 tcp://127.0.0.1:9000
+
+The audio is transcribed in windows of about --window-seconds, cut at the
+quietest point before the target length. Neighbouring windows overlap so
+speaker labels are reconciled the same way as chunked transcription. Every
+--summary-every seconds of new audio, only the new part of the transcript is
+folded into the running summary, so the summary prompt stays small however
+long the call runs. The transcript and summary are printed and, with
+--output, written to a JSON file after every update.
+
+Usage:
+    python -m src.audiosummarizer.live call_in_progress.wav --output live.json
+    python -m src.audiosummarizer.live tcp://127.0.0.1:9000 --output live.json
+"""
+import argparse
+import io
+import json
+import os
+import queue
+import socket
+import subprocess
+import threading
+import time
+import wave
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+from src.audiosummarizer.nodes.summarize_node import fold_summary
+from src.audiosummarizer.nodes.transcribe_node import STT_REQUEST_OPTIONS, TRANSCRIPTION_PARAMS, get_stt_client
+from src.audiosummarizer.utils import metrics
+from src.audiosummarizer.utils.audio_extract import EXTRACT_SAMPLE_RATE
+from src.audiosummarizer.utils.audio_preprocess import frame_energies_db, FRAME_SECONDS
+from src.audiosummarizer.utils.chunked_transcription import ChunkStitcher, OVERLAP_SECONDS, format_words, response_words
+from src.audiosummarizer.utils.rate_limiter import get_limiter
+from src.audiosummarizer.utils.token_tracker import TokenTracker
+
+# Target length of each transcribed window (latency of new transcript text)
+DEFAULT_WINDOW_SECONDS = float(os.getenv("LIVE_WINDOW_SECONDS", "30"))
+
+# New audio folded into the running summary per update
+DEFAULT_SUMMARY_EVERY_SECONDS = float(os.getenv("LIVE_SUMMARY_EVERY_SECONDS", "60"))
+
+# A followed file that has not grown for this long ends the call
+DEFAULT_IDLE_TIMEOUT_SECONDS = 30.0
+
+# How far before the target window end to look for the quietest cut point
+CUT_SEARCH_SECONDS = 5.0
+
+# Bytes read from the source per chunk
+READ_SIZE = 32 * 1024
+
+
+def follow_file(path: str, idle_timeout: float = DEFAULT_IDLE_TIMEOUT_SECONDS, input_format: Optional[str] = None,
+                sample_rate: int = EXTRACT_SAMPLE_RATE) -> Iterator[bytes]:
+    """
+    Decode a file that is still being written to mono s16le PCM, following it as it grows.
+
+    Args:
+        path: Growing audio file
+        idle_timeout: Seconds without new data after which the file is considered complete
+        input_format: ffmpeg input format for headerless files (e.g. "s16le"), None to detect it
+        sample_rate: Output sample rate (and the input rate of headerless PCM)
+
+    Yields:
+        PCM bytes, in order
+    """
+    cmd = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+           "-follow", "1", "-rw_timeout", str(int(idle_timeout * 1_000_000))]
+    if input_format:
+        cmd += ["-f", input_format, "-ar", str(sample_rate), "-ac", "1"]
+    cmd += ["-i", path, "-map", "0:a:0", "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"]
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise Exception("ffmpeg not found: following a growing file needs ffmpeg")
+
+    received = 0
+    try:
+        for chunk in iter(lambda: process.stdout.read(READ_SIZE), b""):
+            received += len(chunk)
+            yield chunk
+        process.wait()
+        # The idle timeout ends ffmpeg with an error; that is only a failure if nothing was decoded
+        if process.returncode != 0 and received == 0:
+            error = process.stderr.read().decode("utf-8", errors="replace").strip()
+            raise Exception(f"ffmpeg exited with code {process.returncode}: {error}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def listen_socket(host: str, port: int) -> Iterator[bytes]:
+    """
+    Accept one TCP connection and yield the raw PCM it sends until it closes.
+
+    Yields:
+        PCM bytes, in order
+    """
+    with socket.create_server((host, port)) as server:
+        print(f"Waiting for PCM audio on {host}:{port}")
+        conn, address = server.accept()
+        print(f"Receiving audio from {address[0]}:{address[1]}")
+        with conn:
+            for chunk in iter(lambda: conn.recv(READ_SIZE), b""):
+                yield chunk
+
+
+def _wav_upload(pcm: bytes, sample_rate: int, name: str) -> tuple:
+    """Wrap PCM in an in-memory WAV as a (filename, file, content type) upload."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(pcm)
+    buffer.seek(0)
+    return name, buffer, "audio/wav"
+
+
+class LiveSession:
+    """Windowed transcription and rolling summary of one call in progress."""
+
+    def __init__(self, model, client=None, sample_rate: int = EXTRACT_SAMPLE_RATE,
+                 window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                 summary_every_seconds: float = DEFAULT_SUMMARY_EVERY_SECONDS,
+                 on_update: Optional[Callable[["LiveSession", bool], None]] = None):
+        """
+        Initialize a live session.
+
+        Args:
+            model: Chat model used for the summary
+            client: Speech-to-text client exposing speech_to_text.convert (defaults to an ElevenLabs client)
+            sample_rate: Sample rate of the fed PCM
+            window_seconds: Target length of each transcribed window
+            summary_every_seconds: New audio folded into the summary per update
+            on_update: Called as on_update(session, summary_updated) after every window and summary update
+        """
+        self.model = model
+        self.client = client or get_stt_client()
+        self.sample_rate = sample_rate
+        self.window = int(window_seconds * sample_rate)
+        self.overlap = int(OVERLAP_SECONDS * sample_rate)
+        self.summary_every_seconds = summary_every_seconds
+        self.on_update = on_update
+        self.words = []            # final words on the call's timeline
+        self.summary = None
+        self.audio_seconds = 0.0   # audio transcribed so far
+        self.finished = False
+        self._pending = []         # words not folded into the summary yet
+        self._summarized_seconds = 0.0
+        self._stitcher = ChunkStitcher()
+        self._tracker = TokenTracker()
+        self._pcm = bytearray()    # received audio from sample _pcm_start on
+        self._pcm_start = 0
+        self._core_start = 0       # first sample not owned by a transcribed window yet
+
+    @property
+    def transcript(self) -> Optional[str]:
+        return format_words(self.words)
+
+    @property
+    def _received(self) -> int:
+        return self._pcm_start + len(self._pcm) // 2
+
+    def feed(self, data: bytes):
+        """Add received PCM and transcribe every window that is complete (including its overlap)."""
+        self._pcm += data
+        while self._received >= self._core_start + self.window + self.overlap:
+            target = self._core_start + self.window
+            cut = self._quietest(max(self._core_start + self.sample_rate,
+                                     target - int(CUT_SEARCH_SECONDS * self.sample_rate)), target)
+            self._transcribe(self._core_start, cut, is_last=False)
+            self._core_start = cut
+            # Keep only the overlap the next window needs
+            drop = self._core_start - self.overlap - self._pcm_start
+            if drop > 0:
+                del self._pcm[:drop * 2]
+                self._pcm_start += drop
+            if self.audio_seconds - self._summarized_seconds >= self.summary_every_seconds:
+                self._fold()
+
+    def finish(self):
+        """Transcribe the remaining audio and fold it into the final summary."""
+        received = self._received
+        if received > self._core_start:
+            self._transcribe(self._core_start, received, is_last=True)
+            self._core_start = received
+        self.finished = True
+        self._fold()
+
+    def _samples(self, start: int, end: int) -> bytes:
+        return bytes(self._pcm[(start - self._pcm_start) * 2:(end - self._pcm_start) * 2])
+
+    def _quietest(self, start: int, end: int) -> int:
+        """Sample index of the quietest frame in [start, end), where cutting is least likely to split a word."""
+        frame_length = int(self.sample_rate * FRAME_SECONDS)
+        energies = frame_energies_db(np.frombuffer(self._samples(start, end), dtype="<i2"), frame_length)
+        if len(energies) == 0:
+            return end
+        return start + int(np.argmin(energies)) * frame_length + frame_length // 2
+
+    def _transcribe(self, core_start: int, core_end: int, is_last: bool):
+        """Transcribe one window (core plus overlap) and keep the words its core owns."""
+        window_start = max(self._pcm_start, core_start - self.overlap)
+        window_end = min(self._received, core_end + self.overlap)
+        pcm = self._samples(window_start, window_end)
+        seconds = (window_end - window_start) / self.sample_rate
+        offset = window_start / self.sample_rate
+        name = f"live_{int(offset)}s.wav"
+
+        # Each window is charged like a transcription of its own, overlap included (it is uploaded again)
+        reservation_id = self._tracker.reserve(seconds, description=f"live window at {offset:.0f}s")
+        if reservation_id is None:
+            raise Exception(f"Insufficient tokens. Need {seconds:.0f} seconds, "
+                            f"but only {self._tracker.get_remaining_tokens()} seconds remaining.")
+        try:
+            with metrics.span("live_window", audio_seconds=seconds, offset_seconds=offset) as window_span:
+                # Each retry gets a fresh upload of the same window
+                transcription = get_limiter("elevenlabs").call(
+                    lambda: self.client.speech_to_text.convert(
+                        file=_wav_upload(pcm, self.sample_rate, name), request_options=STT_REQUEST_OPTIONS,
+                        **TRANSCRIPTION_PARAMS
+                    )
+                )
+                window_span.set(bytes_uploaded=len(pcm) + 44)
+        except Exception:
+            self._tracker.refund(reservation_id)
+            raise
+        self._tracker.commit(reservation_id)
+
+        words = self._stitcher.add(
+            (core_start / self.sample_rate, core_end / self.sample_rate),
+            (offset, window_end / self.sample_rate),
+            response_words(transcription, offset=offset),
+            is_last=is_last,
+        )
+        self.words.extend(words)
+        self._pending.extend(words)
+        self.audio_seconds = core_end / self.sample_rate
+        if self.on_update:
+            self.on_update(self, False)
+
+    def _fold(self):
+        """Fold the words transcribed since the last update into the running summary."""
+        delta = format_words(self._pending)
+        self._pending = []
+        self._summarized_seconds = self.audio_seconds
+        if not delta:
+            return
+        self.summary = fold_summary(self.model, self.summary, delta)
+        if self.on_update:
+            self.on_update(self, True)
+
+
+def run_live(session: LiveSession, chunks: Iterator[bytes]):
+    """
+    Feed a PCM source into the session until it ends (or Ctrl+C), then finish the session.
+
+    The source is read on a separate thread, so a socket or ffmpeg pipe keeps
+    draining while a window is being transcribed or the summary updated.
+    """
+    received = queue.Queue()
+
+    def pump():
+        try:
+            for chunk in chunks:
+                received.put(chunk)
+        except Exception as e:
+            received.put(e)
+        received.put(None)
+
+    threading.Thread(target=pump, name="live-source", daemon=True).start()
+    with metrics.span("live_session"):
+        try:
+            while True:
+                chunk = received.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                session.feed(chunk)
+        except KeyboardInterrupt:
+            print("Stopping: transcribing the remaining audio")
+        session.finish()
+
+
+def _printer(output: Optional[str], source: str):
+    """on_update callback: print new transcript lines and summaries, and write the JSON snapshot."""
+    printed = {"words": 0}
+
+    def on_update(session: LiveSession, summary_updated: bool):
+        new_text = format_words(session.words[printed["words"]:])
+        printed["words"] = len(session.words)
+        if new_text:
+            print(new_text)
+        if summary_updated:
+            label = "Final summary" if session.finished else f"Summary at {session.audio_seconds / 60:.1f} min"
+            print(f"\n📋 {label}:\n{session.summary}\n")
+        if output:
+            snapshot = {
+                "source": source,
+                "audio_seconds": round(session.audio_seconds, 3),
+                "transcript": session.transcript,
+                "summary": session.summary,
+                "final": session.finished,
+                "updated_at": time.time(),
+            }
+            tmp_path = f"{output}.tmp{os.getpid()}"
+            with open(tmp_path, "w") as f:
+                json.dump(snapshot, f)
+            # Atomic rename so readers never see a half-written snapshot
+            os.replace(tmp_path, output)
+
+    return on_update
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe and summarize a call while it is in progress.")
+    parser.add_argument("source", help="Growing audio file, or tcp://host:port to receive raw s16le PCM")
+    parser.add_argument("--output", help="JSON file rewritten with the transcript and summary after every update")
+    parser.add_argument("--format", dest="input_format", help="ffmpeg input format of a headerless file (e.g. s16le)")
+    parser.add_argument("--sample-rate", type=int, default=EXTRACT_SAMPLE_RATE,
+                        help=f"Sample rate of socket/raw PCM input (default: {EXTRACT_SAMPLE_RATE})")
+    parser.add_argument("--window-seconds", type=float, default=DEFAULT_WINDOW_SECONDS,
+                        help=f"Target length of each transcribed window (default: {DEFAULT_WINDOW_SECONDS:g})")
+    parser.add_argument("--summary-every", type=float, default=DEFAULT_SUMMARY_EVERY_SECONDS,
+                        help=f"Seconds of new audio per summary update (default: {DEFAULT_SUMMARY_EVERY_SECONDS:g})")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT_SECONDS,
+                        help="Seconds a followed file may stop growing before the call is considered over")
+    args = parser.parse_args(argv)
+
+    if args.source.startswith("tcp://"):
+        host, _, port = args.source[len("tcp://"):].rpartition(":")
+        chunks = listen_socket(host or "127.0.0.1", int(port))
+    else:
+        chunks = follow_file(args.source, args.idle_timeout, args.input_format, args.sample_rate)
+
+    from src.audiosummarizer.LLMS.geminillm import GeminiLLM
+    session = LiveSession(
+        GeminiLLM().get_llm(),
+        sample_rate=args.sample_rate,
+        window_seconds=args.window_seconds,
+        summary_every_seconds=args.summary_every,
+        on_update=_printer(args.output, args.source),
+    )
+    run_live(session, chunks)
+
+
+if __name__ == "__main__":
+    main()
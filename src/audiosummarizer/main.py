@@ -1,10 +1,25 @@
+import time
 import streamlit as st
 from src.audiosummarizer.ui.streamlitui.loadui import LoadStreamlitUI
 from src.audiosummarizer.LLMS.geminillm import GeminiLLM
-from src.audiosummarizer.graph.audio_graph import AudioGraphBuilder
 from src.audiosummarizer.ui.streamlitui.display_result import DisplayResultStreamlit
-import tempfile
-import os
+from src.audiosummarizer.ui.streamlitui.chat_interface import get_transcript_index
+from src.audiosummarizer.ui.streamlitui.search_page import SearchPage
+from src.audiosummarizer.utils.media_probe import probe_media
+from src.audiosummarizer.utils import metrics
+from src.audiosummarizer.utils.job_queue import JobQueue, JOB_QUEUE_ENABLED, DONE, FAILED, QUEUED
+
+# Seconds between job status checks while a queued job runs
+JOB_POLL_SECONDS = 2
+
+# Progress labels for the graph nodes
+STAGE_LABELS = {
+    "audio_file": "📁 Audio file loaded",
+    "preprocess": "✂️ Silences trimmed",
+    "transcribe": "📝 Transcribed",
+    "summarize": "📋 Summarized",
+    "index": "🔎 Added to search",
+}
 
 def load_langgraph_agenticai_app():
     """
@@ -22,6 +37,11 @@ def load_langgraph_agenticai_app():
         st.error("Error: Failed to load user input from the UI.")
         return
     
+    # Cross-call search replaces the processing page (a running job keeps going in the worker)
+    if user_input.get("view") == "search":
+        SearchPage().display()
+        return
+    
     # Check if audio file is uploaded and process button is clicked
     audio_file = user_input.get("audio_file")
     process_clicked = user_input.get("process_clicked", False)
@@ -29,7 +49,10 @@ def load_langgraph_agenticai_app():
     # If process button was clicked, always process (even if results exist)
     if audio_file is not None and process_clicked:
         # Process button was clicked - always process
-        _process_audio_file(audio_file)
+        _process_audio_file(user_input["media_handle"], user_input.get("bypass_cache", False))
+    elif "job_id" in st.session_state:
+        # A queued job is still running (survives reruns and reloads of this session)
+        _poll_job()
     elif "audio_result" in st.session_state:
         # Show cached results if available
         st.success("✅ Showing cached results")
@@ -44,93 +67,209 @@ def load_langgraph_agenticai_app():
     else:
         st.warning("⚠️ Please upload an audio file to proceed")
 
-def _process_audio_file(audio_file):
+@st.cache_resource(show_spinner=False)
+def get_compiled_graph(usecase, model_id, _llm):
+    """Build and compile the audio processing graph once per use case and model"""
+    # langgraph and the node dependencies load on the first Process click, not at startup
+    from src.audiosummarizer.graph.audio_graph import AudioGraphBuilder, sqlite_checkpointer
+    
+    graph_builder = AudioGraphBuilder(_llm)
+    # Checkpoint every stage so a failed run resumes where it stopped
+    return graph_builder.setup_graph(usecase, checkpointer=sqlite_checkpointer())
+
+def _process_audio_file(media_handle, bypass_cache=False):
     """Process the uploaded audio file and display the LLM output"""
     try:
         # Check if we've already processed this file
-        file_key = f"processed_{audio_file.name}"
+        file_key = f"processed_{media_handle.name}"
         """if file_key in st.session_state:
             st.info("📄 Already processed this file")
             return"""
         
-        # Show processing status
-        with st.spinner("🔄 Processing audio file..."):
-            # Save uploaded file to temporary location
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio_file.name.split('.')[-1]}") as tmp_file:
-                tmp_file.write(audio_file.getvalue())
-                temp_audio_path = tmp_file.name
-
-            # Initialize LLM
-            try:
-                llm = GeminiLLM()
-                model = llm.get_llm()
-            except Exception as e:
-                st.error(f"❌ Failed to initialize LLM: {e}")
-                st.info("💡 Make sure to set your GEMINI_API_KEY environment variable")
-                return
-
-            # Initialize and run the audio processing graph
-            graph_builder = AudioGraphBuilder(model)
-            graph = graph_builder.setup_graph("Audio Summarizer")
-            
-            # Get audio/video duration for token tracking
-            # Check if it's a video file
-            video_extensions = ['.mp4', '.mov', '.avi', '.mkv']
-            is_video = any(audio_file.name.lower().endswith(ext) for ext in video_extensions)
-            
-            import tempfile as tmp
-            temp_check_path = tmp.NamedTemporaryFile(delete=False, suffix=f".{audio_file.name.split('.')[-1]}")
-            temp_check_path.write(audio_file.getvalue())
-            temp_check_path.close()
-            
-            duration_seconds = None
-            try:
-                if is_video:
-                    # Use moviepy for video files
-                    from moviepy import VideoFileClip
-                    video = VideoFileClip(temp_check_path.name)
-                    duration_seconds = float(video.duration) if video.duration else None
-                    video.close()
-                else:
-                    # Use mutagen for audio files
-                    from mutagen import File as MutagenFile
-                    audio_file_obj = MutagenFile(temp_check_path.name)
-                    if audio_file_obj and hasattr(audio_file_obj, 'info') and audio_file_obj.info:
-                        duration_seconds = float(audio_file_obj.info.length) if audio_file_obj.info.length else None
-            except Exception:
-                duration_seconds = None
-            finally:
-                if os.path.exists(temp_check_path.name):
-                    os.unlink(temp_check_path.name)
-            
-            # Create initial state with audio file path and duration
-            initial_state = {
-                "audio_path": temp_audio_path,
-                "transcript": None,
-                "summary": None,
-                "audio_duration_seconds": duration_seconds
-            }
-            
-            # Run the graph
-            result = graph.invoke(initial_state)
-            
-            # Keep audio_path in result for chat to reuse
-            result["audio_path"] = temp_audio_path
-            
-            # Store results in session state
-            st.session_state["audio_result"] = result
-            st.session_state[file_key] = True  # Mark as processed
-            
-            # Display results using DisplayResultStreamlit
-            display_result = DisplayResultStreamlit(
-                usecase="Audio Summarizer",
-                audio_result=result
-            )
-            display_result.display_result_on_ui()
-            
-            # Note: Don't delete temp file yet - chat needs it for graph re-execution
-            # Token usage will be updated in sidebar on next page render
+        # The upload was spooled to disk once by the sidebar; reuse that copy
+        temp_audio_path = media_handle.path
+        
+        # Get audio/video duration for token tracking (memoized probe, already run by the sidebar)
+        duration_seconds = probe_media(media_handle.path, media_handle.content_hash).duration_seconds
+        
+        # Create initial state with audio file path and duration
+        initial_state = {
+            "audio_path": temp_audio_path,
+            "content_hash": media_handle.content_hash,
+            "source_name": media_handle.name,
+            "transcript": None,
+            "transcript_words": None,
+            "summary": None,
+            "audio_duration_seconds": duration_seconds,
+            "bypass_cache": bypass_cache
+        }
+        
+        if JOB_QUEUE_ENABLED:
+            # Hand the run to the worker pool; the page polls the job until it finishes
+            _submit_audio_job(initial_state)
+            return
+
+        # Initialize LLM
+        try:
+            llm = GeminiLLM()
+            model = llm.get_llm()
+        except Exception as e:
+            st.error(f"❌ Failed to initialize LLM: {e}")
+            st.info("💡 Make sure to set your GEMINI_API_KEY environment variable")
+            return
+
+        # Compiled once per process and reused by every click and session
+        graph = get_compiled_graph("Audio Summarizer", llm.model, model)
+        
+        # Page layout: stage progress, transcript, summary (filled in as the graph runs)
+        status = st.status("🔄 Processing audio file...", expanded=True)
+        transcript_area = st.container()
+        summary_area = st.empty()
+        display_result = DisplayResultStreamlit(
+            usecase="Audio Summarizer",
+            audio_result=dict(initial_state)
+        )
+        
+        # Run the graph stage by stage: the transcript renders as soon as the
+        # transcribe node finishes while the summary streams in
+        result = _run_graph_with_progress(graph, initial_state, display_result, status, transcript_area, summary_area)
+        
+        # Keep audio_path in result for chat to reuse
+        result["audio_path"] = temp_audio_path
+        
+        # Store results in session state
+        st.session_state["audio_result"] = result
+        st.session_state[file_key] = True  # Mark as processed
+        
+        # Build the chat retrieval index once, right after transcription
+        if result.get("transcript"):
+            get_transcript_index(str(result["transcript"]), result.get("transcript_words"))
+        
+        # Replace the streamed preview with the formatted summary, then show chat
+        display_result.audio_result = result
+        with summary_area.container():
+            display_result.display_summary()
+        display_result.display_chat()
+        
+        # Token usage will be updated in sidebar on next page render
             
     except Exception as e:
         st.error(f"❌ Error processing audio file: {e}")
         st.exception(e)
+
+def _submit_audio_job(initial_state):
+    """Queue the graph run for the worker pool and start polling it"""
+    job_id = JobQueue().submit(initial_state)
+    # Keep the upload in the workspace until a worker has finished the job
+    from src.audiosummarizer.utils.workspace import get_workspace, JOB_LEASE_SECONDS
+    get_workspace().acquire(initial_state["audio_path"], lease_id=f"job:{job_id}", ttl_seconds=JOB_LEASE_SECONDS)
+    st.session_state["job_id"] = job_id
+    st.session_state.pop("audio_result", None)
+    _poll_job()
+
+def _poll_job():
+    """Show the queued job's progress until it finishes"""
+    _job_status_panel()
+    if "job_id" in st.session_state and not hasattr(st, "fragment"):
+        # No fragments in this Streamlit version: poll by rerunning the whole page
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
+def _job_status_panel():
+    """Render the status of the session's job; on completion store the result and rerun the page"""
+    job_id = st.session_state.get("job_id")
+    job = JobQueue().get(job_id) if job_id else None
+    if job is None:
+        st.session_state.pop("job_id", None)
+        st.warning("⚠️ The processing job could not be found. Please process the file again.")
+        return
+    
+    if job["status"] == DONE:
+        result = job["result"]
+        st.session_state["audio_result"] = result
+        st.session_state.pop("job_id", None)
+        # Build the chat retrieval index once, right after the result arrives
+        if result.get("transcript"):
+            get_transcript_index(str(result["transcript"]), result.get("transcript_words"))
+        st.rerun()
+    
+    if job["status"] == FAILED:
+        st.session_state.pop("job_id", None)
+        st.error(f"❌ Error processing audio file: {job['error']}")
+        return
+    
+    if job["status"] == QUEUED:
+        ahead = job["queue_position"]
+        label = f"⏳ Queued ({ahead} job{'s' if ahead != 1 else ''} ahead)" if ahead else "⏳ Queued, starting soon..."
+    else:
+        label = f"🔄 Processing audio file... ({time.time() - job['started_at']:.0f} s)"
+    with st.status(label, expanded=True):
+        for stage in job["stages"]:
+            st.write(f"✅ {STAGE_LABELS.get(stage['stage'], stage['stage'])} — {stage['seconds']:.1f} s")
+        st.caption("You can close this tab; processing continues in the background.")
+
+if hasattr(st, "fragment"):
+    # Poll by rerunning only the status panel
+    _job_status_panel = st.fragment(run_every=JOB_POLL_SECONDS)(_job_status_panel)
+
+def _run_graph_with_progress(graph, initial_state, display_result, status, transcript_area, summary_area):
+    """
+    Run the graph with stream_mode=["updates", "custom"], reporting per-stage
+    elapsed times, rendering the transcript when it is ready and streaming
+    summary tokens. A run of the same recording that failed earlier resumes at
+    its first incomplete stage (see checkpoint_run). Returns the final state.
+    """
+    from src.audiosummarizer.graph.audio_graph import checkpoint_run, start_or_resume
+
+    # A failed run of the same recording resumes; one still running elsewhere is left alone
+    with checkpoint_run(graph, initial_state["content_hash"]) as config:
+        graph_input, resumed = start_or_resume(graph, initial_state, config)
+        result = dict(initial_state)
+        if resumed:
+            result.update(resumed)
+            status.write("↩️ Resuming the previous run of this file")
+            if result.get("transcript"):
+                display_result.audio_result = result
+                with transcript_area:
+                    display_result.display_transcript()
+                status.update(label="📋 Generating summary...")
+        started = time.perf_counter()
+        stage_started = started
+
+        def summary_tokens():
+            nonlocal stage_started
+            for mode, chunk in graph.stream(graph_input, config, stream_mode=["updates", "custom"]):
+                if mode == "custom":
+                    if "summary_token" in chunk:
+                        yield chunk["summary_token"]
+                    continue
+
+                for node, update in chunk.items():
+                    now = time.perf_counter()
+                    status.write(f"✅ {STAGE_LABELS.get(node, node)} — {now - stage_started:.1f} s")
+                    stage_started = now
+                    if update:
+                        result.update(update)
+                    if node == "transcribe":
+                        display_result.audio_result = result
+                        with transcript_area:
+                            display_result.display_transcript()
+                        status.update(label="📋 Generating summary...")
+
+        try:
+            # Root span of the run; the node spans nest under it
+            with metrics.span("process_audio", audio_seconds=initial_state.get("audio_duration_seconds") or 0.0,
+                              bypass_cache=bool(initial_state.get("bypass_cache"))):
+                with summary_area.container():
+                    st.markdown("## 📋 Audio Summary")
+                    st.write_stream(summary_tokens())
+        except Exception:
+            status.update(label="❌ Processing failed", state="error")
+            raise
+
+    status.update(
+        label=f"✅ Audio processing completed in {time.perf_counter() - started:.1f} s",
+        state="complete",
+        expanded=False
+    )
+    return result
@@ -0,0 +1,52 @@
+import asyncio
+import os
+from src.audiosummarizer.state.audio_state import AudioAnalysisState
+from src.audiosummarizer.utils.corpus_store import get_corpus_store
+from src.audiosummarizer.utils.transcript_cache import hash_file
+from src.audiosummarizer.utils.transcript_index import parse_turns
+from src.audiosummarizer.utils.transcript_model import CompactTranscript
+from src.audiosummarizer.utils import metrics
+
+# Set to 0 to stop adding processed calls to the searchable corpus
+INDEX_ENABLED = os.getenv("CORPUS_INDEX", "1").lower() in ("1", "true", "yes")
+
+def index_node(state: AudioAnalysisState):
+    """
+    Add the processed call to the cross-call search corpus
+
+    Stores the summary and one row per speaker turn (with its start time) so
+    the call can be found from the search page. Processing the same recording
+    again replaces its entry. Indexing never fails the run: the transcript and
+    summary are already available to the caller.
+    """
+    if not INDEX_ENABLED or not state.get("transcript"):
+        return state
+    
+    try:
+        turns = _turns(state)
+        content_hash = state.get("content_hash") or hash_file(state["audio_path"])
+        name = state.get("source_name") or os.path.basename(state["audio_path"])
+        get_corpus_store().add_call(content_hash, name, state.get("summary"), turns,
+                                    duration_seconds=state.get("audio_duration_seconds"))
+        metrics.annotate(turns=len(turns))
+    except Exception as e:
+        print(f"Error indexing call for search: {e}")
+        metrics.annotate(skipped="error")
+    return state
+
+async def aindex_node(state: AudioAnalysisState):
+    """
+    Async variant of index_node.
+    The SQLite write runs in a worker thread so the event loop stays free.
+    """
+    return await asyncio.to_thread(index_node, state)
+
+def _turns(state: AudioAnalysisState) -> list:
+    """Speaker turns as {"start", "speaker", "text"} dicts, from the word timings when available."""
+    if state.get("transcript_words"):
+        return [
+            {"start": start, "speaker": speaker, "text": text}
+            for start, _, speaker, text in CompactTranscript.from_bytes(state["transcript_words"]).turns()
+        ]
+    return [{"start": turn["start"], "speaker": turn["speaker"], "text": turn["text"]}
+            for turn in parse_turns(str(state["transcript"]))]
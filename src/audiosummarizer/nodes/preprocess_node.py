@@ -0,0 +1,62 @@
+import asyncio
+import os
+from src.audiosummarizer.state.audio_state import AudioAnalysisState
+from src.audiosummarizer.utils.transcript_cache import TranscriptCache, hash_file
+from src.audiosummarizer.utils.media_probe import ffmpeg_available
+from src.audiosummarizer.utils.audio_preprocess import trim_silence, AudioPreprocessError
+from src.audiosummarizer.utils.workspace import get_workspace
+from src.audiosummarizer.nodes.transcribe_node import TRANSCRIPTION_PARAMS
+from src.audiosummarizer.utils import metrics
+
+# Set to 0 to upload recordings as-is, without silence trimming
+PREPROCESS_ENABLED = os.getenv("PREPROCESS_AUDIO", "1").lower() in ("1", "true", "yes")
+
+def preprocess_node(state: AudioAnalysisState):
+    """
+    Trim long silences from the recording before transcription
+
+    Decodes to mono 16 kHz, drops long non-speech spans and stores the trimmed
+    upload (preprocessed_path), its length (speech_seconds, which is what gets
+    billed) and the offset map used to put word timestamps back on the
+    original timeline. Without ffmpeg, or when trimming would not help, the
+    original file is transcribed unchanged.
+    """
+    state["preprocessed_path"] = None
+    state["offset_map"] = None
+    state["speech_seconds"] = None
+    if not PREPROCESS_ENABLED or not ffmpeg_available():
+        return state
+    
+    # Cached transcripts are served without touching the audio
+    content_hash = state.get("content_hash") or hash_file(state["audio_path"])
+    if TranscriptCache().contains(TranscriptCache.make_key(content_hash, TRANSCRIPTION_PARAMS)):
+        metrics.annotate(skipped="cached")
+        return state
+    
+    try:
+        # Written to the workspace scratch directory; the transcribe node deletes it
+        trimmed = trim_silence(state["audio_path"], out_dir=str(get_workspace().scratch_dir))
+    except AudioPreprocessError as e:
+        # Trimming is an optimization: fall back to the original upload
+        print(f"Silence trimming failed, transcribing the original file: {e}")
+        metrics.annotate(skipped="error")
+        return state
+    if trimmed is None:
+        metrics.annotate(skipped="no_gain")
+        return state
+    
+    print(f"Trimmed {trimmed.original_seconds - trimmed.duration_seconds:.1f} s of silence "
+          f"({trimmed.original_seconds:.1f} s -> {trimmed.duration_seconds:.1f} s)")
+    metrics.annotate(speech_seconds=trimmed.duration_seconds)
+    state["preprocessed_path"] = trimmed.path
+    state["offset_map"] = trimmed.offset_map
+    state["speech_seconds"] = trimmed.duration_seconds
+    return state
+
+async def apreprocess_node(state: AudioAnalysisState):
+    """
+    Async variant of preprocess_node.
+    Decoding and encoding run in ffmpeg subprocesses fed from a worker
+    thread, so the event loop stays free for other graph runs.
+    """
+    return await asyncio.to_thread(preprocess_node, state)
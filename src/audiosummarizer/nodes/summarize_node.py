@@ -1,26 +1,28 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from langgraph.config import get_stream_writer
 from src.audiosummarizer.state.audio_state import AudioAnalysisState
 from src.audiosummarizer.LLMS.geminillm import GeminiLLM
+from src.audiosummarizer.utils import metrics
+from src.audiosummarizer.utils.response_cache import ResponseCache, model_name
+from src.audiosummarizer.utils.rate_limiter import get_limiter
 
-def summarize_node(state: AudioAnalysisState):
-    """Summarize the transcript using Gemini LLM"""
-    
-    # Check if transcript exists and is not empty
-    transcript = state.get('transcript')
-    if not transcript:
-        state["summary"] = "Error: No transcript available to summarize."
-        return state
-    
-    # Ensure transcript is a string
-    transcript_text = str(transcript) if not isinstance(transcript, str) else transcript
-    
-    # Initialize Gemini LLM and create a simple summarization prompt
-    llm = GeminiLLM()
-    model = llm.get_llm()
-    
-    # Create a summarization prompt
-    prompt = f"""
-    
-        You are an expert customer support analyst. You will receive the transcript of a customer call. 
+# Transcripts estimated above this many tokens are summarized map-reduce style
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "30000"))
+
+# Parallel chunk summaries in the map step
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+
+# Bump when any summary prompt below changes so cached summaries are not reused
+SUMMARY_TEMPLATE_VERSION = "1"
+
+# Rough characters-per-token ratio used to measure text without an API call
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = """
+
+        You are an expert customer support analyst. You will receive the transcript of a customer call.
         Your task is to analyze the transcript and provide a structured summary in the following format:
 
         1. **Customer Issue:** Briefly describe the problem or request the customer has.
@@ -29,13 +31,271 @@ def summarize_node(state: AudioAnalysisState):
         4. **Customer Sentiment:** Identify the customer's sentiment (e.g., frustrated, satisfied, neutral).
         5. **Key Points / Notes:** List any other important points or observations.
 
-        Transcript: {transcript_text}
-        
+        Transcript: {transcript}
+
 
         Provide the summary in **clear, concise sentences**, using bullet points where appropriate. Avoid adding information not present in the transcript.
         """
-    
-    # Get summary from Gemini
-    response = model.invoke(prompt)
-    state["summary"] = response.content if hasattr(response, 'content') else str(response)
-    return state
\ No newline at end of file
+
+MAP_PROMPT = """
+        You are an expert customer support analyst. You will receive part {index} of {total} of a customer call transcript.
+        Take notes on this part only, under these headings:
+
+        - Customer Issue
+        - Context / Background
+        - Actions Taken / Suggested
+        - Customer Sentiment
+        - Key Points / Notes
+
+        Keep timestamps and speaker labels for important moments. Write "None in this part" under a heading with nothing to report.
+        Avoid adding information not present in the transcript.
+
+        Transcript part {index}/{total}: {transcript}
+        """
+
+REDUCE_PROMPT = """
+        You are an expert customer support analyst. You will receive notes taken on consecutive parts of one customer call, in order.
+        Combine them into a single structured summary of the whole call in the following format:
+
+        1. **Customer Issue:** Briefly describe the problem or request the customer has.
+        2. **Context / Background:** Any relevant context or history mentioned in the call.
+        3. **Actions Taken / Suggested:** Any actions, solutions, or advice provided during the call.
+        4. **Customer Sentiment:** Identify the customer's sentiment (e.g., frustrated, satisfied, neutral), including how it changed over the call.
+        5. **Key Points / Notes:** List any other important points or observations.
+
+        Notes: {notes}
+
+
+        Provide the summary in **clear, concise sentences**, using bullet points where appropriate. Avoid adding information not present in the notes.
+        """
+
+COMBINE_PROMPT = """
+        You will receive notes taken on consecutive parts of one customer call, in order.
+        Merge them into one set of notes under the same headings, removing repetition but keeping every distinct fact.
+
+        Notes: {notes}
+        """
+
+FOLD_PROMPT = """
+        You are an expert customer support analyst following a customer call that is still in progress.
+        You will receive your running summary of the call so far and the newest part of the transcript.
+        Update the summary so it covers the whole call up to now, in the following format:
+
+        1. **Customer Issue:** Briefly describe the problem or request the customer has.
+        2. **Context / Background:** Any relevant context or history mentioned in the call.
+        3. **Actions Taken / Suggested:** Any actions, solutions, or advice provided during the call.
+        4. **Customer Sentiment:** Identify the customer's sentiment (e.g., frustrated, satisfied, neutral), including how it changed over the call.
+        5. **Key Points / Notes:** List any other important points or observations.
+
+        Keep every fact from the running summary unless the new transcript corrects it.
+
+        Running summary: {summary}
+
+        New transcript: {transcript}
+
+
+        Provide the summary in **clear, concise sentences**, using bullet points where appropriate. Avoid adding information not present in the summary or the transcript.
+        """
+
+
+def summarize_node(state: AudioAnalysisState, model=None):
+    """Summarize the transcript using Gemini LLM (the injected model, or the shared client)"""
+
+    # Check if transcript exists and is not empty
+    transcript = state.get('transcript')
+    if not transcript:
+        state["summary"] = "Error: No transcript available to summarize."
+        return state
+
+    # Ensure transcript is a string
+    transcript_text = str(transcript) if not isinstance(transcript, str) else transcript
+
+    if model is None:
+        model = GeminiLLM().get_llm()
+
+    # Reuse a cached summary unless the run explicitly bypasses the response cache
+    cache = ResponseCache()
+    cache_key = _summary_cache_key(cache, model, transcript_text)
+    summary = None if state.get("bypass_cache") else cache.get(cache_key, "summary")
+    cache_hit = summary is not None
+    emit = _summary_writer()
+    if summary is None:
+        summary = summarize_transcript(model, transcript_text, on_token=emit)
+        cache.put(cache_key, "summary", summary)
+    else:
+        emit(summary)
+
+    metrics.annotate(cache_hit=cache_hit, prompt_chars=len(transcript_text), response_chars=len(summary or ""))
+    state["summary"] = summary
+    return state
+
+
+async def asummarize_node(state: AudioAnalysisState, model=None):
+    """
+    Async variant of summarize_node.
+    The Gemini calls run in a worker thread through the same code path, so the
+    event loop stays free for other graph runs.
+    """
+    return await asyncio.to_thread(summarize_node, state, model)
+
+
+def _summary_cache_key(cache: ResponseCache, model, transcript_text: str) -> str:
+    template_version = f"{SUMMARY_TEMPLATE_VERSION}:{SUMMARY_TOKEN_BUDGET}"
+    return cache.make_key(model_name(model), template_version, transcript_text)
+
+
+def summarize_transcript(model, transcript_text: str, token_budget: int = SUMMARY_TOKEN_BUDGET,
+                         on_token=None) -> str:
+    """
+    Summarize a transcript in the five-section format.
+
+    Transcripts within the token budget take a single call. Longer ones are
+    split on speaker turns, the parts are summarized in parallel (map) and the
+    notes are combined into the final summary (reduce). If on_token is given,
+    the final call is streamed and each text chunk is passed to it.
+    """
+    if estimate_tokens(transcript_text) <= token_budget:
+        return _invoke(model, SUMMARY_PROMPT.format(transcript=transcript_text), on_token)
+
+    parts = split_transcript(transcript_text, token_budget)
+    print(f"Transcript exceeds {token_budget} tokens; summarizing {len(parts)} parts")
+    prompts = [
+        MAP_PROMPT.format(index=i + 1, total=len(parts), transcript=part)
+        for i, part in enumerate(parts)
+    ]
+    notes = _batch(model, prompts)
+    return _reduce(model, notes, token_budget, on_token)
+
+
+def fold_summary(model, summary, transcript_delta: str, on_token=None) -> str:
+    """
+    Fold a new part of a transcript into a running summary (for calls in progress).
+
+    The prompt holds the previous summary and only the new transcript, so its
+    size stays flat however long the call runs. Without a previous summary the
+    delta is summarized like a complete transcript.
+    """
+    if not summary:
+        return summarize_transcript(model, transcript_delta, on_token=on_token)
+    with metrics.span("summary_fold", prompt_chars=len(summary) + len(transcript_delta)) as fold:
+        updated = _invoke(model, FOLD_PROMPT.format(summary=summary, transcript=transcript_delta), on_token)
+        fold.set(response_chars=len(updated))
+    return updated
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer round-trip)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_transcript(transcript_text: str, token_budget: int) -> list:
+    """
+    Split a transcript into parts within the token budget, on speaker-turn (line) boundaries.
+
+    A single turn longer than the budget is split on word boundaries.
+    """
+    max_chars = token_budget * CHARS_PER_TOKEN
+    parts = []
+    current = []
+    current_len = 0
+    for line in transcript_text.splitlines():
+        pieces = [line]
+        if len(line) > max_chars:
+            pieces = _split_long_line(line, max_chars)
+        for piece in pieces:
+            if current and current_len + len(piece) + 1 > max_chars:
+                parts.append("\n".join(current))
+                current = []
+                current_len = 0
+            current.append(piece)
+            current_len += len(piece) + 1
+    if current:
+        parts.append("\n".join(current))
+    return parts
+
+
+def _split_long_line(line: str, max_chars: int) -> list:
+    pieces = []
+    current = []
+    current_len = 0
+    for word in line.split(" "):
+        if current and current_len + len(word) + 1 > max_chars:
+            pieces.append(" ".join(current))
+            current = []
+            current_len = 0
+        current.append(word)
+        current_len += len(word) + 1
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _reduce(model, notes: list, token_budget: int, on_token=None) -> str:
+    """Combine part notes into the final summary, merging in rounds if they don't fit in one prompt."""
+    joined = _join_notes(notes)
+    while estimate_tokens(joined) > token_budget and len(notes) > 1:
+        groups = _group_notes(notes, token_budget)
+        if len(groups) == len(notes):
+            break  # each note alone fills the budget; merging further won't shrink the prompt
+        notes = _batch(model, [COMBINE_PROMPT.format(notes=_join_notes(group)) for group in groups])
+        joined = _join_notes(notes)
+    return _invoke(model, REDUCE_PROMPT.format(notes=joined), on_token)
+
+
+def _join_notes(notes: list) -> str:
+    return "\n\n".join(f"Part {i + 1}:\n{note}" for i, note in enumerate(notes))
+
+
+def _group_notes(notes: list, token_budget: int) -> list:
+    groups = []
+    current = []
+    current_tokens = 0
+    for note in notes:
+        tokens = estimate_tokens(note)
+        if current and current_tokens + tokens > token_budget:
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(note)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _summary_writer():
+    """
+    Return a callback that streams summary text to graph.stream(stream_mode="custom")
+    consumers as {"summary_token": text} chunks. Outside a graph run it does nothing.
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return lambda text: None
+    return lambda text: writer({"summary_token": text})
+
+
+def _content(response) -> str:
+    return response.content if hasattr(response, 'content') else str(response)
+
+
+# Gemini calls go through the process-wide limiter (quota, concurrency cap, retries)
+
+def _invoke(model, prompt: str, on_token=None) -> str:
+    if on_token is None:
+        return _content(get_limiter("gemini").call(model.invoke, prompt))
+
+    parts = []
+    for chunk in get_limiter("gemini").stream(model.stream, prompt):
+        text = _content(chunk)
+        if text:
+            parts.append(text)
+            on_token(text)
+    return "".join(parts)
+
+
+def _batch(model, prompts: list) -> list:
+    limiter = get_limiter("gemini")
+    with ThreadPoolExecutor(max_workers=SUMMARY_MAX_CONCURRENCY) as pool:
+        responses = list(pool.map(lambda prompt: limiter.call(model.invoke, prompt), prompts))
+    return [_content(response) for response in responses]
@@ -1,231 +1,227 @@
-import requests
+import asyncio
 from src.audiosummarizer.state.audio_state import AudioAnalysisState
 import os
-from io import BytesIO
 from dotenv import load_dotenv
-from elevenlabs.client import ElevenLabs
-import subprocess
-import tempfile
-from mutagen import File as MutagenFile
 from src.audiosummarizer.utils.token_tracker import TokenTracker
-from moviepy import VideoFileClip
+from src.audiosummarizer.utils.transcript_cache import TranscriptCache, hash_file
+from src.audiosummarizer.utils.media_probe import probe_media, ffmpeg_available
+from src.audiosummarizer.utils.audio_extract import open_audio_stream
+from src.audiosummarizer.utils.chunked_transcription import (
+    should_chunk, plan_windows, uploaded_seconds, transcribe_in_chunks, format_words, response_words
+)
+from src.audiosummarizer.utils.transcript_model import CompactTranscript
+from src.audiosummarizer.utils.audio_preprocess import remap_words
+from src.audiosummarizer.utils.rate_limiter import get_limiter
+from src.audiosummarizer.utils import metrics
+from src.audiosummarizer.utils.workspace import remove_quietly
 
 load_dotenv()
 
-def transcribe_node(state: AudioAnalysisState):
-    """Transcribe the audio or video file using ElevenLabs with diarization (speaker labels)"""
+# Parameters sent to ElevenLabs speech_to_text; also part of the transcript cache key
+TRANSCRIPTION_PARAMS = {
+    "model_id": "scribe_v1",
+    "tag_audio_events": False,
+    "language_code": "eng",
+    "diarize": True,
+}
+
+# The rate limiter is the only retry layer: SDK retries would run inside its slot, hide
+# throttling from its backoff and re-send an upload stream that was already drained
+STT_REQUEST_OPTIONS = {"max_retries": 0}
+
+def transcribe_node(state: AudioAnalysisState, client=None):
+    """
+    Transcribe the audio or video file using ElevenLabs with diarization (speaker labels)
+
+    Args:
+        state: Graph state
+        client: Speech-to-text client exposing speech_to_text.convert (defaults to an ElevenLabs client)
+    """
     
     audio_path = state["audio_path"]
     
+    # Serve repeated recordings from the transcript cache (no API call, no token usage)
+    cache = TranscriptCache()
+    content_hash = state.get("content_hash") or hash_file(audio_path)
+    cache_key = cache.make_key(content_hash, TRANSCRIPTION_PARAMS)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        print(f"Transcript cache hit for {audio_path}")
+        metrics.annotate(cache_hit=True)
+        words = cached.get("words")
+        compact = CompactTranscript.from_base64(words) if words else None
+        # Rebuilt from the words: entries written by older versions may hold a timestamp-less transcript
+        state["transcript"] = (compact and compact.to_text()) or cached["transcript"]
+        state["transcript_words"] = compact.to_bytes() if compact else None
+        return state
+    
     # Get audio duration for token tracking
     duration_seconds = state.get("audio_duration_seconds")
     if duration_seconds is None:
-        # Calculate duration if not provided
-        duration_seconds = _get_audio_duration_seconds(audio_path)
-    
-    # Track token usage before transcription
-    tracker = TokenTracker()
-    if duration_seconds:
-        if not tracker.use_tokens(duration_seconds):
-            raise Exception(f"Insufficient tokens. Need {duration_seconds} seconds, but only {tracker.get_remaining_tokens()} seconds remaining.")
-    
-    # Check if file is a video format that needs audio extraction
-    video_extensions = ['.mp4', '.mov', '.avi', '.mkv']
-    is_video = any(audio_path.lower().endswith(ext) for ext in video_extensions)
+        # Calculate duration if not provided (memoized by content hash)
+        duration_seconds = probe_media(audio_path, content_hash).duration_seconds
     
-    # If it's a video file, extract audio first
-    if is_video:
-        temp_audio_path = _extract_audio_from_video(audio_path)
-        audio_path_to_process = temp_audio_path
-    else:
-        audio_path_to_process = audio_path
-    
-    elevenlabs = ElevenLabs(
-       api_key=os.getenv("ELEVENLABS_API_KEY"),
-    )
-
-    # Transcribe the audio file with diarization
-    with open(audio_path_to_process, "rb") as f:
-        transcription = elevenlabs.speech_to_text.convert(
-        file=f,
-        model_id="scribe_v1",
-        tag_audio_events=False,
-        language_code="eng",
-        diarize=True,
-    )
+    # Upload the silence-trimmed audio when the preprocess node produced it (it may be
+    # gone if this is a resumed run); only the trimmed seconds are billed
+    upload_path, upload_seconds, offset_map = audio_path, duration_seconds, None
+    preprocessed_path = state.get("preprocessed_path")
+    if preprocessed_path and os.path.exists(preprocessed_path):
+        upload_path, upload_seconds, offset_map = preprocessed_path, state.get("speech_seconds"), state.get("offset_map")
     
-    # If we created a temporary audio file, clean it up
-    if is_video:
-        os.unlink(temp_audio_path)
+    # Long recordings are planned up front: chunk overlaps are uploaded (and billed) twice
+    plan = None
+    billed_seconds = upload_seconds
+    if should_chunk(upload_seconds) and ffmpeg_available():
+        plan = plan_windows(upload_path, upload_seconds)
+        billed_seconds = uploaded_seconds(plan)
     
-    # Extract and format transcript with speaker labels if diarization is enabled
-    transcript_text = None
+    metrics.annotate(cache_hit=False, audio_seconds=duration_seconds or 0.0, billed_seconds=billed_seconds or 0.0)
     
-    # Debug: Print transcription object attributes to understand structure
-    print(f"Transcription object type: {type(transcription)}")
-    print(f"Transcription object attributes: {dir(transcription)}")
+    # Reserve tokens before transcription; they are only charged once it succeeds
+    tracker = TokenTracker()
+    reservation_id = None
+    if billed_seconds:
+        reservation_id = tracker.reserve(billed_seconds, description=f"{os.path.basename(audio_path)} ({content_hash[:12]})")
+        if reservation_id is None:
+            raise Exception(f"Insufficient tokens. Need {billed_seconds} seconds, but only {tracker.get_remaining_tokens()} seconds remaining.")
     
-    # Check if transcription has segments (diarized response)
-    # ElevenLabs may return segments in different formats
-    if hasattr(transcription, 'segments') and transcription.segments:
-        # Format transcript with speaker labels
-        formatted_segments = []
-        for segment in transcription.segments:
-            speaker = getattr(segment, 'speaker', getattr(segment, 'speaker_label', 'Unknown'))
-            text = getattr(segment, 'text', getattr(segment, 'transcript', str(segment)))
-            start_time = getattr(segment, 'start', getattr(segment, 'start_time', None))
-            
-            # Format: [Time] Speaker X: text
-            if start_time is not None:
-                mins, secs = divmod(int(start_time), 60)
-                time_str = f"[{mins:02d}:{secs:02d}]"
-                formatted_segments.append(f"{time_str} Speaker {speaker}: {text}")
-            else:
-                formatted_segments.append(f"Speaker {speaker}: {text}")
-        
-        transcript_text = "\n".join(formatted_segments)
-    # Check if transcription has words with speaker info (alternative format)
-    elif hasattr(transcription, 'words') and transcription.words:
-        # Group words by speaker
-        current_speaker = None
-        current_text = []
-        formatted_segments = []
-        
-        for word in transcription.words:
-            speaker = getattr(word, 'speaker', getattr(word, 'speaker_label', 'Unknown'))
-            word_text = getattr(word, 'word', getattr(word, 'text', ''))
-            
-            if speaker != current_speaker:
-                if current_speaker is not None and current_text:
-                    formatted_segments.append(f"Speaker {current_speaker}: {' '.join(current_text)}")
-                current_speaker = speaker
-                current_text = [word_text]
-            else:
-                current_text.append(word_text)
-        
-        # Add the last segment
-        if current_speaker is not None and current_text:
-            formatted_segments.append(f"Speaker {current_speaker}: {' '.join(current_text)}")
-        
-        transcript_text = "\n".join(formatted_segments) if formatted_segments else None
-    # Check if text already contains speaker labels (some APIs return formatted text)
-    elif hasattr(transcription, 'text'):
-        text = transcription.text
-        # Check if text already has speaker labels (e.g., "Speaker 1:", "[SPEAKER_1]", etc.)
-        if 'Speaker' in text or 'SPEAKER' in text or '[Speaker' in text:
-            transcript_text = text  # Already formatted
-        else:
-            # Plain text - try to get segments if available
-            if hasattr(transcription, '__dict__'):
-                # Try accessing segments via dict
-                trans_dict = transcription.__dict__
-                if 'segments' in trans_dict and trans_dict['segments']:
-                    segments = trans_dict['segments']
-                    formatted = []
-                    for seg in segments:
-                        if isinstance(seg, dict):
-                            speaker = seg.get('speaker', seg.get('speaker_label', 'Unknown'))
-                            text = seg.get('text', seg.get('transcript', ''))
-                            formatted.append(f"Speaker {speaker}: {text}")
-                        else:
-                            speaker = getattr(seg, 'speaker', 'Unknown')
-                            text = getattr(seg, 'text', str(seg))
-                            formatted.append(f"Speaker {speaker}: {text}")
-                    transcript_text = "\n".join(formatted) if formatted else text
-                else:
-                    transcript_text = text
-            else:
-                transcript_text = text
-    elif isinstance(transcription, str):
-        transcript_text = transcription
-    else:
-        # Try to convert to string or inspect further
-        transcript_text = str(transcription)
+    try:
+        transcript_text, words = _run_transcription(upload_path, upload_seconds, client, offset_map, plan)
+    except Exception:
+        # Failed transcriptions give their seconds back
+        if reservation_id is not None:
+            tracker.refund(reservation_id)
+        raise
+    finally:
+        if upload_path != audio_path:
+            remove_quietly(upload_path)
+    if reservation_id is not None:
+        tracker.commit(reservation_id)
     
+    # Word timings kept alongside the text as a compact column store
+    compact = CompactTranscript.from_words(words) if words else None
     state["transcript"] = transcript_text
+    state["transcript_words"] = compact.to_bytes() if compact else None
+    if transcript_text:
+        entry = {"transcript": transcript_text, "audio_duration_seconds": duration_seconds}
+        if compact:
+            entry["words"] = compact.to_base64()
+        cache.put(cache_key, entry)
     print(f"Transcript: {state['transcript'][:200]}...")  # Print first 200 chars
     return state
 
-def _get_audio_duration_seconds(audio_path: str) -> float:
-    """Get audio/video duration in seconds using mutagen, moviepy, or ffprobe."""
-    # Check if it's a video file
+async def atranscribe_node(state: AudioAnalysisState, client=None):
+    """
+    Async variant of transcribe_node.
+    Hashing, ffmpeg and the ElevenLabs upload are blocking, so they run in a
+    worker thread and the event loop stays free for other graph runs.
+    """
+    return await asyncio.to_thread(transcribe_node, state, client)
+
+def get_stt_client():
+    """Create an ElevenLabs client from ELEVENLABS_API_KEY"""
+    # Imported here so the SDK only loads when a transcription actually runs
+    from elevenlabs.client import ElevenLabs
+
+    return ElevenLabs(
+       api_key=os.getenv("ELEVENLABS_API_KEY"),
+    )
+
+def _run_transcription(audio_path, duration_seconds, client=None, offset_map=None, plan=None):
+    """
+    Send the recording to ElevenLabs (in chunks for long recordings).
+
+    Args:
+        audio_path: File to upload (the original or the silence-trimmed audio)
+        duration_seconds: Length of that file
+        client: Speech-to-text client (defaults to an ElevenLabs client)
+        offset_map: For trimmed audio, the map back to the original timeline (see audio_preprocess)
+        plan: Chunks from plan_windows when the caller already planned a chunked transcription
+
+    Returns:
+        (transcript_text, words) - the formatted transcript and the timed word list (see response_words),
+        with timestamps on the original recording's timeline
+    """
+    # Check if file is a video format that needs audio extraction
     video_extensions = ['.mp4', '.mov', '.avi', '.mkv']
     is_video = any(audio_path.lower().endswith(ext) for ext in video_extensions)
     
-    # For video files, try moviepy first
-    if is_video:
-        try:
-            video = VideoFileClip(audio_path)
-            duration = video.duration
-            video.close()
-            if duration:
-                return float(duration)
-        except Exception:
-            pass
-    
-    # Try using mutagen for audio files
-    try:
-        audio_file = MutagenFile(audio_path)
-        if audio_file is not None and hasattr(audio_file, 'info') and audio_file.info:
-            duration = audio_file.info.length
-            if duration:
-                return float(duration)
-    except Exception:
-        pass
+    if client is None:
+        client = get_stt_client()
+
+    # Shared with every other transcription in the process: quota, concurrency cap and backoff
+    limiter = get_limiter("elevenlabs")
+
+    def request(upload):
+        with metrics.span("stt_request") as request_span:
+            transcription = client.speech_to_text.convert(
+                file=upload,
+                request_options=STT_REQUEST_OPTIONS,
+                **TRANSCRIPTION_PARAMS,
+            )
+            request_span.set(bytes_uploaded=_uploaded_bytes(upload))
+            return transcription
+
+    def convert(upload):
+        # One rate-limited request; chunks are retried by transcribe_in_chunks with a fresh upload
+        with limiter.slot():
+            return request(upload)
+
+    chunked = plan is not None or (should_chunk(duration_seconds) and ffmpeg_available())
+    metrics.annotate(chunked=chunked)
+    if chunked:
+        # Long recording: transcribe silence-aligned chunks concurrently and stitch them
+        words = remap_words(transcribe_in_chunks(audio_path, duration_seconds, convert, plan=plan), offset_map)
+        transcript_text = format_words(words)
+    else:
+        def attempt():
+            # Video files: stream only the audio track through ffmpeg straight into the upload
+            if is_video:
+                upload = _open_audio_from_video(audio_path)
+                audio_stream = upload[1]
+            else:
+                audio_stream = open(audio_path, "rb")
+                upload = audio_stream
+
+            # Transcribe the audio file with diarization
+            try:
+                return request(upload)
+            finally:
+                audio_stream.close()
+
+        # Each retry opens a fresh upload (an ffmpeg stream cannot be rewound)
+        transcription = limiter.call(attempt)
+        
+        words = remap_words(response_words(transcription), offset_map)
+        # Same "[mm:ss] Speaker X:" lines as the chunked path, on the original recording's timeline
+        transcript_text = format_words(words) or getattr(transcription, "text", None)
     
-    # Fallback: try ffprobe if available
+    return transcript_text, words
+
+def _uploaded_bytes(upload):
+    """Bytes read from an upload so far (a file object, or a (filename, stream, content type) tuple)"""
+    stream = upload[1] if isinstance(upload, tuple) else upload
+    if hasattr(stream, "bytes_read"):
+        return stream.bytes_read
     try:
-        result = subprocess.run(
-            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', audio_path],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        duration = float(result.stdout.strip())
-        return duration
-    except (subprocess.CalledProcessError, ValueError, FileNotFoundError):
-        # If all else fails, return None (will be handled by caller)
+        return stream.tell()
+    except (OSError, ValueError):
         return None
 
-def _extract_audio_from_video(video_path):
-    """Extract audio from video file using moviepy"""
-    output_path = tempfile.mktemp(suffix='.wav')
-    
-    try:
-        # Use moviepy to extract audio from video
-        video = VideoFileClip(video_path)
-        audio = video.audio
-        
-        # Write audio to temporary file
-        # Note: moviepy will use ffmpeg under the hood
-        # Use wav format with PCM codec (compatible with ElevenLabs)
-        # MoviePy 2.x has different parameters - removed verbose and logger
-        audio.write_audiofile(
-            output_path,
-            codec='pcm_s16le',  # 16-bit PCM
-            fps=16000  # Sample rate (16kHz)
+def _open_audio_from_video(video_path):
+    """Open the audio track of a video file as a streaming (filename, file, content type) upload"""
+    if not ffmpeg_available():
+        raise Exception(
+            "❌ **ffmpeg not found**\n\n"
+            "ffmpeg is required to extract audio from video files. Please install ffmpeg:\n\n"
+            "**On macOS:**\n"
+            "```bash\nbrew install ffmpeg\n```\n\n"
+            "**On Linux (Ubuntu/Debian):**\n"
+            "```bash\nsudo apt-get update\nsudo apt-get install ffmpeg\n```\n\n"
+            "**On Windows:**\n"
+            "Download from https://ffmpeg.org/download.html or use:\n"
+            "```bash\nchoco install ffmpeg\n```\n\n"
+            "After installing, restart the application."
         )
-        
-        # Close the clips to free up resources
-        audio.close()
-        video.close()
-        
-        return output_path
-    except Exception as e:
-        error_msg = str(e)
-        # Check if it's an ffmpeg-related error
-        if "ffmpeg" in error_msg.lower() or "imageio_ffmpeg" in error_msg.lower():
-            raise Exception(
-                "❌ **ffmpeg not found**\n\n"
-                "MoviePy requires ffmpeg to process video files. Please install ffmpeg:\n\n"
-                "**On macOS:**\n"
-                "```bash\nbrew install ffmpeg\n```\n\n"
-                "**On Linux (Ubuntu/Debian):**\n"
-                "```bash\nsudo apt-get update\nsudo apt-get install ffmpeg\n```\n\n"
-                "**On Windows:**\n"
-                "Download from https://ffmpeg.org/download.html or use:\n"
-                "```bash\nchoco install ffmpeg\n```\n\n"
-                "After installing, restart the application."
-            )
-        else:
-            raise Exception(f"Failed to extract audio from video: {error_msg}")
\ No newline at end of file
+    # ffmpeg starts lazily when the upload begins reading; failures surface as AudioExtractionError
+    return open_audio_stream(video_path)
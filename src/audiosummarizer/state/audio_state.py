@@ -6,6 +6,13 @@ from typing import Annotated
 
 class AudioAnalysisState(TypedDict):
     audio_path: str
+    content_hash: Optional[str]  # SHA-256 of the audio file, computed once when spooling the upload
+    source_name: Optional[str]  # Original file name, shown in search results
+    preprocessed_path: Optional[str]  # Silence-trimmed mono upload written by the preprocess node
+    offset_map: Optional[List[List[float]]]  # [trimmed_start, original_start] per kept span of the trimmed upload
+    speech_seconds: Optional[float]  # Length of the trimmed upload (the billed duration)
     transcript: Optional[str]
+    transcript_words: Optional[bytes]  # CompactTranscript.to_bytes(): word timings and speakers as column arrays
     summary: Optional[str]
-    audio_duration_seconds: Optional[float]  # Duration in seconds for token tracking
\ No newline at end of file
+    audio_duration_seconds: Optional[float]  # Duration in seconds for token tracking
+    bypass_cache: Optional[bool]  # Skip cached LLM responses (explicit refresh from the Process button)
\ No newline at end of file
@@ -1,6 +1,15 @@
+import os
 import streamlit as st
-from langchain_core.messages import HumanMessage, AIMessage
 from src.audiosummarizer.LLMS.geminillm import GeminiLLM
+from src.audiosummarizer.utils import metrics
+from src.audiosummarizer.utils.response_cache import ResponseCache, model_name
+from src.audiosummarizer.utils.rate_limiter import get_limiter
+
+# Bump when the chat prompt changes so cached answers are not reused
+CHAT_TEMPLATE_VERSION = "1"
+
+# Transcripts shorter than this (estimated tokens) are always sent in full
+RETRIEVAL_MIN_TOKENS = int(os.getenv("CHAT_RETRIEVAL_MIN_TOKENS", "4000"))
 
 
 class ChatInterface:
@@ -43,11 +52,9 @@ class ChatInterface:
             with st.chat_message("user"):
                 st.markdown(user_question)
             
-            # Get AI response (no graph execution)
+            # Stream the AI response as it is generated (no graph execution)
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    response = self._get_answer_via_graph(user_question)
-                    st.markdown(response)
+                response = st.write_stream(self._stream_answer_via_graph(user_question))
             
             # Add AI message to chat
             st.session_state.chat_messages.append({
@@ -57,11 +64,21 @@ class ChatInterface:
     
     def _get_answer_via_graph(self, question):
         """Get answer directly without re-running the graph"""
+        return "".join(self._stream_answer_via_graph(question))
+    
+    def _stream_answer_via_graph(self, question):
+        """Yield the answer in chunks as the LLM produces them (a cached answer is yielded whole)"""
+        with metrics.span("chat", question_chars=len(question)) as chat_span:
+            yield from self._stream_answer(question, chat_span)
+    
+    def _stream_answer(self, question, chat_span):
+        """Answer a question, recording prompt/response sizes and cache hits on chat_span"""
         # Get the existing audio result
         audio_result = st.session_state.get("audio_result")
         
         if not audio_result:
-            return "No audio data available."
+            yield "No audio data available."
+            return
         
         # Get transcript and summary from existing results
         transcript = audio_result.get("transcript", "")
@@ -70,18 +87,32 @@ class ChatInterface:
         # Handle transcript if it's an object with text attribute
         transcript_text = transcript.text if hasattr(transcript, 'text') else str(transcript)
         
+        # Long transcripts: send only the turns relevant to the question
+        transcript_context, is_excerpt = self._get_transcript_context(transcript_text, question,
+                                                                      audio_result.get("transcript_words"))
+        transcript_label = "Relevant Transcript Excerpts" if is_excerpt else "Audio Transcript"
+        chat_span.set(retrieval=is_excerpt)
+        
         try:
-            # Initialize LLM
-            from src.audiosummarizer.LLMS.geminillm import GeminiLLM
+            # Shared client from the process-wide registry (no per-question construction)
+            model = GeminiLLM().get_llm()
             
-            llm = GeminiLLM()
-            model = llm.get_llm()
+            # Repeated questions about the same transcript are answered from the cache
+            cache = ResponseCache()
+            cache_key = cache.make_key(model_name(model), CHAT_TEMPLATE_VERSION, transcript_text, question,
+                                       summary=str(summary or ""))
+            cached_answer = cache.get(cache_key, "chat")
+            chat_span.set(cache_hit=cached_answer is not None)
+            if cached_answer is not None:
+                chat_span.set(response_chars=len(cached_answer))
+                yield cached_answer
+                return
             
             # Build prompt
             prompt = f"""You are an AI assistant that answers questions about customer call transcripts.
 
 Context Information:
-1. Audio Transcript: {transcript_text}
+1. {transcript_label}: {transcript_context}
 2. Summary: {summary}
 
 User Question: {question}
@@ -95,15 +126,43 @@ Instructions:
 - If asked about specific topics, facts, or actions, provide exact quotes or paraphrases from the transcript
 
 Provide your answer:"""
+            chat_span.set(prompt_chars=len(prompt))
 
-            # Get response from LLM
-            response = model.invoke(prompt)
-            answer = response.content if hasattr(response, 'content') else str(response)
-            
-            return answer
+            # Stream response from LLM
+            parts = []
+            for chunk in get_limiter("gemini").stream(model.stream, prompt):
+                text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+            answer = "".join(parts)
+            chat_span.set(response_chars=len(answer))
+            cache.put(cache_key, "chat", answer)
             
         except Exception as e:
-            return f"Sorry, I encountered an error: {str(e)}"
+            chat_span.set(error=str(e))
+            yield f"Sorry, I encountered an error: {str(e)}"
+    
+    def _get_transcript_context(self, transcript_text, question, transcript_words=None):
+        """
+        Pick the transcript context to send with a question.
+        
+        Returns:
+            (context, is_excerpt) - the full transcript for short calls, global
+            questions or when retrieval finds nothing; otherwise the top-k turns
+        """
+        if len(transcript_text) // 4 < RETRIEVAL_MIN_TOKENS:
+            return transcript_text, False
+        
+        from src.audiosummarizer.utils.transcript_index import is_global_question
+        if is_global_question(question):
+            return transcript_text, False
+        
+        index = get_transcript_index(transcript_text, transcript_words)
+        excerpt = index.relevant_context(question)
+        if excerpt is None:
+            return transcript_text, False
+        return excerpt, True
     
     def clear_chat(self):
         """Clear chat history"""
@@ -111,3 +170,17 @@ Provide your answer:"""
             st.session_state.chat_messages = []
             st.rerun()
 
+
+def get_transcript_index(transcript_text, transcript_words=None):
+    """
+    Return the session's retrieval index for the transcript, building it once
+    (from the word timings when given, see TranscriptIndex.from_transcript).
+    """
+    # Deferred so NumPy only loads once there is a transcript to index
+    from src.audiosummarizer.utils.transcript_index import TranscriptIndex, transcript_hash
+    
+    index = st.session_state.get("transcript_index")
+    if index is None or index.content_hash != transcript_hash(transcript_text):
+        index = TranscriptIndex.from_transcript(transcript_text, transcript_words)
+        st.session_state["transcript_index"] = index
+    return index
@@ -1,8 +1,7 @@
 import streamlit as st
 import re
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-import json
 from src.audiosummarizer.ui.streamlitui.chat_interface import ChatInterface
+from src.audiosummarizer.ui.streamlitui.transcript_viewer import TranscriptViewer
 
 
 class DisplayResultStreamlit:
@@ -33,27 +32,25 @@ class DisplayResultStreamlit:
 
         st.success("✅ Audio processing completed!")
         
-        # Display transcript in a collapsible box
+        self.display_transcript()
+        self.display_summary()
+        self.display_chat()
+
+    def display_transcript(self):
+        """Display the transcript in a collapsible box"""
         if self.audio_result.get("transcript"):
             # Transcript is now stored as a string, but handle both cases for backward compatibility
             transcript = self.audio_result["transcript"]
             transcript_text = transcript.text if hasattr(transcript, 'text') else str(transcript)
             
+            # Paged viewer: only the visible turns are sent to the browser on each rerun
             with st.expander("📝 Transcript", expanded=False):
-                st.text_area(
-                    "Full transcription of the audio file:", 
-                    transcript_text, 
-                    height=300, 
-                    disabled=True,
-                    label_visibility="collapsed",
-                    help="This is the transcribed text from your audio file"
-                )
+                TranscriptViewer(transcript_text, self.audio_result.get("transcript_words")).display()
         else:
             st.warning("⚠️ No transcript available")
-        
-        # Display summary in a collapsible box
-        
 
+    def display_summary(self):
+        """Display the formatted summary"""
         if self.audio_result.get("summary"):
             summary = self.audio_result["summary"]
 
@@ -83,10 +80,10 @@ class DisplayResultStreamlit:
         else:
             st.warning("⚠️ No summary generated yet.")
 
-
+    def display_chat(self):
+        """Display the chat interface - it will read from session state"""
         st.divider()
         
-        # Display chat interface - it will read from session state
         chat = ChatInterface()
         chat.display_chat()
 
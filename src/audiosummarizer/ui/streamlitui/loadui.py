@@ -1,9 +1,32 @@
+import time
 import streamlit as st
 from src.audiosummarizer.ui.uiconfigfile import Config
-from mutagen import File as File
-import os
 from src.audiosummarizer.utils.token_tracker import TokenTracker
-from moviepy import VideoFileClip
+from src.audiosummarizer.utils.media_handle import MediaHandle
+from src.audiosummarizer.utils.media_probe import probe_media, format_duration, ffmpeg_available
+from src.audiosummarizer.utils.transcript_cache import TranscriptCache
+from src.audiosummarizer.utils.response_cache import ResponseCache
+from src.audiosummarizer.utils.metrics import get_recorder
+from src.audiosummarizer.utils.workspace import get_workspace
+
+# Runs listed in the sidebar debug panel
+DEBUG_PANEL_RUNS = 10
+
+# Cache and workspace statistics are re-read at most this often (every widget interaction reruns the sidebar)
+SIDEBAR_STATS_TTL_SECONDS = 10
+
+# Pages selectable in the sidebar
+VIEWS = {"summarize": "🎧 Summarize a call", "search": "🔎 Search calls"}
+
+@st.cache_data(ttl=SIDEBAR_STATS_TTL_SECONDS, show_spinner=False)
+def _cache_stats():
+    """Transcript and LLM response cache statistics, shared by all sessions for a few seconds"""
+    return TranscriptCache().get_stats(), ResponseCache().get_stats()
+
+@st.cache_data(ttl=SIDEBAR_STATS_TTL_SECONDS, show_spinner=False)
+def _workspace_stats():
+    """Workspace usage, shared by all sessions for a few seconds"""
+    return get_workspace().get_stats()
 
 class LoadStreamlitUI:
     def __init__(self):
@@ -15,6 +38,14 @@ class LoadStreamlitUI:
         st.set_page_config(page_title="Customer Audio Record Summarizer", layout="wide")
         st.header("Customer Audio Record Summarizer")
         with st.sidebar:
+            self.user_controls["view"] = st.radio(
+                "View",
+                list(VIEWS),
+                format_func=VIEWS.get,
+                horizontal=True,
+                label_visibility="collapsed",
+            )
+            
             # Display token usage
             self._display_token_usage()
             
@@ -31,13 +62,22 @@ class LoadStreamlitUI:
                     type="primary",
                     help="Click to start processing the uploaded audio file"
                 )
+            self.user_controls["bypass_cache"] = st.checkbox(
+                "♻️ Regenerate summary (bypass response cache)",
+                value=False,
+                help="Ask Gemini for a fresh summary instead of reusing a cached one for this recording"
+            )
             if self.user_controls["audio_file"] is not None:
                 st.success(f"✅ File uploaded: {self.user_controls['audio_file'].name}")
                 st.info(f"📊 File size: {self.user_controls['audio_file'].size} bytes")
                 
+                # Spool the upload to disk once; every later stage shares this handle
+                media_handle = self._get_media_handle(self.user_controls["audio_file"])
+                self.user_controls["media_handle"] = media_handle
+                
                 # Get audio duration
                 try:
-                    duration_str, duration_seconds = self._get_audio_duration(self.user_controls["audio_file"])
+                    duration_str, duration_seconds = self._get_audio_duration(media_handle)
                     if duration_str:
                         st.info(f"⏱️ Duration: {duration_str}")
                         # Store duration in seconds for token tracking
@@ -60,7 +100,7 @@ class LoadStreamlitUI:
                         st.warning("""
                         **ffmpeg not found**
                         
-                        MoviePy requires ffmpeg to process video files. Install ffmpeg:
+                        ffmpeg is required to process video files. Install ffmpeg:
                         
                         **macOS:**
                         ```bash
@@ -81,6 +121,14 @@ class LoadStreamlitUI:
                         st.warning(f"Could not determine audio duration: {error_msg}")
             else:
                 self.user_controls["process_clicked"] = False
+            
+            st.divider()
+            
+            # Display cache hit rates
+            self._display_cache_stats()
+            
+            # Stage timings of recent runs
+            self._display_recent_runs()
     
 
         return self.user_controls
@@ -123,55 +171,92 @@ class LoadStreamlitUI:
         # Progress bar
         st.progress(usage_percent / 100)
         st.caption(f"Used: {used:,} sec / {total:,} sec ({usage_percent:.1f}%)")
+        reserved = self.token_tracker.get_reserved_tokens()
+        if reserved:
+            st.caption(f"Reserved by transcriptions in progress: {reserved:,} sec")
     
-    def _get_audio_duration(self, audio_file):
-        """Get the duration of the audio or video file in formatted string and seconds"""
-        # Save uploaded file temporarily
-        temp_path = f"/tmp/{audio_file.name}"
-        with open(temp_path, "wb") as f:
-            f.write(audio_file.getvalue())
-        
-        # Check if it's a video file
-        video_extensions = ['.mp4', '.mov', '.avi', '.mkv']
-        is_video = any(audio_file.name.lower().endswith(ext) for ext in video_extensions)
-        
-        try:
-            # For video files, use moviepy
-            if is_video:
-                try:
-                    video = VideoFileClip(temp_path)
-                    duration_seconds = float(video.duration)
-                    video.close()
-                    mins, secs = divmod(int(duration_seconds), 60)
-                    formatted = f"{mins} min {secs} sec" if mins > 0 else f"{secs} sec"
-                    return formatted, duration_seconds
-                except Exception as e:
-                    # If moviepy fails, it's likely because ffmpeg is missing
-                    error_msg = str(e).lower()
-                    if "ffmpeg" in error_msg or "imageio_ffmpeg" in error_msg:
-                        # Return None but the error will be caught and displayed
-                        return None, None
-                    return None, None
-            
-            # For audio files, use mutagen
-            audio = File(temp_path)
-            if audio is None:
-                return None, None
+    def _display_cache_stats(self):
+        """Display transcript and LLM response cache hit rates in the sidebar."""
+        with st.expander("🗄️ Cache", expanded=False):
+            try:
+                transcript_stats, response_stats = _cache_stats()
+            except Exception as e:
+                st.warning(f"Could not read cache statistics: {e}")
+                return
             
-            if hasattr(audio, 'info') and audio.info:
-                duration = audio.info.length
-                if duration:
-                    # Store duration in seconds for token tracking
-                    duration_seconds = float(duration)
-                    # Format for display
-                    mins, secs = divmod(int(duration), 60)
-                    formatted = f"{mins} min {secs} sec" if mins > 0 else f"{secs} sec"
-                    return formatted, duration_seconds
-            return None, None
-        except Exception as e:
-            # Return None if we can't get duration
-            return None, None
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
\ No newline at end of file
+            st.caption(
+                f"**Transcripts:** {transcript_stats['hit_rate']:.0%} hit rate "
+                f"({transcript_stats['hits']} hits / {transcript_stats['misses']} misses, "
+                f"{transcript_stats['entries']} cached)"
+            )
+            for kind, label in (("summary", "Summaries"), ("chat", "Chat answers")):
+                kind_stats = response_stats.get(kind, {"hits": 0, "misses": 0, "hit_rate": 0.0})
+                st.caption(
+                    f"**{label}:** {kind_stats['hit_rate']:.0%} hit rate "
+                    f"({kind_stats['hits']} hits / {kind_stats['misses']} misses)"
+                )
+            st.caption(f"{response_stats['entries']} LLM responses cached")
+    
+    def _display_recent_runs(self):
+        """Display per-stage timings of the most recent runs (all sessions in this process)."""
+        recorder = get_recorder()
+        runs = recorder.recent_runs(DEBUG_PANEL_RUNS)
+        with st.expander("🐞 Debug: recent runs", expanded=False):
+            workspace = _workspace_stats()
+            st.caption(
+                f"🗂️ Workspace: {(workspace['artifact_bytes'] + workspace['scratch_bytes']) / 1024 ** 2:,.1f} MB "
+                f"of {workspace['max_bytes'] / 1024 ** 2:,.0f} MB · {workspace['artifacts']} uploads, "
+                f"{workspace['leased_artifacts']} in use"
+            )
+            if not runs:
+                st.caption("No runs recorded yet.")
+                return
+            for run in runs:
+                started = time.strftime("%H:%M:%S", time.localtime(run["start_time"]))
+                icon = "❌" if run["status"] == "error" else "✅"
+                st.markdown(f"{icon} **{run['name']}** at {started} — {run['duration']:.2f} s")
+                lines = []
+                for span in sorted(run["spans"], key=lambda s: s["start_time"]):
+                    if span["span_id"] == run["span_id"]:
+                        continue
+                    details = ", ".join(
+                        f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in span["attributes"].items()
+                    )
+                    lines.append(f"- `{span['name']}` {span['duration']:.2f} s" + (f" · {details}" if details else ""))
+                details = ", ".join(f"{key}={value}" for key, value in run["attributes"].items())
+                if details:
+                    lines.insert(0, f"- {details}")
+                if run["error"]:
+                    lines.append(f"- error: {run['error']}")
+                if lines:
+                    st.caption("\n".join(lines))
+            st.download_button(
+                "📥 Prometheus metrics",
+                data=recorder.to_prometheus(),
+                file_name="audiosummarizer.prom",
+                mime="text/plain",
+            )
+    
+    def _get_media_handle(self, audio_file):
+        """Return the spooled media handle for the upload, creating it on first use."""
+        # Streamlit reruns the script on every interaction; reuse the handle for the same upload
+        upload_id = getattr(audio_file, "file_id", None) or f"{audio_file.name}:{audio_file.size}"
+        cached = st.session_state.get("media_handle")
+        if cached is not None and st.session_state.get("media_handle_upload_id") == upload_id and cached.exists():
+            cached.renew()
+            return cached
+        
+        media_handle = MediaHandle.from_upload(audio_file)
+        st.session_state["media_handle"] = media_handle
+        st.session_state["media_handle_upload_id"] = upload_id
+        return media_handle
+    
+    def _get_audio_duration(self, media_handle):
+        """Get the duration of the audio or video file in formatted string and seconds"""
+        # Header-only probe, memoized by content hash so reruns are free
+        info = probe_media(media_handle.path, media_handle.content_hash)
+        if info.duration_seconds is None and media_handle.is_video and not ffmpeg_available():
+            # Surfaced by the caller as the "ffmpeg not found" help text
+            raise Exception("ffmpeg not found")
+        return format_duration(info.duration_seconds), info.duration_seconds
\ No newline at end of file
@@ -0,0 +1,109 @@
+import datetime
+import streamlit as st
+from src.audiosummarizer.utils.corpus_store import get_corpus_store, DEFAULT_PAGE_SIZE, RELEVANCE_CANDIDATES
+from src.audiosummarizer.utils.media_probe import format_duration
+
+SORT_ORDERS = {"Newest first": "newest", "Best match": "relevance"}
+
+
+def format_offset(seconds):
+    """Format a turn start as "mm:ss" (or "hh:mm:ss" past an hour)"""
+    if seconds is None:
+        return "--:--"
+    hours, rest = divmod(int(seconds), 3600)
+    mins, secs = divmod(rest, 60)
+    return f"{hours}:{mins:02d}:{secs:02d}" if hours else f"{mins:02d}:{secs:02d}"
+
+
+class SearchPage:
+    def __init__(self, key="corpus_search"):
+        """
+        Full-text search over every processed call
+
+        Args:
+            key: Prefix for the page's widget keys in session state
+        """
+        self.key = key
+        self.store = get_corpus_store()
+
+    def display(self):
+        """Render the search form and one page of results"""
+        st.subheader("🔎 Search Calls")
+        stats = self.store.get_stats()
+        st.caption(f"{stats['calls']:,} calls · {stats['turns']:,} speaker turns indexed")
+
+        page_key = f"{self.key}_page"
+        query_col, sort_col = st.columns([3, 1])
+        with query_col:
+            query = st.text_input(
+                "Search",
+                key=f"{self.key}_query",
+                placeholder='refund "next week"',
+                help='Calls containing every word are shown; use quotes for an exact phrase',
+                on_change=self._reset_page,
+            )
+        with sort_col:
+            sort = st.selectbox("Sort", list(SORT_ORDERS), key=f"{self.key}_sort", on_change=self._reset_page)
+        dates = st.date_input("Processed between", value=(), key=f"{self.key}_dates", on_change=self._reset_page)
+        since, until = self._date_range(dates)
+
+        page = st.session_state.get(page_key, 1)
+        try:
+            found = self.store.search(query, since=since, until=until, page=page,
+                                      page_size=DEFAULT_PAGE_SIZE, order=SORT_ORDERS[sort])
+        except Exception as e:
+            st.error(f"❌ Search failed: {e}")
+            return
+
+        results = found["results"]
+        first = (page - 1) * DEFAULT_PAGE_SIZE + 1
+        if results:
+            st.caption(f"Calls {first:,}-{first + len(results) - 1:,} · page {page} · "
+                       f"{found['seconds'] * 1000:.0f} ms")
+        else:
+            st.info("No matching calls." if page == 1 else "No more calls.")
+        if found["capped"]:
+            st.caption(f"Best match ranks the {RELEVANCE_CANDIDATES:,} newest matching calls; "
+                       f"narrow the query or the dates to reach older ones.")
+
+        for call in results:
+            self._display_call(call)
+
+        prev_col, next_col = st.columns(2)
+        with prev_col:
+            if st.button("⬅️ Previous", key=f"{self.key}_prev", disabled=page <= 1):
+                st.session_state[page_key] = page - 1
+                st.rerun()
+        with next_col:
+            if st.button("Next ➡️", key=f"{self.key}_next", disabled=not found["has_more"]):
+                st.session_state[page_key] = page + 1
+                st.rerun()
+
+    def _display_call(self, call):
+        """One result: the matching turns and the summary in an expander"""
+        processed = datetime.datetime.fromtimestamp(call["processed_at"]).strftime("%Y-%m-%d %H:%M")
+        details = [processed]
+        duration = format_duration(call["duration_seconds"])
+        if duration:
+            details.append(duration)
+        details.append(f"{call['turn_count']:,} turns")
+        with st.expander(f"📞 {call['name']} · {' · '.join(details)}"):
+            for hit in call["hits"]:
+                speaker = f"Speaker {hit['speaker']}" if hit["speaker"] else "Unknown speaker"
+                st.markdown(f"`[{format_offset(hit['start'])}]` **{speaker}:** {hit['snippet']}")
+            if call["summary"]:
+                st.markdown("**Summary**")
+                st.markdown(call["summary"])
+
+    def _date_range(self, dates):
+        """Epoch bounds for the selected dates (the end date is included), or None for open ends"""
+        if not dates:
+            return None, None
+        start = dates[0]
+        end = dates[1] if len(dates) > 1 else dates[0]
+        since = datetime.datetime.combine(start, datetime.time.min).timestamp()
+        until = datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min).timestamp()
+        return since, until
+
+    def _reset_page(self):
+        st.session_state[f"{self.key}_page"] = 1
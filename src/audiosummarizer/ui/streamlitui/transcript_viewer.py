@@ -0,0 +1,126 @@
+import os
+import re
+import streamlit as st
+from src.audiosummarizer.ui.streamlitui.chat_interface import get_transcript_index
+
+# Speaker turns rendered per page (only the visible page is sent to the browser)
+TURNS_PER_PAGE = int(os.getenv("TRANSCRIPT_TURNS_PER_PAGE", "50"))
+
+_TIMESTAMP_PATTERN = re.compile(r"^\s*(?:(\d+):)?(\d+):(\d{1,2})\s*$")
+
+
+def parse_timestamp(text):
+    """
+    Parse "ss", "mm:ss" or "hh:mm:ss" into seconds.
+
+    Returns:
+        Seconds, or None if the text is not a timestamp
+    """
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    match = _TIMESTAMP_PATTERN.match(text)
+    if not match:
+        return None
+    hours, mins, secs = match.groups()
+    return int(hours or 0) * 3600 + int(mins) * 60 + int(secs)
+
+
+class TranscriptViewer:
+    def __init__(self, transcript_text, transcript_words=None, key="transcript_viewer"):
+        """
+        Paged, searchable view of a transcript's speaker turns
+
+        Args:
+            transcript_text: Formatted transcript ("[mm:ss] Speaker X: text" lines)
+            transcript_words: CompactTranscript bytes; when given, turns and their start
+                times come from the word timings instead of the text
+            key: Prefix for the viewer's widget keys in session state
+        """
+        self.transcript_text = transcript_text
+        self.transcript_words = transcript_words
+        self.key = key
+
+    def display(self):
+        """Render the viewer; paging and searching rerun only the viewer where fragments are supported"""
+        render = st.fragment(self._render) if hasattr(st, "fragment") else self._render
+        render()
+
+    def _render(self):
+        # Turns and the search index are built once per transcript and kept in session state
+        index = get_transcript_index(self.transcript_text, self.transcript_words)
+        turns = index.turns
+
+        search_col, jump_col = st.columns([3, 1])
+        with search_col:
+            query = st.text_input(
+                "Search transcript",
+                key=f"{self.key}_query",
+                placeholder="Search the conversation...",
+                on_change=self._reset_page,
+                args=(f"{self.key}_search_page",),
+            )
+        with jump_col:
+            st.text_input(
+                "Jump to (mm:ss)",
+                key=f"{self.key}_jump",
+                placeholder="12:30",
+                on_change=self._jump,
+            )
+
+        if st.session_state.pop(f"{self.key}_jump_error", False):
+            st.warning("⚠️ Enter a timestamp like 12:30 or 1:05:00")
+
+        if query.strip():
+            rows = index.search(query, top_k=len(turns))
+            page_key = f"{self.key}_search_page"
+            if not rows:
+                st.info("No matching turns.")
+                return
+            st.caption(f"🔎 {len(rows):,} matching turns, best match first")
+        else:
+            rows = range(len(turns))
+            page_key = f"{self.key}_page"
+
+        page = self._page_selector(page_key, len(rows))
+        start = (page - 1) * TURNS_PER_PAGE
+        page_rows = rows[start:start + TURNS_PER_PAGE]
+        st.text("\n\n".join(turns[i]["line"] for i in page_rows))
+
+    def _page_selector(self, page_key, row_count):
+        """Page number input for row_count rows; returns the current page (1-based)"""
+        page_count = max(1, -(-row_count // TURNS_PER_PAGE))
+        # Clamp before the widget exists (the transcript may have changed since the last run)
+        st.session_state[page_key] = min(max(1, st.session_state.get(page_key, 1)), page_count)
+
+        page_col, info_col = st.columns([1, 3])
+        with page_col:
+            page = st.number_input(
+                "Page",
+                min_value=1,
+                max_value=page_count,
+                step=1,
+                key=page_key,
+            )
+        with info_col:
+            first = (page - 1) * TURNS_PER_PAGE + 1
+            last = min(page * TURNS_PER_PAGE, row_count)
+            st.caption(f"Turns {first:,}-{last:,} of {row_count:,} · page {page} of {page_count}")
+        return page
+
+    def _reset_page(self, page_key):
+        st.session_state[page_key] = 1
+
+    def _jump(self):
+        """Show the page containing the turn spoken at the entered timestamp"""
+        text = st.session_state.get(f"{self.key}_jump", "")
+        if not text.strip():
+            return
+        seconds = parse_timestamp(text)
+        if seconds is None:
+            st.session_state[f"{self.key}_jump_error"] = True
+            return
+        turn = get_transcript_index(self.transcript_text, self.transcript_words).turn_at(seconds)
+        # Jumping shows the full transcript, not search results
+        st.session_state[f"{self.key}_query"] = ""
+        st.session_state[f"{self.key}_page"] = turn // TURNS_PER_PAGE + 1
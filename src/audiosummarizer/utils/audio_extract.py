@@ -0,0 +1,140 @@
+"""
+Streaming audio extraction for video inputs.
+ffmpeg demuxes only the audio stream, downmixes it to mono and pipes it out
+in a compact encoding, so the transcription request can consume the chunks
+directly without a full intermediate WAV on disk.
+"""
+import io
+import os
+import subprocess
+import time
+from typing import Iterator, Optional
+
+from src.audiosummarizer.utils import metrics
+
+# Bytes read from the ffmpeg pipe per chunk
+EXTRACT_CHUNK_SIZE = 64 * 1024
+
+# Sample rate used for speech transcription
+EXTRACT_SAMPLE_RATE = 16000
+
+# Output encodings: ffmpeg codec args, container format, file suffix, MIME type
+ENCODINGS = {
+    "flac": (["-c:a", "flac"], "flac", ".flac", "audio/flac"),
+    "opus": (["-c:a", "libopus", "-b:a", "32k", "-application", "voip"], "ogg", ".ogg", "audio/ogg"),
+}
+
+# Lossless FLAC by default; set EXTRACT_AUDIO_CODEC=opus for roughly half the upload size
+DEFAULT_ENCODING = os.getenv("EXTRACT_AUDIO_CODEC", "flac")
+
+
+class AudioExtractionError(Exception):
+    """Raised when ffmpeg is missing or fails to extract the audio stream."""
+
+
+def stream_audio(path: str, encoding: str = DEFAULT_ENCODING, sample_rate: int = EXTRACT_SAMPLE_RATE,
+                 start: Optional[float] = None, duration: Optional[float] = None,
+                 chunk_size: int = EXTRACT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Extract the first audio stream of a media file as a generator of encoded chunks.
+
+    Args:
+        path: Audio or video file to read
+        encoding: Key of ENCODINGS ("flac" or "opus")
+        sample_rate: Output sample rate in Hz
+        start: Optional offset in seconds to start from
+        duration: Optional length in seconds to extract
+        chunk_size: Bytes yielded per chunk
+
+    Yields:
+        Encoded audio bytes, in order
+
+    Raises:
+        AudioExtractionError: If ffmpeg is not installed or exits with an error
+    """
+    codec_args, container, _, _ = ENCODINGS[encoding]
+    cmd = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error"]
+    if start:
+        # Input-side seek: ffmpeg jumps straight to the offset instead of decoding up to it
+        cmd += ["-ss", f"{start:.3f}"]
+    cmd += ["-i", path]
+    if duration:
+        cmd += ["-t", f"{duration:.3f}"]
+    cmd += ["-map", "0:a:0", "-vn", "-ac", "1", "-ar", str(sample_rate), *codec_args, "-f", container, "pipe:1"]
+
+    started = time.perf_counter()
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise AudioExtractionError("ffmpeg not found")
+
+    extracted = 0
+    failure = None
+    try:
+        for chunk in iter(lambda: process.stdout.read(chunk_size), b""):
+            extracted += len(chunk)
+            yield chunk
+        process.wait()
+        if process.returncode != 0:
+            error = process.stderr.read().decode("utf-8", errors="replace").strip()
+            failure = AudioExtractionError(f"ffmpeg exited with code {process.returncode}: {error}")
+            raise failure
+    finally:
+        # A generator cannot hold a span open across yields; record it once extraction ends
+        metrics.record("extract", started, failure, encoding=encoding, bytes_extracted=extracted,
+                       offset_seconds=start or 0.0, requested_seconds=duration or 0.0)
+        # Consumer stopped early (or failed): don't leave ffmpeg running
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+class ChunkStream(io.RawIOBase):
+    """Read-only, non-seekable file object over a generator of byte chunks."""
+
+    def __init__(self, chunks: Iterator[bytes], name: str = "audio"):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self.name = name
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        self.bytes_read += size
+        return size
+
+    def close(self):
+        # Closing the generator runs its finally block, which stops ffmpeg
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+        super().close()
+
+
+def open_audio_stream(path: str, encoding: str = DEFAULT_ENCODING, **kwargs) -> tuple:
+    """
+    Open the audio of a media file as a streaming upload.
+
+    Args:
+        path: Audio or video file to read
+        encoding: Key of ENCODINGS
+        **kwargs: Passed through to stream_audio (start, duration, sample_rate)
+
+    Returns:
+        (filename, file object, content type) tuple accepted by HTTP multipart uploads
+    """
+    _, _, suffix, mime_type = ENCODINGS[encoding]
+    filename = os.path.splitext(os.path.basename(path))[0] + suffix
+    return filename, ChunkStream(stream_audio(path, encoding, **kwargs), name=filename), mime_type
@@ -0,0 +1,304 @@
+"""
+Silence trimming before transcription.
+The recording is decoded once by ffmpeg to mono 16 kHz PCM and spooled to a
+temporary file while per-frame energies are computed block by block. A
+vectorized energy-based voice activity detector then marks speech, long
+non-speech spans (hold music at low level, dead air) are dropped, and the kept
+spans are re-encoded into one compact upload. An offset map records where
+each kept span sits in the original recording so word timestamps can be
+mapped back.
+"""
+import os
+import subprocess
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.audiosummarizer.utils import metrics
+from src.audiosummarizer.utils.audio_extract import ENCODINGS, DEFAULT_ENCODING, EXTRACT_SAMPLE_RATE
+from src.audiosummarizer.utils.workspace import owned_prefix
+
+# Analysis frame length for the energy detector
+FRAME_SECONDS = 0.03
+
+# Frames decoded per block (bounds memory while reading the ffmpeg pipe)
+FRAMES_PER_BLOCK = 2000
+
+# Non-speech spans at least this long are dropped; shorter pauses are kept
+MIN_SILENCE_SECONDS = float(os.getenv("VAD_MIN_SILENCE_SECONDS", "2.0"))
+
+# Audio kept on both sides of detected speech, so word onsets and endings are not clipped
+PAD_SECONDS = float(os.getenv("VAD_PAD_SECONDS", "0.3"))
+
+# Speech threshold: this many dB above the noise floor (10th percentile of frame energies) ...
+MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "12"))
+NOISE_PERCENTILE = 10
+
+# ... clamped to this range in dBFS, so all-speech or all-noise recordings still get a sane threshold
+MIN_THRESHOLD_DB = -60.0
+MAX_THRESHOLD_DB = -35.0
+
+# Lossy encoding tried when the trimmed upload in the requested encoding is not smaller than the
+# original (a lossless re-encode of a compressed call can be several times its size)
+FALLBACK_ENCODING = "opus"
+
+
+class AudioPreprocessError(Exception):
+    """Raised when ffmpeg fails to decode or encode the recording."""
+
+
+class TrimResult:
+    """Trimmed upload and the map from its timeline back to the original recording."""
+
+    def __init__(self, path: str, offset_map: List[List[float]], duration_seconds: float,
+                 original_seconds: float, size_bytes: int):
+        """
+        Args:
+            path: Encoded trimmed audio file
+            offset_map: [trimmed_start, original_start] pairs, one per kept span, in order
+            duration_seconds: Length of the trimmed audio
+            original_seconds: Length of the decoded original
+            size_bytes: Size of the trimmed file
+        """
+        self.path = path
+        self.offset_map = offset_map
+        self.duration_seconds = duration_seconds
+        self.original_seconds = original_seconds
+        self.size_bytes = size_bytes
+
+    def __repr__(self):
+        return (f"TrimResult(duration_seconds={self.duration_seconds:.1f}, "
+                f"original_seconds={self.original_seconds:.1f}, spans={len(self.offset_map)})")
+
+
+def frame_energies_db(samples: np.ndarray, frame_length: int) -> np.ndarray:
+    """
+    RMS energy of consecutive frames in dBFS.
+
+    Args:
+        samples: int16 samples (a trailing partial frame is ignored)
+        frame_length: Samples per frame
+
+    Returns:
+        float32 array with one value per frame
+    """
+    count = len(samples) // frame_length
+    frames = samples[:count * frame_length].astype(np.float32).reshape(count, frame_length) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return (20.0 * np.log10(np.maximum(rms, 1e-6))).astype(np.float32)
+
+
+def speech_spans(energies_db: np.ndarray, frame_seconds: float = FRAME_SECONDS,
+                 min_silence_seconds: float = MIN_SILENCE_SECONDS, pad_seconds: float = PAD_SECONDS) -> List[Tuple[int, int]]:
+    """
+    Find the frame ranges to keep.
+
+    Frames above the threshold are speech; speech is widened by pad_seconds
+    on both sides, and only non-speech runs of at least min_silence_seconds
+    are dropped.
+
+    Returns:
+        Non-overlapping (start_frame, end_frame) ranges, end exclusive
+    """
+    if len(energies_db) == 0:
+        return []
+    threshold = np.clip(np.percentile(energies_db, NOISE_PERCENTILE) + MARGIN_DB, MIN_THRESHOLD_DB, MAX_THRESHOLD_DB)
+    speech = energies_db > threshold
+    if not speech.any():
+        return []
+
+    # Widen speech by the padding (a running maximum, computed as a convolution)
+    pad = int(round(pad_seconds / frame_seconds))
+    if pad:
+        speech = np.convolve(speech.astype(np.int8), np.ones(2 * pad + 1, dtype=np.int8), mode="same") > 0
+
+    # Runs of non-speech frames: edges where the mask changes
+    edges = np.diff(np.concatenate(([1], speech.view(np.int8), [1])).astype(np.int8))
+    gap_starts = np.flatnonzero(edges == -1)
+    gap_ends = np.flatnonzero(edges == 1)
+    min_gap = int(round(min_silence_seconds / frame_seconds))
+    long_gaps = (gap_ends - gap_starts) >= min_gap
+    gap_starts, gap_ends = gap_starts[long_gaps], gap_ends[long_gaps]
+
+    # Kept spans are the complement of the long gaps
+    starts = np.concatenate(([0], gap_ends))
+    ends = np.concatenate((gap_starts, [len(speech)]))
+    return [(int(s), int(e)) for s, e in zip(starts, ends) if e > s]
+
+
+def _decode_to_spool(path: str, spool, sample_rate: int, frame_length: int) -> np.ndarray:
+    """Decode path to mono s16le PCM written to spool; returns the frame energies."""
+    cmd = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-i", path,
+        "-map", "0:a:0", "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1",
+    ]
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise AudioPreprocessError("ffmpeg not found")
+
+    block_bytes = frame_length * FRAMES_PER_BLOCK * 2
+    energies = []
+    remainder = b""
+    try:
+        for block in iter(lambda: process.stdout.read(block_bytes), b""):
+            spool.write(block)
+            data = remainder + block
+            usable = len(data) // (frame_length * 2) * frame_length * 2
+            if usable:
+                energies.append(frame_energies_db(np.frombuffer(data[:usable], dtype="<i2"), frame_length))
+            remainder = data[usable:]
+        process.wait()
+        if process.returncode != 0:
+            error = process.stderr.read().decode("utf-8", errors="replace").strip()
+            raise AudioPreprocessError(f"ffmpeg exited with code {process.returncode}: {error}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+    return np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+
+
+def _encode_spans(samples: np.ndarray, spans: List[Tuple[int, int]], out_path: str, sample_rate: int, encoding: str):
+    """Encode the given sample ranges back to back into out_path."""
+    codec_args, container, _, _ = ENCODINGS[encoding]
+    cmd = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+        *codec_args, "-f", container, out_path,
+    ]
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    block = sample_rate * 30
+    try:
+        for start, end in spans:
+            for offset in range(start, end, block):
+                process.stdin.write(samples[offset:min(end, offset + block)].tobytes())
+        process.stdin.close()
+    except BrokenPipeError:
+        pass  # ffmpeg exited early; its error is reported below
+    process.wait()
+    error = process.stderr.read().decode("utf-8", errors="replace").strip()
+    process.stderr.close()
+    if process.returncode != 0:
+        raise AudioPreprocessError(f"ffmpeg exited with code {process.returncode}: {error}")
+
+
+def _encode_to_file(samples: np.ndarray, spans: List[Tuple[int, int]], sample_rate: int, encoding: str,
+                    out_dir: Optional[str]) -> str:
+    """Encode the spans into a new temporary file; returns its path."""
+    _, _, suffix, _ = ENCODINGS[encoding]
+    fd, out_path = tempfile.mkstemp(prefix=owned_prefix("audiosummarizer_trimmed"), suffix=suffix, dir=out_dir)
+    os.close(fd)
+    try:
+        _encode_spans(samples, spans, out_path, sample_rate, encoding)
+    except Exception:
+        os.remove(out_path)
+        raise
+    return out_path
+
+
+def trim_silence(path: str, encoding: str = DEFAULT_ENCODING, sample_rate: int = EXTRACT_SAMPLE_RATE,
+                 out_dir: Optional[str] = None) -> Optional[TrimResult]:
+    """
+    Decode a recording to mono PCM, drop long non-speech spans and encode the rest.
+
+    Args:
+        path: Audio or video file
+        encoding: Key of audio_extract.ENCODINGS for the trimmed file
+        sample_rate: Decode and output sample rate in Hz
+        out_dir: Directory for the trimmed file (defaults to the temp directory)
+
+    Returns:
+        TrimResult, or None if the trimmed file would not be smaller than the
+        original (the caller then sends, and bills, the original file)
+
+    Raises:
+        AudioPreprocessError: If ffmpeg is missing or fails
+    """
+    started = time.perf_counter()
+    frame_length = int(sample_rate * FRAME_SECONDS)
+    frame_seconds = frame_length / sample_rate
+    spool = tempfile.NamedTemporaryFile(prefix=owned_prefix("audiosummarizer_decode"), suffix=".pcm",
+                                        delete=False, dir=out_dir)
+    try:
+        with spool:
+            energies = _decode_to_spool(path, spool, sample_rate, frame_length)
+        total_samples = os.path.getsize(spool.name) // 2
+        if total_samples == 0:
+            return None
+        original_seconds = total_samples / sample_rate
+
+        spans = [
+            (start * frame_length, min(total_samples, end * frame_length))
+            for start, end in speech_spans(energies, frame_seconds)
+        ]
+        if spans and spans[-1][1] == len(energies) * frame_length:
+            # The trailing partial frame belongs to the last span
+            spans[-1] = (spans[-1][0], total_samples)
+        kept_samples = sum(end - start for start, end in spans)
+        if kept_samples == 0:
+            return None  # nothing sounded like speech: let the API decide rather than upload nothing
+
+        original_bytes = os.path.getsize(path)
+        encodings = [encoding] + ([FALLBACK_ENCODING] if encoding != FALLBACK_ENCODING else [])
+        # Memory-mapped, so only the spans being encoded are paged in
+        samples = np.memmap(spool.name, dtype="<i2", mode="r", shape=(total_samples,))
+        try:
+            for candidate in encodings:
+                out_path = _encode_to_file(samples, spans, sample_rate, candidate, out_dir)
+                size_bytes = os.path.getsize(out_path)
+                if size_bytes < original_bytes:
+                    break
+                os.remove(out_path)
+                out_path = None
+        finally:
+            del samples
+    finally:
+        os.remove(spool.name)
+
+    duration_seconds = kept_samples / sample_rate
+    saved_seconds = original_seconds - duration_seconds
+    metrics.record("trim_silence", started, original_seconds=original_seconds, speech_seconds=duration_seconds,
+                   trimmed_seconds=saved_seconds if out_path else 0.0, bytes_extracted=size_bytes,
+                   spans=len(spans), encoding=candidate, used=out_path is not None)
+    if out_path is None:
+        # Sending fewer seconds in more bytes is not a saving: upload the original
+        return None
+
+    offset_map = []
+    trimmed_start = 0
+    for start, end in spans:
+        offset_map.append([trimmed_start / sample_rate, start / sample_rate])
+        trimmed_start += end - start
+    return TrimResult(out_path, offset_map, duration_seconds, original_seconds, size_bytes)
+
+
+def to_original_times(times, offset_map: List[List[float]]) -> np.ndarray:
+    """
+    Map timestamps on the trimmed timeline back to the original recording.
+
+    Args:
+        times: Seconds on the trimmed timeline (scalar or array-like)
+        offset_map: [trimmed_start, original_start] pairs from TrimResult
+
+    Returns:
+        float64 array of original timestamps
+    """
+    table = np.asarray(offset_map, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    index = np.clip(np.searchsorted(table[:, 0], times, side="right") - 1, 0, len(table) - 1)
+    return times + (table[index, 1] - table[index, 0])
+
+
+def remap_words(words: List[dict], offset_map: Optional[List[List[float]]]) -> List[dict]:
+    """Return words (see response_words) with start/end mapped back to the original recording."""
+    if not offset_map or not words:
+        return words
+    starts = to_original_times([w["start"] for w in words], offset_map)
+    # Ends keep each word's length (a word ending across a cut would otherwise stretch over the dropped span)
+    ends = starts + np.maximum(0.0, np.asarray([w["end"] - w["start"] for w in words], dtype=np.float64))
+    return [dict(word, start=float(s), end=float(e)) for word, s, e in zip(words, starts, ends)]
@@ -0,0 +1,348 @@
+"""
+Parallel chunked transcription for long recordings.
+The audio is split near silences into chunks of a few minutes, each chunk
+(plus a small overlap on both sides) is transcribed concurrently, and the
+word-level results are stitched back with global timestamps. Speaker labels
+are reconciled across chunk boundaries using the words both chunks heard in
+the overlap window.
+"""
+import contextvars
+import math
+import os
+import re
+import subprocess
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from src.audiosummarizer.utils.audio_extract import open_audio_stream
+from src.audiosummarizer.utils.rate_limiter import retry_delay, is_retryable
+
+# Target chunk length; 0 disables chunked transcription
+CHUNK_MINUTES = float(os.getenv("TRANSCRIBE_CHUNK_MINUTES", "10"))
+
+# Concurrent transcription requests per recording
+MAX_WORKERS = int(os.getenv("TRANSCRIBE_MAX_WORKERS", "4"))
+
+# Audio shared by neighbouring chunks, used to reconcile speaker labels
+OVERLAP_SECONDS = 5.0
+
+# How far from the target cut point to look for a silence
+CUT_SEARCH_SECONDS = 30.0
+
+# silencedetect settings
+SILENCE_NOISE_DB = -35
+SILENCE_MIN_SECONDS = 0.4
+
+# Retries per chunk before the whole transcription fails
+MAX_CHUNK_RETRIES = 3
+
+# Two words in the overlap are "the same word" if their starts are this close
+WORD_MATCH_TOLERANCE = 0.5
+
+_SILENCE_START = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end:\s*(-?[\d.]+)")
+
+
+def should_chunk(duration_seconds: Optional[float]) -> bool:
+    """Return True if a recording is long enough to be worth transcribing in chunks."""
+    if not CHUNK_MINUTES or not duration_seconds:
+        return False
+    return duration_seconds >= 2 * CHUNK_MINUTES * 60
+
+
+def find_silences(path: str, start: float, duration: float) -> List[Tuple[float, float]]:
+    """
+    Detect silences within a window of the recording with ffmpeg's silencedetect filter.
+
+    Only the window is decoded, so planning cuts for a long call costs a few
+    short decodes rather than a full pass over the file.
+
+    Returns:
+        (start, end) pairs in seconds from the start of the recording
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-ss", f"{start:.3f}", "-t", f"{duration:.3f}",
+        "-i", path, "-vn", "-ac", "1",
+        "-af", f"silencedetect=noise={SILENCE_NOISE_DB}dB:d={SILENCE_MIN_SECONDS}",
+        "-f", "null", "-",
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    silences = []
+    silence_start = None
+    for line in result.stderr.splitlines():
+        match = _SILENCE_START.search(line)
+        if match:
+            silence_start = float(match.group(1))
+            continue
+        match = _SILENCE_END.search(line)
+        if match and silence_start is not None:
+            silences.append((start + max(0.0, silence_start), start + float(match.group(1))))
+            silence_start = None
+    return silences
+
+
+def _choose_cut(path: str, target: float) -> float:
+    """Return the midpoint of the silence closest to target, or target itself if there is none."""
+    window_start = max(0.0, target - CUT_SEARCH_SECONDS)
+    try:
+        silences = find_silences(path, window_start, 2 * CUT_SEARCH_SECONDS)
+    except OSError:
+        return target
+    if not silences:
+        return target
+    midpoints = [(s + e) / 2 for s, e in silences]
+    return min(midpoints, key=lambda m: abs(m - target))
+
+
+def plan_chunks(path: str, duration_seconds: float, chunk_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Split a recording into roughly equal chunks cut at silence boundaries.
+
+    Returns:
+        Consecutive (start, end) core ranges covering [0, duration_seconds]
+    """
+    count = max(1, round(duration_seconds / chunk_seconds))
+    targets = [duration_seconds * k / count for k in range(1, count)]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        cuts = sorted(pool.map(lambda t: _choose_cut(path, t), targets))
+
+    bounds = [0.0] + cuts + [duration_seconds]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i + 1] > bounds[i]]
+
+
+def plan_windows(path: str, duration_seconds: float, chunk_seconds: Optional[float] = None) -> List[dict]:
+    """
+    Plan the chunks of a recording and the windows actually uploaded for them.
+
+    Args:
+        path: Audio or video file
+        duration_seconds: Recording length
+        chunk_seconds: Target chunk length (defaults to TRANSCRIBE_CHUNK_MINUTES)
+
+    Returns:
+        Ordered dicts with "core" (the range the chunk owns) and "window"
+        (the core plus the overlap on both sides)
+    """
+    cores = plan_chunks(path, duration_seconds, chunk_seconds or CHUNK_MINUTES * 60)
+    return [
+        {"core": (start, end),
+         "window": (max(0.0, start - OVERLAP_SECONDS), min(duration_seconds, end + OVERLAP_SECONDS))}
+        for start, end in cores
+    ]
+
+
+def uploaded_seconds(plan: List[dict]) -> float:
+    """Seconds uploaded (and billed by ElevenLabs) for a plan: overlaps count once per window."""
+    return sum(chunk["window"][1] - chunk["window"][0] for chunk in plan)
+
+
+def response_words(transcription, offset: float = 0.0) -> List[dict]:
+    """
+    Extract spoken words from an ElevenLabs response.
+
+    Args:
+        transcription: speech_to_text.convert response
+        offset: Seconds added to every timestamp (chunk start in the full recording)
+
+    Returns:
+        List of {"text", "start", "end", "speaker"} dicts
+    """
+    words = []
+    for word in getattr(transcription, "words", None) or []:
+        if getattr(word, "type", "word") != "word":
+            continue  # skip spacing and audio events
+        start = getattr(word, "start", None)
+        end = getattr(word, "end", None)
+        words.append({
+            "text": getattr(word, "text", getattr(word, "word", "")),
+            "start": (start or 0.0) + offset,
+            "end": (end if end is not None else (start or 0.0)) + offset,
+            "speaker": getattr(word, "speaker_id", getattr(word, "speaker", "Unknown")),
+        })
+    return words
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^\w']", "", text.lower())
+
+
+def _map_speakers(previous: List[dict], current: List[dict], overlap: Tuple[float, float],
+                  known: set) -> dict:
+    """
+    Map the current chunk's speaker labels onto the global labels of the previous chunk.
+
+    Words heard by both chunks in the overlap window vote for a (local, global)
+    pairing; each global label is used at most once. Local speakers with no
+    votes get fresh global labels.
+    """
+    lo, hi = overlap
+    prev_words = [w for w in previous if lo <= w["start"] <= hi]
+    votes = Counter()
+    for word in current:
+        if not lo <= word["start"] <= hi:
+            continue
+        text = _normalize(word["text"])
+        for other in prev_words:
+            if abs(other["start"] - word["start"]) <= WORD_MATCH_TOLERANCE and _normalize(other["text"]) == text:
+                votes[(word["speaker"], other["speaker"])] += 1
+                break
+
+    mapping = {}
+    used = set()
+    for (local, global_label), _ in votes.most_common():
+        if local in mapping or global_label in used:
+            continue
+        mapping[local] = global_label
+        used.add(global_label)
+
+    for word in current:
+        local = word["speaker"]
+        if local in mapping:
+            continue
+        index = len(known)
+        while f"speaker_{index}" in known:
+            index += 1
+        mapping[local] = f"speaker_{index}"
+        known.add(mapping[local])
+    return mapping
+
+
+class ChunkStitcher:
+    """
+    Incremental form of stitch_chunks: chunks are added in order and each
+    addition returns that chunk's final words (used by live transcription,
+    where chunks arrive one at a time).
+    """
+
+    def __init__(self):
+        self._previous = None
+        self._known = set()
+
+    def add(self, core: Tuple[float, float], window: Tuple[float, float], words: List[dict],
+            is_last: bool = False) -> List[dict]:
+        """
+        Reconcile a chunk's speakers with the previous chunk and keep the words it owns.
+
+        Args:
+            core: (start, end) range of the recording this chunk owns
+            window: (start, end) range that was transcribed (core plus overlap)
+            words: Words with global timestamps and chunk-local speaker labels
+            is_last: Keep words past the end of the core (nothing follows this chunk)
+
+        Returns:
+            The chunk's words with global speaker labels, in transcription order
+        """
+        if self._previous is None:
+            mapping = {}
+            for word in words:
+                mapping.setdefault(word["speaker"], word["speaker"])
+            self._known.update(mapping.values())
+        else:
+            overlap = (window[0], self._previous["window"][1])
+            mapping = _map_speakers(self._previous["words"], words, overlap, self._known)
+
+        mapped = [dict(word, speaker=mapping[word["speaker"]]) for word in words]
+        core_start, core_end = core
+        kept = []
+        for word in mapped:
+            midpoint = (word["start"] + word["end"]) / 2
+            if core_start <= midpoint < core_end or (is_last and midpoint >= core_end):
+                kept.append(word)
+        self._previous = {"window": window, "words": mapped}
+        return kept
+
+
+def stitch_chunks(chunks: List[dict]) -> List[dict]:
+    """
+    Merge per-chunk word lists into one global word list.
+
+    Args:
+        chunks: Ordered dicts with "core" (start, end), "window" (start, end) and
+            "words" (global timestamps, chunk-local speaker labels)
+
+    Returns:
+        Words in time order with consistent speaker labels. Within an overlap,
+        each word is kept from the chunk whose core range contains it.
+    """
+    stitcher = ChunkStitcher()
+    stitched = []
+    for chunk in chunks:
+        stitched.extend(stitcher.add(chunk["core"], chunk["window"], chunk["words"], is_last=chunk is chunks[-1]))
+
+    stitched.sort(key=lambda w: w["start"])
+    return stitched
+
+
+def format_words(words: List[dict]) -> Optional[str]:
+    """Group consecutive words by speaker into "[mm:ss] Speaker X: text" lines."""
+    lines = []
+    current_speaker = None
+    current_text = []
+    turn_start = 0.0
+    for word in words:
+        if word["speaker"] != current_speaker:
+            if current_text:
+                mins, secs = divmod(int(turn_start), 60)
+                lines.append(f"[{mins:02d}:{secs:02d}] Speaker {current_speaker}: {' '.join(current_text)}")
+            current_speaker = word["speaker"]
+            current_text = []
+            turn_start = word["start"]
+        current_text.append(word["text"])
+    if current_text:
+        mins, secs = divmod(int(turn_start), 60)
+        lines.append(f"[{mins:02d}:{secs:02d}] Speaker {current_speaker}: {' '.join(current_text)}")
+    return "\n".join(lines) if lines else None
+
+
+def _transcribe_window(path: str, window: Tuple[float, float], transcribe: Callable) -> List[dict]:
+    """Transcribe one chunk, retrying transient failures on their own with jittered exponential backoff."""
+    start, end = window
+    for attempt in range(MAX_CHUNK_RETRIES + 1):
+        upload = open_audio_stream(path, start=start, duration=end - start)
+        try:
+            return response_words(transcribe(upload), offset=start)
+        except Exception as e:
+            # Auth, request and bad-audio errors fail the same way on every attempt
+            if attempt == MAX_CHUNK_RETRIES or not is_retryable(e):
+                raise Exception(f"Chunk {start:.0f}s-{end:.0f}s failed after {attempt + 1} attempts: {e}") from e
+            print(f"Chunk {start:.0f}s-{end:.0f}s failed ({e}); retrying")
+            time.sleep(retry_delay(attempt, e))
+        finally:
+            upload[1].close()
+
+
+def transcribe_in_chunks(path: str, duration_seconds: float, transcribe: Callable,
+                         chunk_seconds: Optional[float] = None, max_workers: int = MAX_WORKERS,
+                         plan: Optional[List[dict]] = None) -> List[dict]:
+    """
+    Transcribe a long recording as concurrent chunks and stitch the result.
+
+    Args:
+        path: Audio or video file
+        duration_seconds: Recording length
+        transcribe: Callable taking a (filename, file, content type) upload and
+            returning an ElevenLabs speech_to_text response
+        chunk_seconds: Target chunk length (defaults to TRANSCRIBE_CHUNK_MINUTES)
+        max_workers: Maximum concurrent requests
+        plan: Chunks from plan_windows, when the caller already planned them (e.g. to bill the windows)
+
+    Returns:
+        Stitched word list (see stitch_chunks)
+    """
+    chunk_seconds = chunk_seconds or CHUNK_MINUTES * 60
+    plan = plan or plan_windows(path, duration_seconds, chunk_seconds)
+    windows = [chunk["window"] for chunk in plan]
+    print(f"Transcribing {len(plan)} chunks of ~{math.ceil(chunk_seconds / 60)} min with {max_workers} workers")
+
+    # One copy of the caller's context per chunk, so metrics spans opened in the workers nest under it
+    contexts = [contextvars.copy_context() for _ in windows]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(
+            lambda ctx, w: ctx.run(_transcribe_window, path, w, transcribe), contexts, windows
+        ))
+
+    chunks = [dict(chunk, words=words) for chunk, words in zip(plan, results)]
+    return stitch_chunks(chunks)
@@ -0,0 +1,349 @@
+"""
+Persistent, searchable corpus of processed calls.
+Every processed recording is stored with its summary, metadata and speaker
+turns (with timestamps) in SQLite, and indexed with FTS5:
+  - calls_fts holds one document per call (transcript and summary) and
+    answers "which calls mention X" by itself; it keeps its own copy of the
+    text, so removing a call deletes exactly what was indexed
+  - turns_fts holds one document per speaker turn and is only queried for the
+    calls on the page being shown, to pick the matching turns and timestamps
+Call ids increase with processing time, so a date range becomes a rowid range
+and the default newest-first order is FTS5's native descending rowid scan.
+A page therefore costs one indexed lookup plus a few per-call turn lookups,
+however many calls are stored. Ranking by relevance has to score every match,
+so it ranks only the newest RELEVANCE_CANDIDATES matching calls: a broad query
+over a large corpus stays as fast as a narrow one.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+
+from src.audiosummarizer.utils.transcript_cache import CACHE_ROOT
+
+CORPUS_DB = CACHE_ROOT / "corpus.sqlite3"
+
+# Results per search page
+DEFAULT_PAGE_SIZE = 20
+
+# Matching turns shown per call
+TURN_HITS_PER_CALL = 3
+
+# Summary matches count more than transcript matches when ranking by relevance
+SUMMARY_WEIGHT = 2.0
+
+# Relevance order ranks only this many of the newest matching calls (bounds its cost on broad queries)
+RELEVANCE_CANDIDATES = int(os.getenv("CORPUS_RELEVANCE_CANDIDATES", "2000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT UNIQUE,
+    name TEXT,
+    processed_at REAL NOT NULL,
+    duration_seconds REAL,
+    summary TEXT,
+    turn_count INTEGER NOT NULL DEFAULT 0,
+    first_turn_id INTEGER,
+    last_turn_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS calls_processed_at ON calls (processed_at);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    call_id INTEGER NOT NULL,
+    turn_index INTEGER NOT NULL,
+    start REAL,
+    speaker TEXT,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_call ON turns (call_id, turn_index);
+CREATE VIRTUAL TABLE IF NOT EXISTS calls_fts USING fts5(
+    transcript, summary, tokenize='porter unicode61'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(
+    text, content='turns', content_rowid='id', tokenize='porter unicode61'
+);
+"""
+
+_TERM_PATTERN = re.compile(r"\w[\w']*")
+
+
+def to_fts_query(text: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query: every word must occur ("refund last week" ->
+    "refund" AND "last" AND "week"); quoted parts are matched as phrases.
+
+    Returns:
+        FTS5 query string, or None if the text has no searchable words
+    """
+    parts = []
+    for index, chunk in enumerate(text.split('"')):
+        terms = _TERM_PATTERN.findall(chunk)
+        if not terms:
+            continue
+        if index % 2 == 1:
+            parts.append('"' + " ".join(terms) + '"')
+        else:
+            parts.extend(f'"{term}"' for term in terms)
+    return " ".join(parts) if parts else None
+
+
+class CorpusStore:
+    """SQLite FTS5 store of processed calls, shared by the app, batch runs and workers."""
+
+    def __init__(self, db_path: Path = CORPUS_DB):
+        """
+        Initialize the corpus store.
+
+        Args:
+            db_path: SQLite database file
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # executescript manages its own transaction, so it runs outside _connect
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            self._migrate(conn)
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _migrate(self, conn):
+        """
+        Replace the external-content calls_fts of earlier versions, whose text was rebuilt
+        from the turns on delete and could differ from what was indexed, and re-index every call.
+        """
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'calls_fts'").fetchone()
+        if row is None or "calls_text" not in row[0]:
+            return
+        conn.executescript(
+            "BEGIN IMMEDIATE;"
+            "DROP TABLE calls_fts;"
+            "DROP VIEW IF EXISTS calls_text;"
+            + _SCHEMA +
+            "INSERT INTO calls_fts (rowid, transcript, summary) "
+            "SELECT c.id, COALESCE((SELECT group_concat(text, ' ') FROM "
+            "(SELECT text FROM turns WHERE call_id = c.id ORDER BY turn_index)), ''), COALESCE(c.summary, '') "
+            "FROM calls c;"
+            "COMMIT;"
+        )
+        print("Rebuilt the corpus call index")
+
+    @contextmanager
+    def _connect(self, immediate: bool = False):
+        """Yield a short-lived connection inside a transaction."""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def add_call(self, content_hash: str, name: str, summary: Optional[str], turns: List[dict],
+                 duration_seconds: Optional[float] = None) -> int:
+        """
+        Store (or replace) a processed call and index it.
+
+        Args:
+            content_hash: SHA-256 of the recording; processing it again replaces the earlier entry
+            name: Display name (original file name)
+            summary: Summary text
+            turns: Speaker turns as {"start", "speaker", "text"} dicts, in order
+            duration_seconds: Recording length
+
+        Returns:
+            Call id
+        """
+        with self._connect(immediate=True) as conn:
+            row = conn.execute("SELECT id FROM calls WHERE content_hash = ?", (content_hash,)).fetchone()
+            if row is not None:
+                self._delete(conn, row["id"])
+            return self._insert_call(conn, content_hash, name, summary, turns, duration_seconds)
+
+    def _insert_call(self, conn, content_hash: str, name: str, summary: Optional[str], turns: List[dict],
+                     duration_seconds: Optional[float]) -> int:
+        """Append a call, its turns and their index entries."""
+        # Ids must follow processing time (date filters are id ranges), so always append
+        call_id = conn.execute(
+            "INSERT INTO calls (content_hash, name, processed_at, duration_seconds, summary, turn_count) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (content_hash, name, time.time(), duration_seconds, summary, len(turns)),
+        ).lastrowid
+
+        turn_ids = []
+        for index, turn in enumerate(turns):
+            turn_id = conn.execute(
+                "INSERT INTO turns (call_id, turn_index, start, speaker, text) VALUES (?, ?, ?, ?, ?)",
+                (call_id, index, turn.get("start"), turn.get("speaker"), turn["text"]),
+            ).lastrowid
+            conn.execute("INSERT INTO turns_fts (rowid, text) VALUES (?, ?)", (turn_id, turn["text"]))
+            turn_ids.append(turn_id)
+        if turn_ids:
+            conn.execute(
+                "UPDATE calls SET first_turn_id = ?, last_turn_id = ? WHERE id = ?",
+                (turn_ids[0], turn_ids[-1], call_id),
+            )
+        conn.execute(
+            "INSERT INTO calls_fts (rowid, transcript, summary) VALUES (?, ?, ?)",
+            (call_id, " ".join(turn["text"] for turn in turns), summary or ""),
+        )
+        return call_id
+
+    def _delete(self, conn, call_id: int):
+        """Remove a call and its index entries (external-content turns_fts needs the indexed text to delete it)."""
+        conn.execute("DELETE FROM calls_fts WHERE rowid = ?", (call_id,))
+        conn.executemany(
+            "INSERT INTO turns_fts (turns_fts, rowid, text) VALUES ('delete', ?, ?)",
+            conn.execute("SELECT id, text FROM turns WHERE call_id = ?", (call_id,)).fetchall(),
+        )
+        conn.execute("DELETE FROM turns WHERE call_id = ?", (call_id,))
+        conn.execute("DELETE FROM calls WHERE id = ?", (call_id,))
+
+    def delete_call(self, content_hash: str) -> bool:
+        """Remove a call from the corpus. Returns True if it was stored."""
+        with self._connect(immediate=True) as conn:
+            row = conn.execute("SELECT id FROM calls WHERE content_hash = ?", (content_hash,)).fetchone()
+            if row is None:
+                return False
+            self._delete(conn, row["id"])
+        return True
+
+    def search(self, query: str = "", since: Optional[float] = None, until: Optional[float] = None,
+               page: int = 1, page_size: int = DEFAULT_PAGE_SIZE, order: str = "newest") -> dict:
+        """
+        Find calls mentioning every word of the query, optionally within a date range.
+
+        Args:
+            query: Free text (see to_fts_query); empty lists all calls in the range
+            since: Earliest processing time (epoch seconds), inclusive
+            until: Latest processing time (epoch seconds), exclusive
+            page: 1-based page number
+            page_size: Calls per page
+            order: "newest" (fastest) or "relevance" (BM25, summary matches weighted higher,
+                over the newest RELEVANCE_CANDIDATES matching calls)
+
+        Returns:
+            Dict with "results" (calls with id, name, processed_at, duration_seconds, summary,
+            turn_count and "hits": matching turns with start, speaker and a highlighted snippet),
+            "has_more", "capped" (relevance order left older matches unranked) and "seconds" (query time)
+        """
+        started = time.perf_counter()
+        fts_query = to_fts_query(query)
+        offset = (max(page, 1) - 1) * page_size
+        with self._connect() as conn:
+            id_range = self._id_range(conn, since, until)
+            if id_range is None:
+                return {"results": [], "has_more": False, "capped": False, "seconds": time.perf_counter() - started}
+            low, high = id_range
+            capped = False
+
+            columns = "c.id, c.name, c.processed_at, c.duration_seconds, c.summary, c.turn_count, " \
+                      "c.first_turn_id, c.last_turn_id"
+            if fts_query is None:
+                rows = conn.execute(
+                    f"SELECT {columns} FROM calls c WHERE c.id BETWEEN ? AND ? ORDER BY c.id DESC LIMIT ? OFFSET ?",
+                    (low, high, page_size + 1, offset),
+                ).fetchall()
+            elif order == "newest":
+                rows = conn.execute(
+                    f"SELECT {columns} FROM calls_fts JOIN calls c ON c.id = calls_fts.rowid "
+                    f"WHERE calls_fts MATCH ? AND calls_fts.rowid BETWEEN ? AND ? "
+                    f"ORDER BY calls_fts.rowid DESC LIMIT ? OFFSET ?",
+                    (fts_query, low, high, page_size + 1, offset),
+                ).fetchall()
+            else:
+                # Score the newest candidates in the same scan that finds them, then rank in memory
+                candidates = conn.execute(
+                    f"SELECT rowid, bm25(calls_fts, 1.0, {SUMMARY_WEIGHT}) FROM calls_fts "
+                    f"WHERE calls_fts MATCH ? AND rowid BETWEEN ? AND ? ORDER BY rowid DESC LIMIT ?",
+                    (fts_query, low, high, RELEVANCE_CANDIDATES + 1),
+                ).fetchall()
+                capped = len(candidates) > RELEVANCE_CANDIDATES
+                ranked = sorted(candidates[:RELEVANCE_CANDIDATES], key=lambda candidate: candidate[1])
+                ids = [candidate[0] for candidate in ranked[offset:offset + page_size + 1]]
+                by_id = {row["id"]: row for row in conn.execute(
+                    f"SELECT {columns} FROM calls c WHERE c.id IN ({', '.join('?' * len(ids))})", ids
+                )}
+                rows = [by_id[call_id] for call_id in ids if call_id in by_id]
+
+            results = []
+            for row in rows[:page_size]:
+                call = {key: row[key] for key in ("id", "name", "processed_at", "duration_seconds",
+                                                  "summary", "turn_count")}
+                call["hits"] = self._turn_hits(conn, fts_query, row) if fts_query else []
+                results.append(call)
+        return {"results": results, "has_more": len(rows) > page_size, "capped": capped,
+                "seconds": time.perf_counter() - started}
+
+    def _id_range(self, conn, since: Optional[float], until: Optional[float]) -> Optional[tuple]:
+        """Call id range covering a processing-time range (ids follow processing time), or None if empty."""
+        low, high = conn.execute(
+            "SELECT MIN(id), MAX(id) FROM calls WHERE processed_at >= ? AND processed_at < ?",
+            (since if since is not None else float("-inf"), until if until is not None else float("inf")),
+        ).fetchone()
+        return None if low is None else (low, high)
+
+    def _turn_hits(self, conn, fts_query: str, call) -> list:
+        """The first few turns of one call matching the query."""
+        if call["first_turn_id"] is None:
+            return []
+        rows = conn.execute(
+            "SELECT t.start, t.speaker, snippet(turns_fts, 0, '**', '**', '…', 24) AS snippet "
+            "FROM turns_fts JOIN turns t ON t.id = turns_fts.rowid "
+            "WHERE turns_fts MATCH ? AND turns_fts.rowid BETWEEN ? AND ? ORDER BY turns_fts.rowid LIMIT ?",
+            (fts_query, call["first_turn_id"], call["last_turn_id"], TURN_HITS_PER_CALL),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_call(self, call_id: int) -> Optional[dict]:
+        """
+        Get a stored call with all its turns.
+
+        Returns:
+            Dict with the call's fields and "turns" ({"start", "speaker", "text"} dicts), or None
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM calls WHERE id = ?", (call_id,)).fetchone()
+            if row is None:
+                return None
+            call = dict(row)
+            call["turns"] = [dict(turn) for turn in conn.execute(
+                "SELECT start, speaker, text FROM turns WHERE call_id = ? ORDER BY turn_index", (call_id,)
+            )]
+        return call
+
+    def get_stats(self) -> dict:
+        """
+        Get corpus statistics.
+
+        Returns:
+            Dict with the number of calls and turns
+        """
+        with self._connect() as conn:
+            calls = conn.execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+            turns = conn.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+        return {"calls": calls, "turns": turns}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_corpus_store() -> CorpusStore:
+    """Return the process-wide corpus store (the schema is created on first use)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CorpusStore()
+    return _store
@@ -0,0 +1,272 @@
+"""
+Persistent job queue for audio processing.
+
+The UI submits a graph run as a job; worker processes (see worker.py) claim
+queued jobs, run the graph and record the current stage, per-stage timings
+and finally the result in the same SQLite database, which the UI polls.
+Jobs survive browser tabs closing and Streamlit reruns, and jobs whose worker
+died are requeued once their heartbeat goes stale.
+"""
+import base64
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from src.audiosummarizer.utils.transcript_cache import CACHE_ROOT
+
+JOB_QUEUE_DB = CACHE_ROOT / "jobs.sqlite3"
+
+# Set to 1 to process uploads through the queue and worker pool instead of in the Streamlit session
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "0").lower() in ("1", "true", "yes")
+
+# A running job whose worker has not sent a heartbeat for this long is requeued
+STALE_AFTER_SECONDS = int(os.getenv("JOB_STALE_AFTER_SECONDS", "120"))
+
+# Attempts before a job that keeps losing its worker is marked failed
+MAX_ATTEMPTS = 3
+
+# Finished jobs older than this are deleted (default: 7 days)
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    content_hash TEXT,
+    status TEXT NOT NULL,
+    stage TEXT,
+    stages TEXT NOT NULL DEFAULT '[]',
+    state TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_content_hash ON jobs (content_hash);
+"""
+
+
+def _encode_state(state: dict) -> str:
+    """JSON-encode graph state; bytes values (e.g. transcript_words) are stored as base64."""
+    return json.dumps({
+        key: {"__bytes__": base64.b64encode(value).decode("ascii")} if isinstance(value, bytes) else value
+        for key, value in state.items()
+    })
+
+
+def _decode_state(text: Optional[str]) -> Optional[dict]:
+    if text is None:
+        return None
+    return {
+        key: base64.b64decode(value["__bytes__"]) if isinstance(value, dict) and "__bytes__" in value else value
+        for key, value in json.loads(text).items()
+    }
+
+
+class JobQueue:
+    """SQLite-backed queue of graph runs, shared by UI sessions and worker processes."""
+
+    def __init__(self, db_path: Path = JOB_QUEUE_DB, stale_after_seconds: int = STALE_AFTER_SECONDS):
+        """
+        Initialize the job queue.
+
+        Args:
+            db_path: SQLite database file
+            stale_after_seconds: Heartbeat age after which a running job is requeued
+        """
+        self.db_path = Path(db_path)
+        self.stale_after_seconds = stale_after_seconds
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # executescript manages its own transaction, so it runs outside _connect
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self, immediate: bool = False):
+        """
+        Yield a short-lived connection inside a transaction.
+
+        Args:
+            immediate: Take the write lock up front (for read-then-update sequences such as claiming a job)
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def submit(self, state: dict) -> str:
+        """
+        Queue a graph run.
+
+        A queued or running job for the same recording and cache setting is
+        reused instead of starting a second one.
+
+        Args:
+            state: Initial graph state (audio_path, content_hash, ...)
+
+        Returns:
+            Job id
+        """
+        with self._connect(immediate=True) as conn:
+            content_hash = state.get("content_hash")
+            if content_hash:
+                for row in conn.execute(
+                    "SELECT id, state FROM jobs WHERE content_hash = ? AND status IN (?, ?) ORDER BY created_at",
+                    (content_hash, QUEUED, RUNNING),
+                ):
+                    if bool(json.loads(row["state"]).get("bypass_cache")) == bool(state.get("bypass_cache")):
+                        return row["id"]
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, content_hash, status, state, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, content_hash, QUEUED, _encode_state(state), time.time()),
+            )
+        return job_id
+
+    def claim(self, worker: str) -> Optional[tuple]:
+        """
+        Atomically take the oldest queued job.
+
+        Args:
+            worker: Identifier of the claiming worker (stored for diagnostics)
+
+        Returns:
+            (job_id, state) or None if the queue is empty
+        """
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            row = conn.execute(
+                "SELECT id, state FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, "
+                "started_at = ?, heartbeat_at = ?, stage = NULL, stages = '[]' WHERE id = ?",
+                (RUNNING, worker, now, now, row["id"]),
+            )
+        return row["id"], _decode_state(row["state"])
+
+    def heartbeat(self, job_id: str):
+        """Mark a running job as alive."""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?", (time.time(), job_id, RUNNING))
+
+    def record_stage(self, job_id: str, stage: str, seconds: float):
+        """Record that a graph node finished, with its elapsed time."""
+        with self._connect(immediate=True) as conn:
+            row = conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            stages = json.loads(row["stages"])
+            stages.append({"stage": stage, "seconds": round(seconds, 3)})
+            conn.execute(
+                "UPDATE jobs SET stage = ?, stages = ?, heartbeat_at = ? WHERE id = ?",
+                (stage, json.dumps(stages), time.time(), job_id),
+            )
+
+    def complete(self, job_id: str, result: dict):
+        """Store the final graph state of a job."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+                (DONE, _encode_state(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str):
+        """Mark a job as failed."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (FAILED, error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Get a job's status.
+
+        Returns:
+            Dict with id, status, stage, stages, result, error, attempts, created_at,
+            started_at, finished_at and queue_position (queued jobs ahead of it), or None if unknown
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = {key: row[key] for key in ("id", "status", "stage", "error", "attempts",
+                                              "created_at", "started_at", "finished_at")}
+            job["stages"] = json.loads(row["stages"])
+            job["result"] = _decode_state(row["result"])
+            job["queue_position"] = 0
+            if row["status"] == QUEUED:
+                job["queue_position"] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, row["created_at"])
+                ).fetchone()[0]
+        return job
+
+    def requeue_stale(self) -> int:
+        """
+        Requeue running jobs whose worker stopped sending heartbeats (or fail them after MAX_ATTEMPTS).
+
+        Returns:
+            Number of jobs requeued or failed
+        """
+        cutoff = time.time() - self.stale_after_seconds
+        with self._connect(immediate=True) as conn:
+            failed = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                "WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+                (FAILED, "Worker stopped responding", time.time(), RUNNING, cutoff, MAX_ATTEMPTS),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat_at < ?",
+                (QUEUED, RUNNING, cutoff),
+            ).rowcount
+        return failed + requeued
+
+    def purge(self, older_than_seconds: int = JOB_RETENTION_SECONDS) -> int:
+        """Delete finished jobs older than the retention period."""
+        with self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (DONE, FAILED, time.time() - older_than_seconds),
+            ).rowcount
+
+    def get_stats(self) -> dict:
+        """
+        Get queue statistics.
+
+        Returns:
+            Dict with the number of jobs per status
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        stats = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        stats.update({status: count for status, count in rows})
+        return stats
@@ -0,0 +1,121 @@
+"""
+Media handle for uploaded audio/video files.
+An upload is spooled to disk once, in fixed-size chunks, and the resulting
+handle is shared by the probe, extraction and transcription stages. Uploads
+are spooled into the managed workspace, and the handle holds a lease on its
+file so it is not evicted while the session still uses it.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from src.audiosummarizer.utils.transcript_cache import hash_file
+from src.audiosummarizer.utils.workspace import get_workspace, owned_prefix, WorkspaceLease
+
+# Bytes copied per iteration while spooling (bounds peak memory per upload)
+SPOOL_CHUNK_SIZE = 4 * 1024 * 1024
+
+AUDIO_EXTENSIONS = ['.mp3', '.wav', '.m4a', '.flac', '.aac', '.ogg']
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.avi', '.mkv']
+
+
+class MediaHandle:
+    """A media file on local disk together with its name, size and content hash."""
+
+    def __init__(self, path: str, name: str, size: int, content_hash: str, lease: Optional[WorkspaceLease] = None):
+        """
+        Initialize a media handle.
+
+        Args:
+            path: Local path of the spooled file
+            name: Original file name (used for display and format detection)
+            size: File size in bytes
+            content_hash: SHA-256 hex digest of the file contents
+            lease: Workspace lease on the spooled file (None for files outside the workspace)
+        """
+        self.path = path
+        self.name = name
+        self.size = size
+        self.content_hash = content_hash
+        self.lease = lease
+
+    @property
+    def suffix(self) -> str:
+        """Lower-case file extension including the dot (e.g. '.mp3')."""
+        return Path(self.name).suffix.lower()
+
+    @property
+    def is_video(self) -> bool:
+        return self.suffix in VIDEO_EXTENSIONS
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def renew(self):
+        """Keep the spooled file leased (called on every rerun of the session holding the handle)."""
+        if self.lease is not None:
+            self.lease.renew()
+
+    @classmethod
+    def from_path(cls, path: str) -> "MediaHandle":
+        """
+        Wrap a file that is already on local disk (no copy is made).
+
+        Args:
+            path: Path of the audio or video file
+
+        Returns:
+            MediaHandle pointing at the file itself
+        """
+        return cls(str(path), os.path.basename(path), os.path.getsize(path), hash_file(path))
+
+    @classmethod
+    def from_upload(cls, uploaded_file, workspace=None, chunk_size: int = SPOOL_CHUNK_SIZE) -> "MediaHandle":
+        """
+        Spool an uploaded file into the workspace in chunks, hashing it on the way.
+
+        The spooled file is named after its content hash, so uploading the same
+        recording again reuses the existing copy instead of writing a new one.
+
+        Args:
+            uploaded_file: File-like object with a name (e.g. Streamlit's UploadedFile)
+            workspace: Workspace to spool into (defaults to the process-wide one)
+            chunk_size: Bytes copied per iteration
+
+        Returns:
+            MediaHandle pointing at the spooled file, holding a lease on it
+        """
+        workspace = workspace or get_workspace()
+        spool_dir = workspace.uploads_dir
+        suffix = Path(uploaded_file.name).suffix.lower()
+
+        digest = hashlib.sha256()
+        size = 0
+        uploaded_file.seek(0)
+        fd, tmp_path = tempfile.mkstemp(dir=spool_dir, prefix=owned_prefix("upload"), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter(lambda: uploaded_file.read(chunk_size), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        finally:
+            uploaded_file.seek(0)
+
+        content_hash = digest.hexdigest()
+        final_path = spool_dir / f"{content_hash}{suffix}"
+        if final_path.exists():
+            # Identical content already spooled - drop the duplicate
+            os.unlink(tmp_path)
+        else:
+            os.replace(tmp_path, final_path)
+
+        # Lease before registering: registering may evict idle artifacts to make room
+        lease = WorkspaceLease(workspace, str(final_path))
+        workspace.register(str(final_path), kind="upload")
+        return cls(str(final_path), uploaded_file.name, size, content_hash, lease=lease)
@@ -0,0 +1,212 @@
+"""
+Media probe service.
+Reads container headers only (duration, codec, sample rate, channels, has-audio)
+and memoizes results by content hash, in process and on disk, so Streamlit
+reruns and new sessions never probe the same recording twice.
+"""
+import json
+import os
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import Optional
+
+from src.audiosummarizer.utils import metrics
+from src.audiosummarizer.utils.transcript_cache import CACHE_ROOT, hash_file
+
+# Directory holding one JSON file per probed recording
+PROBE_CACHE_DIR = CACHE_ROOT / "probes"
+
+# Bump when the probe output changes so stale disk entries are ignored
+PROBE_VERSION = 1
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+class MediaInfo:
+    """Header-level facts about a media file."""
+
+    def __init__(self, duration_seconds: Optional[float] = None, codec: Optional[str] = None,
+                 sample_rate: Optional[int] = None, channels: Optional[int] = None,
+                 has_audio: bool = False, format_name: Optional[str] = None):
+        self.duration_seconds = duration_seconds
+        self.codec = codec
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.has_audio = has_audio
+        self.format_name = format_name
+
+    def to_dict(self) -> dict:
+        return {
+            "duration_seconds": self.duration_seconds,
+            "codec": self.codec,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "has_audio": self.has_audio,
+            "format_name": self.format_name,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MediaInfo":
+        return cls(**{key: data.get(key) for key in cls().to_dict()})
+
+    def __repr__(self):
+        return f"MediaInfo({self.to_dict()})"
+
+
+def ffmpeg_available() -> bool:
+    """Check whether the ffmpeg/ffprobe binaries are on PATH."""
+    return shutil.which("ffprobe") is not None and shutil.which("ffmpeg") is not None
+
+
+def format_duration(seconds: Optional[float]) -> Optional[str]:
+    """
+    Format a duration for display.
+
+    Returns:
+        String like "3 min 12 sec" or "45 sec", or None if the duration is unknown
+    """
+    if seconds is None:
+        return None
+    mins, secs = divmod(int(seconds), 60)
+    return f"{mins} min {secs} sec" if mins > 0 else f"{secs} sec"
+
+
+def probe_media(path: str, content_hash: Optional[str] = None) -> MediaInfo:
+    """
+    Probe a media file, using the memoized result when available.
+
+    Args:
+        path: Local path of the audio or video file
+        content_hash: SHA-256 of the file if already known (avoids re-hashing)
+
+    Returns:
+        MediaInfo for the file. duration_seconds is None if it could not be determined.
+    """
+    if content_hash is None:
+        content_hash = hash_file(path)
+
+    with _memo_lock:
+        info = _memo.get(content_hash)
+    if info is not None:
+        return info
+
+    # Memo hits above are not traced: the sidebar probes on every rerun
+    with metrics.span("probe") as probe_span:
+        info = _load_cached(content_hash)
+        probe_span.set(cache_hit=info is not None)
+        if info is None:
+            info = _probe_headers(path)
+            # Only persist successful probes so a missing ffprobe is retried later
+            if info.duration_seconds is not None:
+                _save_cached(content_hash, info)
+        probe_span.set(audio_seconds=info.duration_seconds or 0.0)
+
+    # Failed probes are not memoized either, so they are retried on the next call
+    if info.duration_seconds is not None:
+        with _memo_lock:
+            _memo[content_hash] = info
+    return info
+
+
+def _cache_path(content_hash: str) -> Path:
+    return PROBE_CACHE_DIR / f"{content_hash}.json"
+
+
+def _load_cached(content_hash: str) -> Optional[MediaInfo]:
+    try:
+        with open(_cache_path(content_hash), "r") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, IOError):
+        return None
+    if data.get("version") != PROBE_VERSION:
+        return None
+    return MediaInfo.from_dict(data)
+
+
+def _save_cached(content_hash: str, info: MediaInfo):
+    try:
+        PROBE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path = _cache_path(content_hash)
+        tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+        with open(tmp_path, "w") as f:
+            json.dump({"version": PROBE_VERSION, **info.to_dict()}, f)
+        os.replace(tmp_path, path)
+    except IOError as e:
+        print(f"Error saving probe cache entry: {e}")
+
+
+def _probe_headers(path: str) -> MediaInfo:
+    """Probe without decoding: mutagen in-process first, ffprobe as fallback."""
+    info = _probe_with_mutagen(path)
+    if info is not None and info.duration_seconds:
+        return info
+
+    info = _probe_with_ffprobe(path)
+    if info is not None:
+        return info
+    return MediaInfo()
+
+
+def _probe_with_mutagen(path: str) -> Optional[MediaInfo]:
+    """Parse headers with mutagen (mp3, m4a/mp4/mov, flac, ogg, wav, aac)."""
+    try:
+        from mutagen import File as MutagenFile
+        media = MutagenFile(path)
+    except Exception:
+        return None
+    if media is None or not getattr(media, "info", None):
+        return None
+
+    stream = media.info
+    duration = getattr(stream, "length", None)
+    sample_rate = getattr(stream, "sample_rate", None)
+    channels = getattr(stream, "channels", None)
+    codec = getattr(stream, "codec", None) or type(stream).__name__.replace("Info", "").lower()
+    return MediaInfo(
+        duration_seconds=float(duration) if duration else None,
+        codec=codec,
+        sample_rate=int(sample_rate) if sample_rate else None,
+        channels=int(channels) if channels else None,
+        has_audio=bool(sample_rate or channels),
+        format_name=type(media).__name__.lower(),
+    )
+
+
+def _probe_with_ffprobe(path: str) -> Optional[MediaInfo]:
+    """Read container and first audio stream headers with ffprobe."""
+    try:
+        result = subprocess.run(
+            [
+                'ffprobe', '-v', 'error',
+                '-select_streams', 'a:0',
+                '-show_entries', 'format=duration,format_name:stream=codec_name,sample_rate,channels',
+                '-of', 'json', path,
+            ],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        data = json.loads(result.stdout or "{}")
+    except (subprocess.CalledProcessError, ValueError, FileNotFoundError):
+        return None
+
+    fmt = data.get("format", {})
+    streams = data.get("streams", [])
+    stream = streams[0] if streams else {}
+    duration = fmt.get("duration")
+    sample_rate = stream.get("sample_rate")
+    try:
+        duration = float(duration) if duration not in (None, "N/A") else None
+    except ValueError:
+        duration = None
+    return MediaInfo(
+        duration_seconds=duration,
+        codec=stream.get("codec_name"),
+        sample_rate=int(sample_rate) if sample_rate else None,
+        channels=stream.get("channels"),
+        has_audio=bool(streams),
+        format_name=fmt.get("format_name"),
+    )
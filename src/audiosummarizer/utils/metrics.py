@@ -0,0 +1,383 @@
+"""
+Lightweight tracing and metrics for the processing pipeline.
+
+Spans time the graph nodes, chat calls, probes and audio extraction, and carry
+attributes such as audio duration, bytes uploaded, prompt/response sizes and
+cache hits. A span opened with no active parent is the root of a run. When a
+run ends it is kept in memory (the last METRICS_RECENT_RUNS runs, for the debug
+panel) and exported to METRICS_DIR as:
+  - Prometheus text exposition format, <process>.prom (for node_exporter's
+    textfile collector)
+  - OpenTelemetry-style JSON (OTLP/JSON span layout), one run per line in
+    traces.jsonl
+"""
+import contextvars
+import inspect
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from src.audiosummarizer.utils.transcript_cache import CACHE_ROOT
+
+# Directory the exported metrics and traces are written to
+METRICS_DIR = Path(os.getenv("METRICS_DIR", str(CACHE_ROOT / "metrics")))
+
+# Comma-separated export formats: "prometheus", "otel" ("none" disables file export)
+METRICS_EXPORT = {name.strip() for name in os.getenv("METRICS_EXPORT", "prometheus,otel").split(",") if name.strip()}
+
+# Completed runs kept in memory for the debug panel
+RECENT_RUNS = int(os.getenv("METRICS_RECENT_RUNS", "20"))
+
+# Spans kept per run in progress; further spans of a long run (e.g. a live session) are only aggregated
+MAX_SPANS_PER_RUN = 1000
+
+# Runs in progress tracked at once; past this the oldest is dropped (its root never finished)
+MAX_OPEN_RUNS = 1000
+
+# traces.jsonl is rotated to traces.jsonl.1 past this size
+MAX_TRACE_FILE_BYTES = 10 * 1024 * 1024
+
+# Histogram buckets for span durations in seconds
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# Numeric span attributes summed into Prometheus counters
+COUNTED_ATTRIBUTES = ("audio_seconds", "trimmed_seconds", "bytes_uploaded", "bytes_extracted",
+                      "prompt_chars", "response_chars")
+
+_current_span = contextvars.ContextVar("audiosummarizer_span", default=None)
+
+
+class Span:
+    """One timed operation with attributes."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes",
+                 "start_time", "started", "duration", "status", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attributes) -> "Span":
+        """Add or overwrite attributes."""
+        self.attributes.update(attributes)
+        return self
+
+    def end(self, error: Optional[BaseException] = None):
+        self.duration = time.perf_counter() - self.started
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class MetricsRecorder:
+    """Collects finished spans, aggregates them and exports completed runs."""
+
+    def __init__(self, recent_runs: int = RECENT_RUNS, export_dir: Path = METRICS_DIR, export: set = METRICS_EXPORT):
+        """
+        Initialize the recorder.
+
+        Args:
+            recent_runs: Completed runs kept in memory
+            export_dir: Directory for the .prom and traces.jsonl files
+            export: Export formats ("prometheus", "otel")
+        """
+        self.export_dir = Path(export_dir)
+        self.export = export
+        self.recent = deque(maxlen=recent_runs)
+        self._lock = threading.Lock()
+        self._open = OrderedDict()  # trace_id -> finished spans of runs still in progress, oldest first
+        self._histograms = {}  # (span, status) -> [bucket counts..., sum, count]
+        self._counters = {}    # (metric, labels) -> value
+        self._gauges = {}      # (metric, labels) -> value
+        # Names the .prom file: "streamlit" for the app, "batch" for the batch CLI, ...
+        stem = Path(sys.argv[0]).stem if sys.argv and sys.argv[0] else ""
+        self._process = stem if stem.isidentifier() else "python"
+
+    def start(self, root: Span):
+        """Start buffering the spans of a new run."""
+        with self._lock:
+            self._open[root.trace_id] = []
+            while len(self._open) > MAX_OPEN_RUNS:
+                self._open.popitem(last=False)
+
+    def finish(self, span: Span, is_root: bool):
+        """Record a finished span; when it is a run's root span, complete and export the run."""
+        with self._lock:
+            self._aggregate(span)
+            if not is_root:
+                spans = self._open.get(span.trace_id)
+                if spans is None or len(spans) >= MAX_SPANS_PER_RUN:
+                    # The run already ended (a late background span) or is too long to keep whole
+                    self._add("audiosummarizer_spans_dropped_total", (), 1)
+                    return
+                spans.append(span)
+                return
+            spans = self._open.pop(span.trace_id, [])
+            spans.append(span)
+            run = span.to_dict()
+            run["spans"] = [s.to_dict() for s in spans]
+            self.recent.appendleft(run)
+        self._export(run)
+
+    def _aggregate(self, span: Span):
+        key = (span.name, span.status)
+        histogram = self._histograms.setdefault(key, [0] * (len(DURATION_BUCKETS) + 2))
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if span.duration <= bound:
+                histogram[i] += 1
+        histogram[-2] += span.duration
+        histogram[-1] += 1
+
+        cache_hit = span.attributes.get("cache_hit")
+        if cache_hit is not None:
+            labels = (("span", span.name), ("result", "hit" if cache_hit else "miss"))
+            self._add("audiosummarizer_cache_lookups_total", labels, 1)
+        for attribute in COUNTED_ATTRIBUTES:
+            value = span.attributes.get(attribute)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self._add(f"audiosummarizer_{attribute}_total", (("span", span.name),), value)
+
+    def _add(self, metric: str, labels: tuple, value: float):
+        self._counters[(metric, labels)] = self._counters.get((metric, labels), 0) + value
+
+    def increment(self, metric: str, value: float = 1, labels: tuple = ()):
+        """Add to a counter that is not derived from spans."""
+        with self._lock:
+            self._add(metric, labels, value)
+
+    def set_gauge(self, metric: str, value: float, labels: tuple = ()):
+        """Set a gauge (a value that can go up and down, e.g. disk usage)."""
+        with self._lock:
+            self._gauges[(metric, labels)] = value
+
+    def recent_runs(self, limit: Optional[int] = None) -> list:
+        """Completed runs, newest first."""
+        with self._lock:
+            runs = list(self.recent)
+        return runs[:limit] if limit else runs
+
+    def to_prometheus(self) -> str:
+        """Render the aggregated metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        lines = [
+            "# HELP audiosummarizer_span_duration_seconds Duration of pipeline spans",
+            "# TYPE audiosummarizer_span_duration_seconds histogram",
+        ]
+        for (name, status), values in sorted(histograms.items()):
+            labels = f'span="{name}",status="{status}"'
+            for bound, count in zip(DURATION_BUCKETS, values):
+                lines.append(f'audiosummarizer_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'audiosummarizer_span_duration_seconds_bucket{{{labels},le="+Inf"}} {values[-1]}')
+            lines.append(f"audiosummarizer_span_duration_seconds_sum{{{labels}}} {values[-2]:.6f}")
+            lines.append(f"audiosummarizer_span_duration_seconds_count{{{labels}}} {values[-1]}")
+
+        declared = set()
+        for (metric, labels), value in sorted(counters.items()):
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            lines.append(f"{_series(metric, labels)} {value:g}")
+
+        declared = set()
+        for (metric, labels), value in sorted(gauges.items()):
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} gauge")
+                declared.add(metric)
+            lines.append(f"{_series(metric, labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def _export(self, run: dict):
+        if not self.export or "none" in self.export:
+            return
+        try:
+            self.export_dir.mkdir(parents=True, exist_ok=True)
+            if "prometheus" in self.export:
+                path = self.export_dir / f"{self._process}.prom"
+                tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+                with open(tmp_path, "w") as f:
+                    f.write(self.to_prometheus())
+                # Atomic rename so the textfile collector never reads a partial file
+                os.replace(tmp_path, path)
+            if "otel" in self.export:
+                path = self.export_dir / "traces.jsonl"
+                if path.exists() and path.stat().st_size > MAX_TRACE_FILE_BYTES:
+                    os.replace(path, path.with_suffix(".jsonl.1"))
+                with open(path, "a") as f:
+                    f.write(json.dumps(to_otel_json(run["spans"])) + "\n")
+        except OSError as e:
+            print(f"Error exporting metrics: {e}")
+
+
+def _series(metric: str, labels: tuple) -> str:
+    if not labels:
+        return metric
+    label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+    return f"{metric}{{{label_text}}}"
+
+
+def _otel_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otel_json(spans: list) -> dict:
+    """
+    Convert span dicts to the OTLP/JSON trace layout (resourceSpans/scopeSpans/spans).
+
+    Args:
+        spans: Span.to_dict() results of one run
+
+    Returns:
+        JSON-serializable dict
+    """
+    otel_spans = []
+    for span in spans:
+        start_ns = int(span["start_time"] * 1e9)
+        otel_span = {
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "name": span["name"],
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int((span["duration"] or 0.0) * 1e9)),
+            "attributes": [{"key": key, "value": _otel_value(value)} for key, value in span["attributes"].items()],
+            "status": {"code": 2, "message": span["error"]} if span["status"] == "error" else {"code": 1},
+        }
+        if span["parent_id"]:
+            otel_span["parentSpanId"] = span["parent_id"]
+        otel_spans.append(otel_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "audiosummarizer"}}]},
+            "scopeSpans": [{"scope": {"name": "src.audiosummarizer"}, "spans": otel_spans}],
+        }]
+    }
+
+
+_recorder = MetricsRecorder()
+
+
+def get_recorder() -> MetricsRecorder:
+    """The process-wide recorder."""
+    return _recorder
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block as a span (a child of the active span, or the root of a new run).
+
+    Usage:
+        with span("summarize", prompt_chars=len(prompt)) as s:
+            ...
+            s.set(response_chars=len(summary))
+    """
+    parent = _current_span.get()
+    current = Span(name, parent, attributes)
+    if parent is None:
+        _recorder.start(current)
+    token = _current_span.set(current)
+    error = None
+    try:
+        yield current
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            pass  # generator spans finished from another context
+        current.end(error)
+        _recorder.finish(current, is_root=parent is None)
+
+
+def annotate(**attributes):
+    """Set attributes on the active span (does nothing outside a span)."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def record(name: str, started: float, error: Optional[BaseException] = None, **attributes):
+    """
+    Record an already finished operation as a span, for code that cannot wrap
+    itself in span() (e.g. generators consumed elsewhere).
+
+    Args:
+        name: Span name
+        started: time.perf_counter() value when the operation started
+        error: Exception that ended the operation, if any
+        **attributes: Span attributes
+    """
+    parent = _current_span.get()
+    finished = Span(name, parent, attributes)
+    finished.start_time -= time.perf_counter() - started
+    finished.started = started
+    finished.end(error)
+    _recorder.finish(finished, is_root=parent is None)
+
+
+def increment(metric: str, value: float = 1, **labels):
+    """Add to a process-wide counter, exported with the span metrics."""
+    _recorder.increment(metric, value, tuple(sorted(labels.items())))
+
+
+def gauge(metric: str, value: float, **labels):
+    """Set a process-wide gauge, exported with the span metrics."""
+    _recorder.set_gauge(metric, value, tuple(sorted(labels.items())))
+
+
+def traced(name: str, fn):
+    """Wrap a graph node (sync or async) so each call runs in a span with the node's name."""
+    if inspect.iscoroutinefunction(fn):
+        async def traced_node(state):
+            with span(name):
+                return await fn(state)
+    else:
+        def traced_node(state):
+            with span(name):
+                return fn(state)
+    traced_node.__name__ = name
+    return traced_node
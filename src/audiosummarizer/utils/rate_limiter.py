@@ -0,0 +1,395 @@
+"""
+Process-wide rate limiting and retries for external API calls.
+Each provider (ElevenLabs, Gemini) has one limiter shared by every session,
+worker thread and graph run in the process. A limiter combines:
+  - a token bucket refilled at the provider's requests-per-minute quota, so
+    bursts are spread out instead of being rejected
+  - a cap on requests in flight
+  - an adaptive rate: a throttling response (429 / RESOURCE_EXHAUSTED) halves
+    the rate, and each success raises it back toward the quota (AIMD)
+  - retries of throttled and transient failures with jittered exponential
+    backoff, honouring Retry-After when the provider sends it
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional
+
+from src.audiosummarizer.utils import metrics
+
+# Requests per minute and requests in flight per provider
+PROVIDER_LIMITS = {
+    # Speech-to-text concurrency is limited by the ElevenLabs plan
+    "elevenlabs": (int(os.getenv("ELEVENLABS_RPM", "60")), int(os.getenv("ELEVENLABS_MAX_CONCURRENCY", "4"))),
+    # Defaults fit the gemini-2.5-flash free tier; raise GEMINI_RPM on paid tiers
+    "gemini": (int(os.getenv("GEMINI_RPM", "10")), int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))),
+}
+
+# Retries of a throttled or transiently failing call before the error is raised
+MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+
+# Exponential backoff: base * 2^attempt seconds, capped, with full jitter
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# The adaptive rate never drops below this fraction of the quota
+MIN_RATE_FRACTION = 0.1
+
+# Fraction of the quota added back per successful call
+RECOVERY_FRACTION = 0.05
+
+# Throttling responses closer together than this count as one (concurrent requests see the same 429)
+THROTTLE_DEBOUNCE_SECONDS = 1.0
+
+# HTTP statuses worth retrying; 429 also lowers the rate
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Exception classes (matched by name anywhere in the class hierarchy, so the SDKs need not be imported)
+# that mean throttling / a transient failure when the error carries no HTTP status
+_THROTTLE_TYPES = {"RateLimitError", "ModelRateLimitError", "ResourceExhausted", "TooManyRequests"}
+_TRANSIENT_TYPES = {
+    "TimeoutException", "TransportError",                                   # httpx (ElevenLabs, google-genai)
+    "Timeout",                                                              # requests
+    "ServiceUnavailable", "DeadlineExceeded", "InternalServerError",        # google-api-core
+}
+
+# gRPC-style status names carried by google-genai errors
+_THROTTLE_STATUSES = {"RESOURCE_EXHAUSTED"}
+_TRANSIENT_STATUSES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL"}
+
+# Last resort for wrappers that keep only the message; whole phrases, never bare status numbers
+_THROTTLE_PHRASES = ("resource_exhausted", "resource exhausted", "too many requests", "rate limit exceeded")
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    for attribute in ("status_code", "code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def _chain(error: BaseException, depth: int = 5):
+    """The error and the exceptions it was raised from (SDK wrappers keep the original as the cause)."""
+    seen = set()
+    while error is not None and depth > 0 and id(error) not in seen:
+        yield error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+        depth -= 1
+
+
+def _classify(error: BaseException) -> Optional[str]:
+    """Return "throttle", "transient" or None (not worth retrying)."""
+    for cause in _chain(error):
+        code = _status_code(cause)
+        if code is not None:
+            if code == 429:
+                return "throttle"
+            return "transient" if code in RETRYABLE_STATUSES else None
+        status = getattr(cause, "status", None)
+        if isinstance(status, str):
+            if status in _THROTTLE_STATUSES:
+                return "throttle"
+            if status in _TRANSIENT_STATUSES:
+                return "transient"
+        names = {cls.__name__ for cls in type(cause).__mro__}
+        if names & _THROTTLE_TYPES:
+            return "throttle"
+        if names & _TRANSIENT_TYPES or isinstance(cause, (TimeoutError, ConnectionError)):
+            return "transient"
+    text = str(error).lower()
+    if any(phrase in text for phrase in _THROTTLE_PHRASES):
+        return "throttle"
+    return None
+
+
+def is_throttle(error: BaseException) -> bool:
+    """True if the error is a throttling / quota response."""
+    return _classify(error) == "throttle"
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True if the call may succeed when repeated (throttling, 5xx, timeouts, dropped connections)."""
+    return _classify(error) is not None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds from the error's Retry-After header, if the provider sent one."""
+    for source in (*_chain(error), getattr(error, "response", None)):
+        headers = getattr(source, "headers", None)
+        if not headers:
+            continue
+        try:
+            value = headers.get("retry-after") or headers.get("Retry-After")
+            if value is not None:
+                return float(value)
+        except (TypeError, ValueError, AttributeError):
+            return None
+    return None
+
+
+def retry_delay(attempt: int, error: Optional[BaseException] = None) -> float:
+    """
+    Backoff before retry number attempt (0-based): full jitter over an exponentially
+    growing window, but never shorter than the provider's Retry-After.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    hint = retry_after(error) if error is not None else None
+    return max(delay, hint or 0.0)
+
+
+class _Slots:
+    """
+    Concurrency cap shared by threads and event loops: a semaphore that
+    threads wait on with an Event and coroutines await as a future, woken in
+    FIFO order as slots are released.
+    """
+
+    def __init__(self, size: int):
+        self._lock = threading.Lock()
+        self._free = size
+        self._waiters = deque()
+
+    def acquire(self):
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                return
+            future = loop.create_future()
+            self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+                    raise
+            # The slot was handed over just before the cancellation: pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        """Hand the slot to the longest waiter, or return it to the pool."""
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                try:
+                    waiter.get_loop().call_soon_threadsafe(self._wake, waiter)
+                    return
+                except RuntimeError:
+                    continue  # its event loop is closed
+            self._free += 1
+
+    def _wake(self, future):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+
+class RateLimiter:
+    """Token bucket with a concurrency cap and an adaptive rate, for one provider."""
+
+    def __init__(self, name: str, requests_per_minute: int, max_concurrency: int, max_retries: int = MAX_RETRIES):
+        """
+        Initialize the limiter.
+
+        Args:
+            name: Provider name (used in logs and metrics)
+            requests_per_minute: Quota; the rate never goes above it
+            max_concurrency: Requests allowed in flight at once
+            max_retries: Retries of retryable failures in call/stream
+        """
+        self.name = name
+        self.max_rate = max(requests_per_minute, 1) / 60.0
+        self.min_rate = self.max_rate * MIN_RATE_FRACTION
+        self.rate = self.max_rate
+        self.max_retries = max_retries
+        # Burst allowance: one request per concurrency slot
+        self.capacity = float(max(max_concurrency, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_throttle = 0.0
+        self._lock = threading.Lock()
+        self._slots = _Slots(max(max_concurrency, 1))
+        self._stats = {"requests": 0, "throttled": 0, "retries": 0, "wait_seconds": 0.0}
+
+    def _reserve(self) -> float:
+        """Take a token (going into debt if none is left); returns how long the caller must wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            wait = max(0.0, -self._tokens / self.rate, self._paused_until - now)
+            self._stats["requests"] += 1
+            self._stats["wait_seconds"] += wait
+        return wait
+
+    def _record_result(self, error: Optional[BaseException]):
+        with self._lock:
+            if error is None:
+                # Additive increase back toward the quota
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_FRACTION)
+                return
+            if not is_throttle(error):
+                return
+            now = time.monotonic()
+            self._stats["throttled"] += 1
+            hint = retry_after(error)
+            if hint:
+                self._paused_until = max(self._paused_until, now + hint)
+            if now - self._last_throttle < THROTTLE_DEBOUNCE_SECONDS:
+                return
+            # Multiplicative decrease, and drop the burst allowance
+            self._last_throttle = now
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+        print(f"{self.name}: throttled, lowering rate to {self.rate * 60:.1f} requests/min")
+
+    @contextmanager
+    def slot(self):
+        """Wait for a token and a free slot, then run the block as one request."""
+        time.sleep(self._reserve())
+        self._slots.acquire()
+        try:
+            try:
+                yield
+            except Exception as e:
+                self._record_result(e)
+                raise
+            self._record_result(None)
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """Async variant of slot (waits without blocking the event loop)."""
+        await asyncio.sleep(self._reserve())
+        await self._slots.aacquire()
+        try:
+            try:
+                yield
+            except Exception as e:
+                self._record_result(e)
+                raise
+            self._record_result(None)
+        finally:
+            self._slots.release()
+
+    def _should_retry(self, attempt: int, error: BaseException) -> bool:
+        if attempt >= self.max_retries or not is_retryable(error):
+            return False
+        with self._lock:
+            self._stats["retries"] += 1
+        metrics.annotate(**{f"{self.name}_retries": attempt + 1})
+        print(f"{self.name}: request failed ({error}); retry {attempt + 1}/{self.max_retries}")
+        return True
+
+    def call(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) as a limited request, retrying retryable failures."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.slot():
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                time.sleep(retry_delay(attempt, e))
+
+    async def acall(self, fn, *args, **kwargs):
+        """Async variant of call for coroutine functions."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.aslot():
+                    return await fn(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                await asyncio.sleep(retry_delay(attempt, e))
+
+    def stream(self, fn, *args, **kwargs):
+        """
+        Iterate fn(*args, **kwargs) as a limited request.
+
+        Failures before the first chunk are retried; once chunks have been
+        yielded the error is raised (the consumer already has partial output).
+        """
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                with self.slot():
+                    for chunk in fn(*args, **kwargs):
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                if started or not self._should_retry(attempt, e):
+                    raise
+                time.sleep(retry_delay(attempt, e))
+
+    async def astream(self, fn, *args, **kwargs):
+        """Async variant of stream for async iterators such as model.astream."""
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                async with self.aslot():
+                    async for chunk in fn(*args, **kwargs):
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                if started or not self._should_retry(attempt, e):
+                    raise
+                await asyncio.sleep(retry_delay(attempt, e))
+
+    def get_stats(self) -> dict:
+        """
+        Get limiter statistics.
+
+        Returns:
+            Dict with the current rate (requests/min), quota, requests, throttled
+            responses, retries and total seconds spent waiting for tokens
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["rate_per_minute"] = self.rate * 60
+            stats["quota_per_minute"] = self.max_rate * 60
+        return stats
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> RateLimiter:
+    """Return the process-wide limiter for a provider ("elevenlabs" or "gemini")."""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            requests_per_minute, max_concurrency = PROVIDER_LIMITS[provider]
+            limiter = RateLimiter(provider, requests_per_minute, max_concurrency)
+            _limiters[provider] = limiter
+    return limiter
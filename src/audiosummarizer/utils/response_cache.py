@@ -0,0 +1,166 @@
+"""
+Persistent cache for LLM responses (summaries and chat answers).
+Entries live in SQLite with a TTL and a size cap, and are keyed by the model
+name, the prompt template version, the transcript hash and the normalized
+question, so reprocessing a recording or repeating a question skips Gemini.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from src.audiosummarizer.utils.transcript_cache import CACHE_ROOT
+
+RESPONSE_CACHE_DB = CACHE_ROOT / "llm_responses.sqlite3"
+
+# Entries older than this are ignored and purged (default: 7 days)
+DEFAULT_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+# Least recently used entries beyond this count are evicted
+DEFAULT_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 5000))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+CREATE TABLE IF NOT EXISTS stats (
+    kind TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation so trivial variants share an entry."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+def model_name(model) -> str:
+    """Best-effort model identifier for a LangChain chat model."""
+    return str(getattr(model, "model", None) or getattr(model, "model_name", None) or type(model).__name__)
+
+
+class ResponseCache:
+    """SQLite-backed LLM response cache with TTL and LRU size cap."""
+
+    def __init__(self, db_path: Path = RESPONSE_CACHE_DB, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Initialize the response cache.
+
+        Args:
+            db_path: SQLite database file
+            ttl_seconds: Maximum age of a usable entry
+            max_entries: Maximum number of stored responses
+        """
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Yield a short-lived connection inside a transaction (safe across threads and sessions)."""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model: str, template_version: str, transcript_text: str, question: Optional[str] = None,
+                 summary: Optional[str] = None) -> str:
+        """
+        Build a cache key.
+
+        Args:
+            model: Model name (see model_name)
+            template_version: Version of the prompt template; bump it when the prompt changes
+            transcript_text: Transcript the response is based on
+            question: Chat question, if any (normalized before hashing)
+            summary: Summary included in the prompt, if any (a regenerated summary gets new answers)
+
+        Returns:
+            Hex digest identifying the response
+        """
+        transcript_hash = hashlib.sha256(transcript_text.encode("utf-8")).hexdigest()
+        parts = [model, template_version, transcript_hash, normalize_question(question) if question else ""]
+        if summary:
+            parts.append(hashlib.sha256(summary.encode("utf-8")).hexdigest())
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str, kind: str) -> Optional[str]:
+        """
+        Look up a response.
+
+        Args:
+            key: Cache key from make_key
+            kind: Response kind used for statistics ("summary" or "chat")
+
+        Returns:
+            The cached response, or None on a miss or expired entry
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            column = "hits" if row is not None else "misses"
+            conn.execute("INSERT OR IGNORE INTO stats (kind) VALUES (?)", (kind,))
+            conn.execute(f"UPDATE stats SET {column} = {column} + 1 WHERE kind = ?", (kind,))
+        return row[0] if row is not None else None
+
+    def put(self, key: str, kind: str, response: str):
+        """Store a response, then purge expired entries and enforce the size cap."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, kind, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, response, now, now),
+            )
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def get_stats(self) -> dict:
+        """
+        Get hit/miss statistics.
+
+        Returns:
+            Dict of kind -> {"hits", "misses", "hit_rate"}, plus "entries" with the stored count
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT kind, hits, misses FROM stats").fetchall()
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        stats = {"entries": entries}
+        for kind, hits, misses in rows:
+            lookups = hits + misses
+            stats[kind] = {"hits": hits, "misses": misses, "hit_rate": hits / lookups if lookups else 0.0}
+        return stats
+
+    def clear(self):
+        """Remove every cached response and reset statistics."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM stats")
@@ -1,131 +1,354 @@
 """
 Token usage tracker for ElevenLabs API.
 Tracks remaining tokens (in seconds) persistently across sessions.
+
+Usage is kept in a SQLite ledger (WAL mode) so concurrent sessions and worker
+processes on one host never lose updates. Transcriptions reserve their seconds
+up front and then commit them on success or refund them on failure; a
+reservation left behind by a crashed process expires after a while and its
+seconds return to the balance. Reads are
+served from an in-process cached balance that is invalidated whenever any
+connection changes the ledger.
 """
 import json
 import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional
 
 # Default total tokens: 10,000 seconds (10k tokens)
 DEFAULT_TOTAL_TOKENS = 10000
 
-# Path to store token usage data
+# Path of the usage ledger
+TOKEN_LEDGER_FILE = Path.home() / ".elevenlabs_token_usage.sqlite3"
+
+# Legacy JSON usage file, imported into the ledger on first use
 TOKEN_DATA_FILE = Path.home() / ".elevenlabs_token_usage.json"
 
+# Seconds a writer waits for another process holding the write lock
+LOCK_TIMEOUT_SECONDS = 30
+
+# Reservations neither committed nor refunded after this long belong to a process that died;
+# they are released (far longer than any transcription takes)
+RESERVATION_TTL_SECONDS = int(os.getenv("TOKEN_RESERVATION_TTL_SECONDS", 3 * 3600))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS balance (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_tokens INTEGER NOT NULL,
+    used_tokens INTEGER NOT NULL,
+    reserved_tokens INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    seconds INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    description TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS usage_history_created_at ON usage_history (created_at);
+CREATE INDEX IF NOT EXISTS usage_history_status ON usage_history (status, updated_at);
+"""
+
+# Ledgers whose schema has been created in this process
+_initialized = set()
+_init_lock = threading.Lock()
+
+# One long-lived connection per thread and ledger, used for cached reads
+_local = threading.local()
+
 
 class TokenTracker:
     """Manages ElevenLabs token usage tracking with persistent storage."""
-    
-    def __init__(self, total_tokens: int = DEFAULT_TOTAL_TOKENS):
+
+    def __init__(self, total_tokens: int = DEFAULT_TOTAL_TOKENS, db_path: Path = TOKEN_LEDGER_FILE):
         """
         Initialize token tracker.
-        
+
         Args:
             total_tokens: Total available tokens in seconds (default: 10000)
+            db_path: SQLite ledger file
         """
         self.total_tokens = total_tokens
-        self.data_file = TOKEN_DATA_FILE
-        self._ensure_data_file()
-    
-    def _ensure_data_file(self):
-        """Ensure the data file exists with initial values."""
-        if not self.data_file.exists():
-            self._save_data({
-                "total_tokens": self.total_tokens,
-                "used_tokens": 0,
-                "remaining_tokens": self.total_tokens
-            })
-    
-    def _load_data(self) -> dict:
-        """Load token usage data from file."""
+        self.db_path = Path(db_path)
+        self._ensure_ledger()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=LOCK_TIMEOUT_SECONDS, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """Run a write transaction holding the ledger's write lock for its whole duration."""
+        conn = self._connect()
         try:
-            if self.data_file.exists():
-                with open(self.data_file, 'r') as f:
-                    data = json.load(f)
-                    # Ensure total_tokens matches current setting
-                    if data.get("total_tokens") != self.total_tokens:
-                        # Reset if total changed
-                        data["total_tokens"] = self.total_tokens
-                        data["used_tokens"] = 0
-                        data["remaining_tokens"] = self.total_tokens
-                    return data
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Error loading token data: {e}")
-        
-        # Return default data if file doesn't exist or is corrupted
-        return {
-            "total_tokens": self.total_tokens,
-            "used_tokens": 0,
-            "remaining_tokens": self.total_tokens
-        }
-    
-    def _save_data(self, data: dict):
-        """Save token usage data to file."""
+            # IMMEDIATE takes the write lock up front, so read-check-update cannot interleave
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        self._invalidate()
+
+    def _ensure_ledger(self):
+        """Create the ledger once per process, importing the legacy JSON usage if present."""
+        key = (str(self.db_path), self.total_tokens)
+        with _init_lock:
+            if key in _initialized:
+                return
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.executescript(_SCHEMA)
+            finally:
+                conn.close()
+            with self._write() as conn:
+                row = conn.execute("SELECT total_tokens FROM balance WHERE id = 1").fetchone()
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO balance (id, total_tokens, used_tokens, reserved_tokens) VALUES (1, ?, ?, 0)",
+                        (self.total_tokens, self._legacy_used_tokens()),
+                    )
+                elif row[0] != self.total_tokens:
+                    # Reset if total changed
+                    conn.execute(
+                        "UPDATE balance SET total_tokens = ?, used_tokens = 0, reserved_tokens = 0 WHERE id = 1",
+                        (self.total_tokens,),
+                    )
+                # Startup: release what crashed processes left reserved
+                self._expire_stale(conn)
+            _initialized.add(key)
+
+    def _legacy_used_tokens(self) -> int:
+        """Read used tokens from the old JSON file (0 if missing or unreadable)."""
         try:
-            with open(self.data_file, 'w') as f:
-                json.dump(data, f, indent=2)
-        except IOError as e:
-            print(f"Error saving token data: {e}")
-    
+            with open(TOKEN_DATA_FILE, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, IOError):
+            return 0
+        if data.get("total_tokens") != self.total_tokens:
+            return 0
+        return int(data.get("used_tokens", 0))
+
+    def _reader(self) -> sqlite3.Connection:
+        connections = getattr(_local, "connections", None)
+        if connections is None:
+            connections = _local.connections = {}
+        conn = connections.get(self.db_path)
+        if conn is None:
+            conn = connections[self.db_path] = self._connect()
+        return conn
+
+    def _invalidate(self):
+        cache = getattr(_local, "balances", None)
+        if cache is not None:
+            cache.pop(self.db_path, None)
+
+    def _load_data(self) -> dict:
+        """
+        Load the current balance.
+
+        Served from a per-thread cache; PRAGMA data_version tells us when any
+        other connection (thread, session or process) has committed a change.
+        """
+        conn = self._reader()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        cache = getattr(_local, "balances", None)
+        if cache is None:
+            cache = _local.balances = {}
+        cached = cache.get(self.db_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        total, used, reserved = conn.execute(
+            "SELECT total_tokens, used_tokens, reserved_tokens FROM balance WHERE id = 1"
+        ).fetchone()
+        data = {
+            "total_tokens": total,
+            "used_tokens": used,
+            "reserved_tokens": reserved,
+            "remaining_tokens": total - used - reserved,
+        }
+        cache[self.db_path] = (version, data)
+        return data
+
     def get_remaining_tokens(self) -> int:
-        """Get remaining tokens in seconds."""
+        """Get remaining tokens in seconds (reserved seconds are not available)."""
         data = self._load_data()
-        return max(0, data.get("remaining_tokens", self.total_tokens))
-    
+        return max(0, data["remaining_tokens"])
+
     def get_used_tokens(self) -> int:
         """Get used tokens in seconds."""
-        data = self._load_data()
-        return data.get("used_tokens", 0)
-    
+        return self._load_data()["used_tokens"]
+
+    def get_reserved_tokens(self) -> int:
+        """Get seconds reserved by transcriptions still in progress."""
+        return self._load_data()["reserved_tokens"]
+
+    def reserve(self, seconds: float, description: Optional[str] = None) -> Optional[int]:
+        """
+        Atomically reserve tokens for a transcription about to start.
+
+        Args:
+            seconds: Duration of audio in seconds
+            description: What the seconds are for (stored in the history)
+
+        Returns:
+            Reservation id to pass to commit() or refund(), or None if there are insufficient tokens
+        """
+        seconds_int = int(round(seconds))
+        now = time.time()
+        with self._write() as conn:
+            self._expire_stale(conn, now)
+            total, used, reserved = conn.execute(
+                "SELECT total_tokens, used_tokens, reserved_tokens FROM balance WHERE id = 1"
+            ).fetchone()
+            if seconds_int > total - used - reserved:
+                return None  # Insufficient tokens
+            conn.execute("UPDATE balance SET reserved_tokens = reserved_tokens + ? WHERE id = 1", (seconds_int,))
+            cursor = conn.execute(
+                "INSERT INTO usage_history (seconds, status, description, created_at, updated_at) "
+                "VALUES (?, 'reserved', ?, ?, ?)",
+                (seconds_int, description, now, now),
+            )
+            return cursor.lastrowid
+
+    def _expire_stale(self, conn, now: Optional[float] = None) -> int:
+        """
+        Release reservations older than RESERVATION_TTL_SECONDS (inside a write transaction).
+
+        Returns:
+            Seconds returned to the balance
+        """
+        cutoff = (now or time.time()) - RESERVATION_TTL_SECONDS
+        rows = conn.execute(
+            "SELECT id, seconds FROM usage_history WHERE status = 'reserved' AND updated_at < ?", (cutoff,)
+        ).fetchall()
+        if not rows:
+            return 0
+        released = sum(seconds for _, seconds in rows)
+        conn.execute("UPDATE balance SET reserved_tokens = MAX(0, reserved_tokens - ?) WHERE id = 1", (released,))
+        conn.executemany(
+            "UPDATE usage_history SET status = 'expired', updated_at = ? WHERE id = ?",
+            [(time.time(), reservation_id) for reservation_id, _ in rows],
+        )
+        print(f"Released {len(rows)} stale token reservations ({released} sec)")
+        return released
+
+    def commit(self, reservation_id: int, seconds: Optional[float] = None):
+        """
+        Turn a reservation into used tokens.
+
+        Args:
+            reservation_id: Id returned by reserve()
+            seconds: Actual seconds to charge, if different from the reservation
+                (any difference is released back to the balance)
+        """
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT seconds, status FROM usage_history WHERE id = ? AND status IN ('reserved', 'expired')",
+                (reservation_id,),
+            ).fetchone()
+            if row is None:
+                return
+            # An expired reservation was already released; the seconds are still charged
+            reserved = row[0] if row[1] == "reserved" else 0
+            charged = row[0] if seconds is None else int(round(seconds))
+            conn.execute(
+                "UPDATE balance SET reserved_tokens = reserved_tokens - ?, used_tokens = used_tokens + ? WHERE id = 1",
+                (reserved, charged),
+            )
+            conn.execute(
+                "UPDATE usage_history SET status = 'committed', seconds = ?, updated_at = ? WHERE id = ?",
+                (charged, time.time(), reservation_id),
+            )
+
+    def refund(self, reservation_id: int):
+        """
+        Return the seconds of a reservation (e.g. after a failed transcription).
+
+        Committed usage can be refunded too.
+        """
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT seconds, status FROM usage_history WHERE id = ?", (reservation_id,)
+            ).fetchone()
+            if row is None or row[1] == "refunded":
+                return
+            seconds, status = row
+            if status != "expired":
+                column = "reserved_tokens" if status == "reserved" else "used_tokens"
+                conn.execute(f"UPDATE balance SET {column} = {column} - ? WHERE id = 1", (seconds,))
+            conn.execute(
+                "UPDATE usage_history SET status = 'refunded', updated_at = ? WHERE id = ?",
+                (time.time(), reservation_id),
+            )
+
     def use_tokens(self, seconds: float) -> bool:
         """
         Deduct tokens for audio duration.
-        
+
         Args:
             seconds: Duration of audio in seconds
-            
+
         Returns:
             True if tokens were successfully deducted, False if insufficient tokens
         """
-        data = self._load_data()
-        remaining = data.get("remaining_tokens", self.total_tokens)
-        used = data.get("used_tokens", 0)
-        
-        seconds_int = int(round(seconds))
-        
-        if seconds_int > remaining:
-            return False  # Insufficient tokens
-        
-        # Update usage
-        new_remaining = remaining - seconds_int
-        new_used = used + seconds_int
-        
-        data["remaining_tokens"] = new_remaining
-        data["used_tokens"] = new_used
-        
-        self._save_data(data)
+        reservation_id = self.reserve(seconds)
+        if reservation_id is None:
+            return False
+        self.commit(reservation_id)
         return True
-    
+
+    def get_history(self, limit: int = 20) -> list:
+        """
+        Get the most recent ledger entries.
+
+        Returns:
+            List of dicts with id, seconds, status, description, created_at, updated_at (newest first)
+        """
+        conn = self._reader()
+        rows = conn.execute(
+            "SELECT id, seconds, status, description, created_at, updated_at "
+            "FROM usage_history ORDER BY id DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        keys = ("id", "seconds", "status", "description", "created_at", "updated_at")
+        return [dict(zip(keys, row)) for row in rows]
+
     def reset_tokens(self):
         """Reset token usage (useful for new monthly cycle)."""
-        self._save_data({
-            "total_tokens": self.total_tokens,
-            "used_tokens": 0,
-            "remaining_tokens": self.total_tokens
-        })
-    
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE balance SET total_tokens = ?, used_tokens = 0, reserved_tokens = 0 WHERE id = 1",
+                (self.total_tokens,),
+            )
+            conn.execute(
+                "UPDATE usage_history SET status = 'refunded', updated_at = ? WHERE status = 'reserved'",
+                (time.time(),),
+            )
+
     def format_remaining_time(self) -> str:
         """
         Format remaining tokens as human-readable time string.
-        
+
         Returns:
             Formatted string like "166 min 40 sec" or "40 sec"
         """
         remaining = self.get_remaining_tokens()
         hours, remainder = divmod(remaining, 3600)
         mins, secs = divmod(remainder, 60)
-        
+
         parts = []
         if hours > 0:
             parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
@@ -133,15 +356,14 @@ class TokenTracker:
             parts.append(f"{mins} min{'s' if mins != 1 else ''}")
         if secs > 0 or not parts:
             parts.append(f"{secs} sec{'s' if secs != 1 else ''}")
-        
+
         return " ".join(parts)
-    
+
     def get_usage_percentage(self) -> float:
         """Get percentage of tokens used."""
         data = self._load_data()
-        used = data.get("used_tokens", 0)
-        total = data.get("total_tokens", self.total_tokens)
+        used = data["used_tokens"]
+        total = data["total_tokens"]
         if total == 0:
             return 0.0
         return (used / total) * 100
-
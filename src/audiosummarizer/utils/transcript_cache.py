@@ -0,0 +1,248 @@
+"""
+On-disk transcript cache for ElevenLabs transcriptions.
+Entries are keyed by a SHA-256 of the audio bytes plus the transcription
+parameters, so reprocessing the same recording skips the API call entirely.
+Hit, miss and eviction counters live in a small SQLite table, so the app,
+batch runs and workers can update them concurrently.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+# Root directory for all audio summarizer caches
+CACHE_ROOT = Path(os.getenv("AUDIOSUMMARIZER_CACHE_DIR", str(Path.home() / ".audiosummarizer_cache")))
+
+# Directory holding one JSON file per cached transcript
+TRANSCRIPT_CACHE_DIR = CACHE_ROOT / "transcripts"
+
+# Default size bound for the transcript cache: 200 MB
+DEFAULT_MAX_CACHE_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+# Read size used when hashing audio files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+STATS_DB_NAME = "stats.sqlite3"
+
+# Counters written by earlier versions; imported into the database once
+LEGACY_STATS_FILE_NAME = "stats.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stats (
+    counter TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def hash_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """
+    Compute the SHA-256 of a file without loading it into memory.
+
+    Args:
+        path: Path of the file to hash
+        chunk_size: Number of bytes read per iteration
+
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """Size-bounded LRU cache of transcripts stored as JSON files."""
+
+    def __init__(self, cache_dir: Path = TRANSCRIPT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_CACHE_BYTES):
+        """
+        Initialize the transcript cache.
+
+        Args:
+            cache_dir: Directory where cache entries are written
+            max_bytes: Total size above which least recently used entries are evicted
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.stats_db = self.cache_dir / STATS_DB_NAME
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+        self._import_legacy_stats()
+
+    @contextmanager
+    def _connect(self):
+        """Yield a short-lived connection inside a transaction (safe across threads and processes)."""
+        conn = sqlite3.connect(self.stats_db, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _import_legacy_stats(self):
+        legacy = self.cache_dir / LEGACY_STATS_FILE_NAME
+        if not legacy.exists():
+            return
+        try:
+            with open(legacy, "r") as f:
+                stats = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            stats = {}
+        try:
+            legacy.unlink()
+        except OSError:
+            return  # another process is importing it
+        for counter, value in stats.items():
+            if isinstance(value, int):
+                self._record(counter, value)
+
+    @staticmethod
+    def make_key(content_hash: str, params: dict) -> str:
+        """
+        Build a cache key from the audio hash and the transcription parameters.
+
+        Args:
+            content_hash: SHA-256 hex digest of the audio bytes
+            params: Parameters passed to the transcription API (model_id, diarize, ...)
+
+        Returns:
+            Hex digest identifying the cache entry
+        """
+        payload = json.dumps({"audio": content_hash, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def contains(self, key: str) -> bool:
+        """Return True if an entry exists for key (without counting a hit or refreshing it)."""
+        return self._entry_path(key).exists()
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Look up a cached transcription.
+
+        Args:
+            key: Cache key from make_key
+
+        Returns:
+            The cached entry, or None on a miss
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, IOError):
+            self._record("misses")
+            return None
+
+        # Bump the modification time so eviction treats this entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self._record("hits")
+        return entry
+
+    def put(self, key: str, entry: dict):
+        """
+        Store a transcription and evict old entries if the cache is over its size bound.
+
+        Args:
+            key: Cache key from make_key
+            entry: JSON-serializable data to store (at least the transcript text)
+        """
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            # Atomic rename so concurrent readers never see a half-written entry
+            os.replace(tmp_path, path)
+        except IOError as e:
+            print(f"Error saving transcript cache entry: {e}")
+            return
+        self._evict()
+
+    def _entries(self) -> list:
+        """Return (mtime, size, path) for every cache entry."""
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            if path.name == LEGACY_STATS_FILE_NAME:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+                evicted += 1
+            except OSError:
+                continue
+        if evicted:
+            self._record("evictions", evicted)
+
+    def _load_stats(self) -> dict:
+        stats = {"hits": 0, "misses": 0, "evictions": 0}
+        with self._connect() as conn:
+            stats.update(conn.execute("SELECT counter, value FROM stats").fetchall())
+        return stats
+
+    def _record(self, counter: str, amount: int = 1):
+        """Increment a persistent statistics counter."""
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO stats (counter, value) VALUES (?, ?) "
+                    "ON CONFLICT(counter) DO UPDATE SET value = value + excluded.value",
+                    (counter, amount),
+                )
+        except sqlite3.Error as e:
+            print(f"Error saving transcript cache stats: {e}")
+
+    def get_stats(self) -> dict:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict with hits, misses, evictions, hit_rate, entries and size_bytes
+        """
+        stats = self._load_stats()
+        entries = self._entries()
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        stats["hit_rate"] = (stats.get("hits", 0) / lookups) if lookups else 0.0
+        stats["entries"] = len(entries)
+        stats["size_bytes"] = sum(size for _, size, _ in entries)
+        return stats
+
+    def clear(self):
+        """Remove every cached transcript and reset statistics."""
+        for _, _, path in self._entries():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        with self._connect() as conn:
+            conn.execute("DELETE FROM stats")
@@ -0,0 +1,205 @@
+"""
+Retrieval index over the speaker turns of one transcript.
+BM25 scoring with NumPy postings arrays, built once per transcript so chat
+questions only send the most relevant turns to the LLM.
+"""
+import hashlib
+import re
+from bisect import bisect_right
+from typing import List, Optional
+
+import numpy as np
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Turns sent to the LLM per question, plus neighbouring turns kept for context
+DEFAULT_TOP_K = 8
+DEFAULT_NEIGHBORS = 1
+
+_TURN_PATTERN = re.compile(r"^\s*(?:\[(\d+):(\d{2})(?::(\d{2}))?\]\s*)?Speaker\s+([^:]+):\s*(.*)$")
+_TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+_STOPWORDS = frozenset("""
+a an and are as at be but by did do does for from had has have he her his i if in is it its me my of on or our
+she so that the their them they this to was we were what when where which who why will with you your
+""".split())
+
+# Questions about the call as a whole need the full transcript, not a few turns
+_GLOBAL_QUESTION_PATTERN = re.compile(
+    r"\b(summar\w*|overall|overview|everything|entire|whole|full (call|conversation|transcript)|"
+    r"all (the )?(points|topics|issues)|from start to finish|recap|tl;?dr)\b",
+    re.IGNORECASE,
+)
+
+
+def parse_turns(transcript_text: str) -> List[dict]:
+    """
+    Split a formatted transcript into speaker turns.
+
+    Each line such as "[01:23] Speaker speaker_0: text" becomes one turn.
+    Lines without a speaker label become turns with speaker None.
+
+    Returns:
+        List of {"start", "speaker", "text", "line"} dicts (start in seconds or None)
+    """
+    turns = []
+    for line in transcript_text.splitlines():
+        if not line.strip():
+            continue
+        match = _TURN_PATTERN.match(line)
+        if match:
+            first, second, third, speaker, text = match.groups()
+            if third is not None:
+                start = int(first) * 3600 + int(second) * 60 + int(third)
+            elif first is not None:
+                start = int(first) * 60 + int(second)
+            else:
+                start = None
+            turns.append({"start": start, "speaker": speaker.strip(), "text": text, "line": line.strip()})
+        else:
+            turns.append({"start": None, "speaker": None, "text": line.strip(), "line": line.strip()})
+    return turns
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def transcript_hash(transcript_text: str) -> str:
+    return hashlib.sha256(transcript_text.encode("utf-8")).hexdigest()
+
+
+def is_global_question(question: str) -> bool:
+    """Return True for questions about the whole call (answered from full context)."""
+    return bool(_GLOBAL_QUESTION_PATTERN.search(question))
+
+
+class TranscriptIndex:
+    """BM25 index over the speaker turns of a transcript."""
+
+    def __init__(self, turns: List[dict], content_hash: Optional[str] = None):
+        """
+        Build the index.
+
+        Args:
+            turns: Turns from parse_turns
+            content_hash: Hash of the transcript the turns came from
+        """
+        self.turns = turns
+        self.content_hash = content_hash
+
+        # Start time of every turn (untimed turns inherit the previous start) for timestamp lookups
+        self._starts = []
+        last_start = 0
+        for turn in turns:
+            if turn["start"] is not None:
+                last_start = turn["start"]
+            self._starts.append(last_start)
+
+        postings = {}
+        doc_lengths = np.zeros(len(turns), dtype=np.float32)
+        for doc_id, turn in enumerate(turns):
+            tokens = tokenize(turn["text"])
+            doc_lengths[doc_id] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(doc_id)
+                postings[token][1].append(tf)
+
+        # One pair of compact arrays per term: doc ids and term frequencies
+        self._postings = {
+            token: (np.asarray(docs, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+            for token, (docs, tfs) in postings.items()
+        }
+        n_docs = max(len(turns), 1)
+        avg_length = float(doc_lengths.mean()) if len(turns) else 0.0
+        # Per-document BM25 length normalization, precomputed once
+        self._length_norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(avg_length, 1e-9))
+        self._idf = {
+            token: float(np.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5)))
+            for token, (docs, _) in self._postings.items()
+        }
+
+    @classmethod
+    def from_transcript(cls, transcript_text: str, transcript_words: Optional[bytes] = None) -> "TranscriptIndex":
+        """
+        Index a transcript, taking the turns from its word timings when available
+        (exact start times whatever the text format) and parsing the text otherwise.
+
+        Args:
+            transcript_text: Formatted transcript
+            transcript_words: CompactTranscript bytes of the same transcript
+        """
+        if not transcript_words:
+            return cls(parse_turns(transcript_text), transcript_hash(transcript_text))
+        from src.audiosummarizer.utils.transcript_model import CompactTranscript
+
+        turns = []
+        for start, _, speaker, text in CompactTranscript.from_bytes(transcript_words).turns():
+            mins, secs = divmod(int(start), 60)
+            turns.append({"start": start, "speaker": speaker, "text": text,
+                          "line": f"[{mins:02d}:{secs:02d}] Speaker {speaker}: {text}"})
+        return cls(turns, transcript_hash(transcript_text))
+
+    def __len__(self):
+        return len(self.turns)
+
+    def turn_at(self, seconds: float) -> int:
+        """Index of the turn being spoken at a timestamp (binary search; 0 before the first turn)."""
+        return max(0, bisect_right(self._starts, seconds) - 1)
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K) -> List[int]:
+        """
+        Rank turns against a query.
+
+        Returns:
+            Indices of the best matching turns, best first (only turns with a non-zero score)
+        """
+        scores = np.zeros(len(self.turns), dtype=np.float32)
+        for token in set(tokenize(query)):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            scores[docs] += self._idf[token] * tfs * (BM25_K1 + 1) / (tfs + self._length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return []
+        if matched.size > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        return matched[np.argsort(-scores[matched], kind="stable")].tolist()
+
+    def relevant_context(self, query: str, top_k: int = DEFAULT_TOP_K,
+                         neighbors: int = DEFAULT_NEIGHBORS) -> Optional[str]:
+        """
+        Build an excerpt of the transcript relevant to a question.
+
+        The best matching turns are widened by their neighbouring turns and
+        returned in transcript order, with their "[mm:ss] Speaker X" labels.
+        Gaps between excerpts are marked with "...".
+
+        Returns:
+            The excerpt, or None if nothing matched
+        """
+        hits = self.search(query, top_k)
+        if not hits:
+            return None
+
+        selected = set()
+        for hit in hits:
+            selected.update(range(max(0, hit - neighbors), min(len(self.turns), hit + neighbors + 1)))
+
+        lines = []
+        previous = None
+        for turn_id in sorted(selected):
+            if previous is not None and turn_id != previous + 1:
+                lines.append("...")
+            lines.append(self.turns[turn_id]["line"])
+            previous = turn_id
+        return "\n".join(lines)
@@ -0,0 +1,242 @@
+"""
+Compact structured transcript.
+
+Word timings and speaker labels from ElevenLabs are kept in column arrays
+(start, end, speaker id, word id) with an interned string table, instead of
+one Python object per word. Lookups by timestamp are binary searches, slices
+by time range or speaker share the string tables, and the whole transcript
+serializes to a compact byte string for state, caches and checkpoints.
+"""
+import base64
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterator, List, Optional, Tuple
+
+# Serialization header: magic, words, strings, speakers
+_MAGIC = b"CTR1"
+_HEADER = struct.Struct("<4sIII")
+
+# Array typecodes: float32 times (millisecond precision for multi-hour calls), uint32 ids
+_TIME_TYPE = "f"
+_ID_TYPE = "I"
+
+
+class CompactTranscript:
+    """Word-level transcript stored as parallel arrays plus interned string tables."""
+
+    __slots__ = ("starts", "ends", "speaker_ids", "word_ids", "strings", "speakers", "turn_offsets")
+
+    def __init__(self, starts: array, ends: array, speaker_ids: array, word_ids: array,
+                 strings: List[str], speakers: List[str]):
+        """
+        Initialize a transcript from its columns.
+
+        Args:
+            starts: Word start times in seconds, in time order
+            ends: Word end times in seconds
+            speaker_ids: Index into speakers for every word
+            word_ids: Index into strings for every word
+            strings: Interned word texts
+            speakers: Interned speaker labels
+        """
+        self.starts = starts
+        self.ends = ends
+        self.speaker_ids = speaker_ids
+        self.word_ids = word_ids
+        self.strings = strings
+        self.speakers = speakers
+        self.turn_offsets = self._find_turns()
+
+    @classmethod
+    def from_words(cls, words: List[dict]) -> "CompactTranscript":
+        """
+        Build a transcript from {"text", "start", "end", "speaker"} dicts (see response_words).
+
+        Args:
+            words: Words in time order
+
+        Returns:
+            CompactTranscript holding the same words
+        """
+        strings, string_ids = [], {}
+        speakers, speaker_index = [], {}
+        starts, ends = array(_TIME_TYPE), array(_TIME_TYPE)
+        speaker_ids, word_ids = array(_ID_TYPE), array(_ID_TYPE)
+        for word in words:
+            text = word["text"]
+            word_id = string_ids.get(text)
+            if word_id is None:
+                word_id = string_ids[text] = len(strings)
+                strings.append(text)
+            speaker = str(word["speaker"])
+            speaker_id = speaker_index.get(speaker)
+            if speaker_id is None:
+                speaker_id = speaker_index[speaker] = len(speakers)
+                speakers.append(speaker)
+            starts.append(word["start"])
+            ends.append(word["end"])
+            speaker_ids.append(speaker_id)
+            word_ids.append(word_id)
+        return cls(starts, ends, speaker_ids, word_ids, strings, speakers)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def _find_turns(self) -> array:
+        """Indices of the first word of every speaker turn."""
+        offsets = array(_ID_TYPE)
+        previous = None
+        for i, speaker_id in enumerate(self.speaker_ids):
+            if speaker_id != previous:
+                offsets.append(i)
+                previous = speaker_id
+        return offsets
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the first word's start to the last word's end (0 when empty)."""
+        if not len(self):
+            return 0.0
+        return self.ends[-1] - self.starts[0]
+
+    def word(self, index: int) -> dict:
+        """Return one word as a {"text", "start", "end", "speaker"} dict."""
+        return {
+            "text": self.strings[self.word_ids[index]],
+            "start": self.starts[index],
+            "end": self.ends[index],
+            "speaker": self.speakers[self.speaker_ids[index]],
+        }
+
+    def words(self) -> Iterator[dict]:
+        """Iterate over all words as dicts (materialized one at a time)."""
+        for i in range(len(self)):
+            yield self.word(i)
+
+    def index_at(self, seconds: float) -> Optional[int]:
+        """
+        Find the word being spoken at a timestamp in O(log n).
+
+        Returns:
+            Index of the last word starting at or before seconds, or None if it is before the first word
+        """
+        index = bisect_right(self.starts, seconds) - 1
+        return index if index >= 0 else None
+
+    def turn_index_at(self, seconds: float) -> Optional[int]:
+        """Find the speaker turn containing a timestamp (index into turns())."""
+        index = self.index_at(seconds)
+        if index is None:
+            return None
+        return bisect_right(self.turn_offsets, index) - 1
+
+    def _subset(self, indices) -> "CompactTranscript":
+        """New transcript holding the given word indices (string tables are shared, not copied)."""
+        if isinstance(indices, slice):
+            return CompactTranscript(self.starts[indices], self.ends[indices], self.speaker_ids[indices],
+                                     self.word_ids[indices], self.strings, self.speakers)
+        return CompactTranscript(
+            array(_TIME_TYPE, (self.starts[i] for i in indices)),
+            array(_TIME_TYPE, (self.ends[i] for i in indices)),
+            array(_ID_TYPE, (self.speaker_ids[i] for i in indices)),
+            array(_ID_TYPE, (self.word_ids[i] for i in indices)),
+            self.strings,
+            self.speakers,
+        )
+
+    def between(self, start: float, end: float) -> "CompactTranscript":
+        """Words starting in [start, end) seconds, found by binary search."""
+        return self._subset(slice(bisect_left(self.starts, start), bisect_left(self.starts, end)))
+
+    def for_speaker(self, speaker: str) -> "CompactTranscript":
+        """Words spoken by one speaker (an empty transcript if the speaker never talks)."""
+        try:
+            speaker_id = self.speakers.index(str(speaker))
+        except ValueError:
+            return self._subset(slice(0, 0))
+        return self._subset([i for i, s in enumerate(self.speaker_ids) if s == speaker_id])
+
+    def turns(self) -> List[Tuple[float, float, str, str]]:
+        """
+        Group consecutive words by speaker.
+
+        Returns:
+            List of (start, end, speaker, text) tuples
+        """
+        turns = []
+        bounds = list(self.turn_offsets) + [len(self)]
+        for first, stop in zip(bounds, bounds[1:]):
+            text = " ".join(self.strings[w] for w in self.word_ids[first:stop])
+            turns.append((self.starts[first], self.ends[stop - 1], self.speakers[self.speaker_ids[first]], text))
+        return turns
+
+    def to_text(self) -> Optional[str]:
+        """Format as "[mm:ss] Speaker X: text" lines, like format_words."""
+        lines = []
+        for start, _, speaker, text in self.turns():
+            mins, secs = divmod(int(start), 60)
+            lines.append(f"[{mins:02d}:{secs:02d}] Speaker {speaker}: {text}")
+        return "\n".join(lines) if lines else None
+
+    def to_bytes(self) -> bytes:
+        """Serialize to a compact little-endian byte string."""
+        parts = [_HEADER.pack(_MAGIC, len(self), len(self.strings), len(self.speakers))]
+        for column in (self.starts, self.ends, self.speaker_ids, self.word_ids):
+            parts.append(_little_endian(column).tobytes())
+        for table in (self.strings, self.speakers):
+            encoded = [s.encode("utf-8") for s in table]
+            parts.append(_little_endian(array(_ID_TYPE, (len(e) for e in encoded))).tobytes())
+            parts.append(b"".join(encoded))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CompactTranscript":
+        """Deserialize a byte string produced by to_bytes."""
+        magic, n_words, n_strings, n_speakers = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC:
+            raise ValueError("Not a serialized CompactTranscript")
+        offset = _HEADER.size
+
+        def read_array(typecode, count):
+            nonlocal offset
+            column = array(typecode)
+            size = column.itemsize * count
+            column.frombytes(data[offset:offset + size])
+            offset += size
+            return _little_endian(column)
+
+        def read_table(count):
+            nonlocal offset
+            lengths = read_array(_ID_TYPE, count)
+            table = []
+            for length in lengths:
+                table.append(data[offset:offset + length].decode("utf-8"))
+                offset += length
+            return table
+
+        starts = read_array(_TIME_TYPE, n_words)
+        ends = read_array(_TIME_TYPE, n_words)
+        speaker_ids = read_array(_ID_TYPE, n_words)
+        word_ids = read_array(_ID_TYPE, n_words)
+        strings = read_table(n_strings)
+        speakers = read_table(n_speakers)
+        return cls(starts, ends, speaker_ids, word_ids, strings, speakers)
+
+    def to_base64(self) -> str:
+        """Serialize for JSON storage (e.g. the transcript cache)."""
+        return base64.b64encode(self.to_bytes()).decode("ascii")
+
+    @classmethod
+    def from_base64(cls, text: str) -> "CompactTranscript":
+        return cls.from_bytes(base64.b64decode(text))
+
+
+def _little_endian(column: array) -> array:
+    """Return the array in little-endian order (swapping a copy on big-endian hosts)."""
+    if sys.byteorder == "little":
+        return column
+    swapped = array(column.typecode, column)
+    swapped.byteswap()
+    return swapped
@@ -0,0 +1,363 @@
+"""
+Managed workspace for uploads and scratch files.
+Every file the app writes for a recording (spooled uploads, trimmed audio,
+decode spools) lives under one directory instead of the system temp dir.
+Spooled uploads are registered as artifacts and are reference-counted by
+leases:
+  - a Streamlit session holds a lease on its upload for as long as the
+    session keeps the media handle (released when the handle is garbage
+    collected, renewed on every rerun)
+  - a queued job holds a lease until its worker finishes it
+Leases expire if nobody renews or releases them (e.g. the process died).
+When the workspace grows past its size cap, idle artifacts without leases
+are evicted, least recently used first. Scratch files and partial spools
+carry the pid of the process writing them in their name; at startup, files
+the database does not know about are swept once their owning process is gone
+(untagged leftovers once they are older than the grace period).
+Lease and artifact state lives in SQLite so the app and worker processes
+share it.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from src.audiosummarizer.utils import metrics
+from src.audiosummarizer.utils.transcript_cache import CACHE_ROOT
+
+# Root of the managed workspace
+WORKSPACE_DIR = Path(os.getenv("AUDIOSUMMARIZER_WORKSPACE_DIR", str(CACHE_ROOT / "workspace")))
+
+# Total size above which idle artifacts are evicted (default: 5 GB)
+WORKSPACE_MAX_BYTES = int(os.getenv("WORKSPACE_MAX_BYTES", 5 * 1024 ** 3))
+
+# Session leases expire unless renewed (a rerun of the session renews them)
+SESSION_LEASE_SECONDS = int(os.getenv("WORKSPACE_SESSION_LEASE_SECONDS", 6 * 3600))
+
+# Job leases cover the time a job may wait in the queue
+JOB_LEASE_SECONDS = 24 * 3600
+
+# Untagged unregistered files younger than this are left alone by the sweep (they may still be being written)
+ORPHAN_GRACE_SECONDS = 15 * 60
+
+# Owner tag embedded in scratch and spool file names by owned_prefix()
+_OWNER_TAG = re.compile(r"_pid(\d+)_")
+
+# Uploads spooled here before the workspace existed; swept at startup
+LEGACY_SPOOL_DIR = CACHE_ROOT / "uploads"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_last_used ON artifacts (last_used);
+CREATE TABLE IF NOT EXISTS leases (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    acquired_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leases_path ON leases (path);
+"""
+
+
+class WorkspaceLease:
+    """A session's hold on an artifact; released explicitly or when garbage collected."""
+
+    def __init__(self, workspace: "Workspace", path: str, ttl_seconds: int = SESSION_LEASE_SECONDS):
+        self.workspace = workspace
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.id = workspace.acquire(path, ttl_seconds=ttl_seconds)
+        # Streamlit drops a session's state when the session ends; the lease goes with it
+        self._finalizer = weakref.finalize(self, workspace.release, self.id)
+
+    def renew(self):
+        """Extend the lease and mark the artifact as recently used."""
+        self.workspace.renew(self.id, self.ttl_seconds)
+
+    def release(self):
+        self._finalizer()
+
+
+class Workspace:
+    """Size-capped directory of reference-counted artifacts, shared by the app and worker processes."""
+
+    def __init__(self, root: Path = WORKSPACE_DIR, max_bytes: int = WORKSPACE_MAX_BYTES):
+        """
+        Initialize the workspace.
+
+        Args:
+            root: Workspace directory (uploads/ and scratch/ are created inside)
+            max_bytes: Size cap enforced by evicting idle artifacts
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.uploads_dir = self.root / "uploads"
+        self.scratch_dir = self.root / "scratch"
+        self.db_path = self.root / "workspace.sqlite3"
+        self.uploads_dir.mkdir(parents=True, exist_ok=True)
+        self.scratch_dir.mkdir(parents=True, exist_ok=True)
+        # executescript manages its own transaction, so it runs outside _connect
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self, immediate: bool = False):
+        """Yield a short-lived connection inside a transaction."""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def register(self, path: str, kind: str = "upload"):
+        """
+        Record a file written into the workspace as an artifact and enforce the size cap.
+
+        Args:
+            path: File inside the workspace
+            kind: Artifact kind (for statistics)
+        """
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            conn.execute(
+                "INSERT INTO artifacts (path, kind, size, created_at, last_used) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET size = excluded.size, last_used = excluded.last_used",
+                (str(path), kind, os.path.getsize(path), now, now),
+            )
+        self.enforce_quota()
+
+    def acquire(self, path: str, lease_id: Optional[str] = None, ttl_seconds: int = SESSION_LEASE_SECONDS) -> str:
+        """
+        Take a lease on an artifact so it is not evicted.
+
+        Args:
+            path: Artifact path
+            lease_id: Stable id for the holder (e.g. "job:<id>"); acquiring it again renews it
+            ttl_seconds: Seconds until the lease expires unless renewed
+
+        Returns:
+            Lease id
+        """
+        lease_id = lease_id or uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (id, path, acquired_at, expires_at) VALUES (?, ?, ?, ?)",
+                (lease_id, str(path), now, now + ttl_seconds),
+            )
+            conn.execute("UPDATE artifacts SET last_used = ? WHERE path = ?", (now, str(path)))
+        return lease_id
+
+    def renew(self, lease_id: str, ttl_seconds: int = SESSION_LEASE_SECONDS):
+        """Extend a lease and mark its artifact as recently used."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE leases SET expires_at = ? WHERE id = ?", (now + ttl_seconds, lease_id))
+            conn.execute(
+                "UPDATE artifacts SET last_used = ? WHERE path = (SELECT path FROM leases WHERE id = ?)",
+                (now, lease_id),
+            )
+
+    def release(self, lease_id: str):
+        """Drop a lease (the artifact stays until it is evicted)."""
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+        except sqlite3.Error as e:
+            # Also called from garbage collection; never let it raise there
+            print(f"Error releasing workspace lease {lease_id}: {e}")
+
+    def scratch_path(self, suffix: str = "", prefix: str = "scratch") -> str:
+        """Path for a transient file in the workspace's scratch directory (the caller deletes it)."""
+        return str(self.scratch_dir / f"{owned_prefix(prefix)}{uuid.uuid4().hex}{suffix}")
+
+    def enforce_quota(self) -> int:
+        """
+        Evict unleased artifacts, least recently used first, until the workspace fits its size cap.
+
+        Returns:
+            Number of artifacts evicted
+        """
+        now = time.time()
+        evicted = []
+        with self._connect(immediate=True) as conn:
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+            if total > self.max_bytes:
+                rows = conn.execute(
+                    "SELECT path, size FROM artifacts WHERE path NOT IN (SELECT path FROM leases) ORDER BY last_used"
+                ).fetchall()
+                for row in rows:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM artifacts WHERE path = ?", (row["path"],))
+                    evicted.append(row["path"])
+                    total -= row["size"]
+                if total > self.max_bytes:
+                    print(f"Workspace over its cap ({total} > {self.max_bytes} bytes) with every artifact in use")
+        for path in evicted:
+            remove_quietly(path)
+        if evicted:
+            print(f"Evicted {len(evicted)} idle workspace artifacts")
+            metrics.increment("audiosummarizer_workspace_evictions_total", len(evicted))
+        self._export_usage()
+        return len(evicted)
+
+    def sweep(self) -> int:
+        """
+        Startup cleanup: expire leases, forget artifacts whose files are gone and delete
+        files the database does not know about (scratch leftovers, interrupted spools,
+        legacy uploads). A file tagged with its owner's pid is deleted only once that
+        process has exited, however old it is; an untagged one once it is older than
+        the grace period.
+
+        Returns:
+            Number of files deleted
+        """
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+            known = {row["path"] for row in conn.execute("SELECT path FROM artifacts")}
+            missing = [path for path in known if not os.path.exists(path)]
+            conn.executemany("DELETE FROM artifacts WHERE path = ?", [(path,) for path in missing])
+
+        removed = 0
+        for directory in (self.uploads_dir, self.scratch_dir, LEGACY_SPOOL_DIR):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory):
+                if not entry.is_file() or entry.path in known:
+                    continue
+                owner = _owner_pid(entry.name)
+                if owner is not None:
+                    if _process_alive(owner):
+                        continue
+                else:
+                    try:
+                        if now - entry.stat().st_mtime < ORPHAN_GRACE_SECONDS:
+                            continue
+                    except OSError:
+                        continue
+                if remove_quietly(entry.path):
+                    removed += 1
+        if removed:
+            print(f"Swept {removed} orphaned workspace files")
+            metrics.increment("audiosummarizer_workspace_orphans_removed_total", removed)
+        self.enforce_quota()
+        return removed
+
+    def get_stats(self) -> dict:
+        """
+        Get workspace statistics.
+
+        Returns:
+            Dict with artifact count and bytes, leased artifact count and bytes,
+            active leases, scratch bytes and the size cap
+        """
+        now = time.time()
+        with self._connect() as conn:
+            files, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+            leased_files, leased_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts "
+                "WHERE path IN (SELECT path FROM leases WHERE expires_at >= ?)", (now,)
+            ).fetchone()
+            leases = conn.execute("SELECT COUNT(*) FROM leases WHERE expires_at >= ?", (now,)).fetchone()[0]
+        scratch_bytes = 0
+        for entry in os.scandir(self.scratch_dir):
+            try:
+                scratch_bytes += entry.stat().st_size
+            except OSError:
+                pass
+        return {
+            "artifacts": files,
+            "artifact_bytes": size,
+            "leased_artifacts": leased_files,
+            "leased_bytes": leased_bytes,
+            "leases": leases,
+            "scratch_bytes": scratch_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _export_usage(self):
+        stats = self.get_stats()
+        metrics.gauge("audiosummarizer_workspace_bytes", stats["artifact_bytes"] + stats["scratch_bytes"])
+        metrics.gauge("audiosummarizer_workspace_artifacts", stats["artifacts"])
+        metrics.gauge("audiosummarizer_workspace_leased_bytes", stats["leased_bytes"])
+        metrics.gauge("audiosummarizer_workspace_max_bytes", stats["max_bytes"])
+
+
+def owned_prefix(prefix: str) -> str:
+    """
+    File name prefix tagging a scratch or spool file with the current process, so the
+    startup sweep of another process leaves it alone while this one is alive.
+    """
+    return f"{prefix}_pid{os.getpid()}_"
+
+
+def _owner_pid(name: str) -> Optional[int]:
+    match = _OWNER_TAG.search(name)
+    return int(match.group(1)) if match else None
+
+
+def _process_alive(pid: int) -> bool:
+    """Whether a process with this pid exists on this host (the workspace is host-local, like its SQLite database)."""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    except OSError:
+        return True  # cannot tell; keep the file
+    return True
+
+
+def remove_quietly(path: str) -> bool:
+    """Delete a file, ignoring errors (e.g. it is already gone). Returns True if it was deleted."""
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+_workspace = None
+_workspace_lock = threading.Lock()
+
+
+def get_workspace() -> Workspace:
+    """Return the process-wide workspace, sweeping orphans the first time it is used in a process."""
+    global _workspace
+    with _workspace_lock:
+        if _workspace is None:
+            _workspace = Workspace()
+            try:
+                _workspace.sweep()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Workspace sweep failed: {e}")
+    return _workspace
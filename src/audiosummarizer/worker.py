@@ -0,0 +1,221 @@
+"""
+Worker pool for queued audio processing jobs.
+
+Each worker process compiles the graph once, then claims jobs from the
+JobQueue, runs them and records per-stage progress and the final result for
+the UI to read back. The supervisor restarts workers that die and requeues
+jobs whose worker stopped sending heartbeats. A worker that keeps dying right
+after it starts is restarted with exponential backoff, and given up on after
+MAX_QUICK_EXITS attempts in a row; the pool exits non-zero once every worker
+has been given up on.
+
+Usage:
+    python -m src.audiosummarizer.worker --workers 4
+
+Start the app with JOB_QUEUE_ENABLED=1 so uploads are queued instead of being
+processed inside the Streamlit session.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from dotenv import load_dotenv
+
+from src.audiosummarizer.utils import metrics
+from src.audiosummarizer.utils.job_queue import JobQueue
+from src.audiosummarizer.utils.workspace import get_workspace
+
+# Worker processes started by default
+DEFAULT_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+# Seconds an idle worker waits before checking the queue again
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+
+# Seconds between heartbeats of a running job
+HEARTBEAT_SECONDS = 15
+
+# Seconds between supervisor checks (dead workers, stale jobs)
+SUPERVISE_SECONDS = 5
+
+# Settings every worker needs; the pool refuses to start without them
+REQUIRED_SETTINGS = ("GEMINI_API_KEY", "ELEVENLABS_API_KEY")
+
+# A worker exiting sooner than this after starting counts as a quick exit (e.g. a startup error)
+QUICK_EXIT_SECONDS = 60
+
+# Consecutive quick exits after which a worker is no longer restarted
+MAX_QUICK_EXITS = 5
+
+# Upper bound of the restart delay after quick exits (it doubles from SUPERVISE_SECONDS)
+MAX_RESTART_DELAY_SECONDS = 300
+
+
+class _Heartbeat(threading.Thread):
+    """Keeps a running job's heartbeat fresh while the graph is busy in a long stage."""
+
+    def __init__(self, queue: JobQueue, job_id: str):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.job_id = job_id
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(HEARTBEAT_SECONDS):
+            try:
+                self.queue.heartbeat(self.job_id)
+            except Exception as e:
+                print(f"Heartbeat failed for job {self.job_id}: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_job(queue: JobQueue, graph, job_id: str, state: dict) -> dict:
+    """
+    Run the graph for one job, recording each finished stage. Returns the final state.
+
+    A job whose recording failed part-way earlier (e.g. a requeued job whose
+    worker died) resumes at the first incomplete stage.
+    """
+    from src.audiosummarizer.graph.audio_graph import checkpoint_run, start_or_resume
+
+    with checkpoint_run(graph, state["content_hash"]) as config:
+        graph_input, resumed = start_or_resume(graph, state, config)
+        result = dict(state)
+        if resumed:
+            result.update(resumed)
+            print(f"Resuming job {job_id} from its checkpoint")
+        stage_started = time.perf_counter()
+        with metrics.span("process_audio", audio_seconds=state.get("audio_duration_seconds") or 0.0,
+                          source="worker", job_id=job_id, resumed=bool(resumed)):
+            for update in graph.stream(graph_input, config, stream_mode="updates"):
+                for node, node_state in update.items():
+                    now = time.perf_counter()
+                    queue.record_stage(job_id, node, now - stage_started)
+                    stage_started = now
+                    if node_state:
+                        result.update(node_state)
+    return result
+
+
+def worker_loop(worker_number: int, stop_event):
+    """Body of one worker process: claim and run jobs until stop_event is set."""
+    # Ctrl+C reaches the whole process group; the supervisor decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+
+    # One client and one compiled graph per worker process
+    from src.audiosummarizer.LLMS.geminillm import GeminiLLM
+    from src.audiosummarizer.graph.audio_graph import AudioGraphBuilder, sqlite_checkpointer
+    model = GeminiLLM().get_llm()
+    graph = AudioGraphBuilder(model).setup_graph("Audio Summarizer", checkpointer=sqlite_checkpointer())
+    queue = JobQueue()
+    print(f"Worker {worker_number} ({worker_name}) ready")
+
+    while not stop_event.is_set():
+        claimed = queue.claim(worker_name)
+        if claimed is None:
+            stop_event.wait(POLL_SECONDS)
+            continue
+
+        job_id, state = claimed
+        print(f"Worker {worker_number} started job {job_id}")
+        heartbeat = _Heartbeat(queue, job_id)
+        heartbeat.start()
+        try:
+            result = run_job(queue, graph, job_id, state)
+            queue.complete(job_id, result)
+            print(f"✅ Worker {worker_number} finished job {job_id}")
+        except Exception as e:
+            traceback.print_exc()
+            queue.fail(job_id, str(e))
+            print(f"❌ Worker {worker_number} failed job {job_id}: {e}", file=sys.stderr)
+        finally:
+            heartbeat.stop()
+            # The upload may be evicted once no session or job holds it
+            get_workspace().release(f"job:{job_id}")
+
+
+def missing_settings() -> list:
+    """Names of REQUIRED_SETTINGS not set in the environment (or .env)."""
+    load_dotenv()
+    return [name for name in REQUIRED_SETTINGS if not os.getenv(name)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a pool of workers processing queued audio jobs.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker processes to run")
+    args = parser.parse_args(argv)
+
+    # Workers would die at startup and be restarted forever without them
+    missing = missing_settings()
+    if missing:
+        sys.exit(f"❌ Missing required settings: {', '.join(missing)}")
+
+    queue = JobQueue()
+    queue.requeue_stale()
+    purged = queue.purge()
+    if purged:
+        print(f"Purged {purged} old jobs")
+    # Startup sweep of orphaned uploads and scratch files
+    get_workspace()
+
+    # Fresh interpreters: workers don't inherit the supervisor's threads or SQLite handles
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+
+    def request_stop(signum, frame):
+        print("Stopping: workers finish their current job first")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    def start_worker(number, quick_exits=0):
+        process = context.Process(target=worker_loop, args=(number, stop_event), name=f"worker-{number}")
+        process.start()
+        return {"process": process, "started_at": time.monotonic(), "quick_exits": quick_exits, "restart_at": None}
+
+    workers = {number: start_worker(number) for number in range(1, args.workers + 1)}
+    print(f"Started {args.workers} workers")
+
+    while not stop_event.is_set():
+        now = time.monotonic()
+        for number, worker in list(workers.items()):
+            process = worker["process"]
+            if worker["restart_at"] is None and not process.is_alive():
+                quick = now - worker["started_at"] < QUICK_EXIT_SECONDS
+                worker["quick_exits"] = worker["quick_exits"] + 1 if quick else 0
+                if worker["quick_exits"] >= MAX_QUICK_EXITS:
+                    print(f"❌ Worker {number} exited with code {process.exitcode} right after starting "
+                          f"{worker['quick_exits']} times in a row; giving up on it", file=sys.stderr)
+                    del workers[number]
+                    continue
+                delay = min(SUPERVISE_SECONDS * 2 ** worker["quick_exits"], MAX_RESTART_DELAY_SECONDS) if quick else 0
+                print(f"Worker {number} exited with code {process.exitcode}; restarting in {delay:.0f} s")
+                worker["restart_at"] = now + delay
+            if worker["restart_at"] is not None and now >= worker["restart_at"]:
+                workers[number] = start_worker(number, worker["quick_exits"])
+        if not workers:
+            print("❌ Every worker has been given up on; stopping", file=sys.stderr)
+            break
+        requeued = queue.requeue_stale()
+        if requeued:
+            print(f"Requeued {requeued} jobs from unresponsive workers")
+        stop_event.wait(SUPERVISE_SECONDS)
+
+    for worker in workers.values():
+        worker["process"].join()
+    if not workers:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()